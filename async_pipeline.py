@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+"""
+asyncio version of the scraper and MeTube submitter.
+
+Resolves channels, fetches RSS feeds, validates videos and submits them for
+many channels at once on a single event loop, so one process can keep
+thousands of HTTP requests in flight without a thread per task. It shares the
+parsing helpers, caches and seen-video ledger with the threaded implementation.
+
+Requires httpx (pip install httpx). The run_channels() and get_channel_videos()
+wrappers give synchronous callers (CLI, GUIs) the same results. The caches and
+ledger are JSON files, so reading and writing them happens on worker threads
+to keep the event loop free.
+"""
+
+import asyncio
+import random
+import time
+from urllib.parse import urljoin, urlparse
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+from channel_cache import ChannelIdCache, MISS
+from feed_cache import FeedCache
+from http_client import HTTP_RETRIES, RETRY_STATUSES, THROTTLE_STATUSES, http2_enabled, parse_retry_after
+from metrics import record_httpx_response
+from seen_ledger import SeenVideoLedger
+from video_metadata import VideoMetadataCache, WatchPageScanner, extract_video_id, classify_video
+from youtube_channel_scraper import (
+    parse_feed_entries, find_channel_id_in_page, channel_page_urls, parse_channel_url,
+    channel_videos_page_url, find_video_urls_in_page
+)
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+def _require_httpx():
+    if httpx is None:
+        raise ImportError("The asyncio pipeline requires httpx. Install it with: pip install httpx")
+
+class AsyncHostRateLimiter:
+    """
+    Pace requests per host on one event loop, the way http_client.HostState does for threads.
+
+    The rate starts at requests_per_second, rises towards max_requests_per_second
+    while responses are clean and halves on 429 or 503. After a failure the host
+    is put on hold for its Retry-After, or for an exponential backoff with jitter.
+    """
+    def __init__(self, requests_per_second=2.0, max_requests_per_second=None, min_requests_per_second=0.2,
+                 backoff_base=0.5, max_backoff=60.0):
+        # No rate means no pacing; backoff still applies
+        self.start_rate = requests_per_second or None
+        self.max_rate = max(max_requests_per_second or 0, self.start_rate or 0) or None
+        self.min_rate = min(min_requests_per_second, self.start_rate) if self.start_rate else min_requests_per_second
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.rates = {}
+        self.next_slot = {}
+        self.blocked_until = {}
+        self.failures = {}
+
+    async def wait(self, url):
+        host = urlparse(url).netloc
+        while True:
+            now = time.monotonic()
+            hold = self.blocked_until.get(host, 0) - now
+            if hold > 0:
+                await asyncio.sleep(hold)
+                continue
+            if not self.start_rate:
+                return
+
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + 1.0 / self.rates.get(host, self.start_rate)
+            if slot > now:
+                await asyncio.sleep(slot - now)
+            return
+
+    def record_success(self, url):
+        host = urlparse(url).netloc
+        self.failures[host] = 0
+        rate = self.rates.get(host, self.start_rate)
+        if rate and self.max_rate and rate < self.max_rate:
+            self.rates[host] = min(self.max_rate, rate + self.max_rate / 100)
+
+    def record_failure(self, url, throttled=False, retry_after=None):
+        """
+        Register a failed attempt and return how long the host is put on hold.
+        """
+        host = urlparse(url).netloc
+        failures = self.failures[host] = self.failures.get(host, 0) + 1
+        rate = self.rates.get(host, self.start_rate)
+        if throttled and rate:
+            self.rates[host] = max(self.min_rate, rate / 2)
+
+        if retry_after is not None:
+            delay = min(retry_after, self.max_backoff * 5)
+        else:
+            delay = random.uniform(0, min(self.max_backoff, self.backoff_base * 2 ** (failures - 1)))
+        self.blocked_until[host] = max(self.blocked_until.get(host, 0), time.monotonic() + delay)
+        return delay
+
+class AsyncYouTubeChannelScraper:
+    def __init__(self, client=None, max_workers=4, requests_per_second=2.0, max_connections=100,
+                 channel_cache=None, metadata_cache=None, feed_cache=None, max_requests_per_second=None,
+                 max_retries=3, http2=None):
+        """
+        Every YouTube request is paced per host starting at requests_per_second (0: unpaced),
+        speeding up to max_requests_per_second (default: five times the starting rate), and
+        retried up to max_retries times on throttling, server errors and transport failures.
+
+        http2 defaults to whether enable_http2() (or METUBE_SUB_HTTP2=1) turned HTTP/2 on.
+        """
+        _require_httpx()
+        if http2 is None:
+            http2 = http2_enabled()
+        self.client = client or httpx.AsyncClient(
+            headers={'User-Agent': USER_AGENT},
+            http2=http2,
+            follow_redirects=True,
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            event_hooks={'response': [record_httpx_response]}
+        )
+        self.max_workers = max(1, max_workers)
+        self.rate_limiter = AsyncHostRateLimiter(
+            requests_per_second,
+            max_requests_per_second or (requests_per_second * 5 if requests_per_second else None)
+        )
+        self.max_retries = max_retries
+        self.channel_cache = channel_cache or ChannelIdCache()
+        self.metadata_cache = metadata_cache or VideoMetadataCache()
+        self.feed_cache = feed_cache or FeedCache()
+
+    async def aclose(self):
+        await self.client.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def _send(self, method, url, stream=False, **kwargs):
+        """
+        Paced request to YouTube, retried like ThrottledSession retries the threaded scraper's.
+
+        With stream=True the caller reads the body and must close the response.
+        """
+        host = urlparse(url).netloc
+        attempt = 0
+        while True:
+            await self.rate_limiter.wait(url)
+            try:
+                response = await self.client.send(self.client.build_request(method, url, **kwargs), stream=stream)
+            except httpx.TransportError as e:
+                self.rate_limiter.record_failure(url)
+                if attempt >= self.max_retries:
+                    raise
+                reason = 'timeout' if isinstance(e, httpx.TimeoutException) else 'connection'
+                HTTP_RETRIES.inc(host=host, reason=reason)
+                attempt += 1
+                continue
+
+            if response.status_code not in RETRY_STATUSES:
+                self.rate_limiter.record_success(url)
+                return response
+
+            self.rate_limiter.record_failure(
+                url,
+                throttled=response.status_code in THROTTLE_STATUSES,
+                retry_after=parse_retry_after(response.headers.get('Retry-After'))
+            )
+            if attempt >= self.max_retries:
+                return response
+            HTTP_RETRIES.inc(host=host, reason=str(response.status_code))
+            await response.aclose()
+            attempt += 1
+
+    async def get(self, url, **kwargs):
+        return await self._send('GET', url, **kwargs)
+
+    async def resolve_channel_id(self, channel_url):
+        """
+        Extract or look up the channel ID for any supported channel URL format.
+        """
+        kind, value = parse_channel_url(channel_url)
+        if kind == 'channel':
+            return value
+        if kind is None:
+            return None
+
+        cached = await asyncio.to_thread(self.channel_cache.lookup, value)
+        if cached is not MISS:
+            return cached
+
+        reached = False
+        for url in channel_page_urls(value):
+            try:
+                response = await self.get(url)
+            except httpx.HTTPError:
+                continue
+
+            # Throttling or server errors say nothing about the channel
+            if response.status_code < 500 and response.status_code != 429:
+                reached = True
+            if response.status_code == 200:
+                channel_id, guessed = find_channel_id_in_page(response.text, value)
+                if channel_id:
+                    await asyncio.to_thread(self.channel_cache.store_result, value, channel_id, guessed)
+                    return channel_id
+
+        if reached:
+            await asyncio.to_thread(self.channel_cache.store_result, value, None)
+        return None
+
+    async def fetch_channel_feed(self, channel_url):
+        """
+        Conditional RSS fetch; returns (entries, not_modified) like the threaded scraper.
+        """
+        try:
+            channel_id = await self.resolve_channel_id(channel_url)
+            if not channel_id:
+                print(f"Could not extract channel ID from: {channel_url}")
+                return None, False
+
+            rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
+
+            headers = {}
+            cached = await asyncio.to_thread(self.feed_cache.get, rss_url)
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+
+            response = await self.get(rss_url, headers=headers)
+
+            if response.status_code == 304 and cached:
+                self.feed_cache.touch(rss_url)
+                return cached['entries'], True
+
+            response.raise_for_status()
+
+            entries = parse_feed_entries(response.text)
+            await asyncio.to_thread(self.feed_cache.put, rss_url, response.headers.get('ETag'),
+                                    response.headers.get('Last-Modified'), entries)
+            return entries, False
+
+        except Exception as e:
+            print(f"Error fetching RSS feed for {channel_url}: {e}")
+            return None, False
+
+    async def get_channel_videos_scrape(self, channel_url, count=5):
+        """
+        Fallback method: scrape the channel page directly.
+        """
+        try:
+            response = await self.get(channel_videos_page_url(channel_url))
+            response.raise_for_status()
+            return find_video_urls_in_page(response.text, count)
+        except Exception as e:
+            print(f"Error scraping channel page {channel_url}: {e}")
+            return []
+
+    async def get_video_metadata(self, video_url, need_details=False):
+        """
+        Get title, duration and content flags, streaming the watch page only on a cache miss.
+        """
+        video_id = extract_video_id(video_url)
+        metadata = await asyncio.to_thread(self.metadata_cache.get, video_id)
+        if metadata is not None and (metadata.get('complete', True) or not need_details):
+            return metadata
+
+        response = await self._send('GET', video_url, stream=True)
+        try:
+            response.raise_for_status()
+
+            scanner = WatchPageScanner(stop_on_verdict=not need_details)
+            reached_eof = True
+            async for chunk in response.aiter_bytes(64 * 1024):
+                if scanner.feed(chunk):
+                    reached_eof = False
+                    break
+            metadata = scanner.finish(reached_eof)
+        finally:
+            await response.aclose()
+
+        # Kept in memory until filter_videos flushes the whole batch
+        self.metadata_cache.put(video_id, metadata)
+        return metadata
+
+    async def is_video_valid(self, video_url):
+        """
+        Check if a video is valid (not member-only, not a Short, not a livestream).
+        """
+        try:
+            metadata = await self.get_video_metadata(video_url)
+            return classify_video(metadata, video_url)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error checking video {video_url}: {e}")
+            return None, f"check failed: {e}"
+
+    async def filter_videos(self, video_urls, target_count, max_workers=None, on_checked=None):
+        """
+        Keep the first target_count valid videos in feed order.
+
+        At most max_workers checks run at once; checks that are no longer needed
+        are cancelled, which also aborts their HTTP requests.
+        """
+        workers = max(1, max_workers or self.max_workers)
+        valid_videos = []
+        checked_count = 0
+        results = {}
+        pending = {}
+        next_index = 0
+
+        try:
+            while len(valid_videos) < target_count and checked_count < len(video_urls):
+                while (next_index < len(video_urls) and len(pending) < workers and
+                       len(valid_videos) + len(pending) + len(results) < target_count):
+                    task = asyncio.ensure_future(self.is_video_valid(video_urls[next_index]))
+                    pending[task] = next_index
+                    next_index += 1
+
+                if checked_count not in results:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        results[pending.pop(task)] = task.result()
+
+                while checked_count in results and len(valid_videos) < target_count:
+                    is_valid, reason = results.pop(checked_count)
+                    video_url = video_urls[checked_count]
+                    checked_count += 1
+
+                    if is_valid:
+                        valid_videos.append(video_url)
+                    if on_checked:
+                        on_checked(video_url, is_valid, reason)
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            await asyncio.to_thread(self.metadata_cache.flush)
+
+        return valid_videos
+
+    async def get_channel_videos(self, channel_url, count=5, filter_content=True):
+        """
+        Get recent videos from a channel: RSS first, page scraping as a fallback.
+        """
+        fetch_count = count * 3 if filter_content else count
+
+        entries, _ = await self.fetch_channel_feed(channel_url)
+        videos = [entry['url'] for entry in entries[:fetch_count]] if entries else []
+
+        if not videos:
+            videos = await self.get_channel_videos_scrape(channel_url, fetch_count)
+
+        if not videos:
+            return []
+
+        if filter_content:
+            return await self.filter_videos(videos, count)
+        return videos[:count]
+
+class AsyncYouTubeToMeTube:
+    def __init__(self, metube_url, scraper=None, client=None, max_in_flight=4, max_concurrent_channels=50,
+                 ledger=None, **scraper_options):
+        _require_httpx()
+        self.metube_url = metube_url.rstrip('/')
+        self.scraper = scraper or AsyncYouTubeChannelScraper(**scraper_options)
+        self.client = client or httpx.AsyncClient(timeout=30.0, event_hooks={'response': [record_httpx_response]})
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_concurrent_channels = max(1, max_concurrent_channels)
+        self.ledger = ledger
+
+    async def aclose(self):
+        await self.client.aclose()
+        await self.scraper.aclose()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def submit_to_metube(self, video_url, quality='best', format_type='any'):
+        """
+        Submit a video URL to MeTube for downloading.
+        """
+        try:
+            data = {
+                'url': video_url,
+                'quality': quality,
+                'format': format_type,
+                'folder': '',
+                'customNamePrefix': '',
+                'playlistStrictMode': False,
+                'playlistItemLimit': '',
+                'autoStart': True
+            }
+            response = await self.client.post(
+                urljoin(self.metube_url, '/add'),
+                json=data,
+                headers={'Accept': 'application/json'}
+            )
+
+            if response.status_code in [200, 201]:
+                print(f"[SUCCESS] Successfully submitted: {video_url}")
+                return True
+
+            print(f"[FAILED] Failed to submit {video_url}: {response.status_code} - {response.text}")
+            return False
+
+        except Exception as e:
+            print(f"[ERROR] Error submitting {video_url}: {e}")
+            return False
+
+    async def submit_videos_batch(self, videos, quality='best', format_type='any', max_in_flight=None, on_result=None):
+        """
+        Submit videos concurrently; same inputs, callback and results as the threaded version.
+        """
+        jobs = []
+        for video in videos:
+            if isinstance(video, dict):
+                jobs.append((video['url'], video.get('quality') or quality))
+            else:
+                jobs.append((video, quality))
+
+        semaphore = asyncio.Semaphore(max(1, max_in_flight or self.max_in_flight))
+        results = [None] * len(jobs)
+
+        async def submit(index):
+            video_url, video_quality = jobs[index]
+            async with semaphore:
+                success = await self.submit_to_metube(video_url, video_quality, format_type)
+            results[index] = {'video_url': video_url, 'quality': video_quality, 'success': success}
+            return index
+
+        completed = 0
+        for finished in asyncio.as_completed([submit(index) for index in range(len(jobs))]):
+            index = await finished
+            completed += 1
+            if on_result:
+                on_result(results[index], completed, len(jobs))
+
+        return results
+
+    async def process_channel(self, channel_url, count=5, quality='best', format_type='any', filter_content=True,
+                              incremental=False):
+        """
+        Fetch a channel's videos and submit them; returns the URLs MeTube accepted.
+        """
+        if incremental:
+            return await self._process_channel_incremental(channel_url, count, quality, format_type, filter_content)
+
+        video_urls = await self.scraper.get_channel_videos(channel_url, count, filter_content)
+        if not video_urls:
+            print(f"No videos found for {channel_url}")
+            return []
+
+        results = await self.submit_videos_batch(video_urls, quality, format_type)
+        return [result['video_url'] for result in results if result['success']]
+
+    async def _process_channel_incremental(self, channel_url, count, quality, format_type, filter_content):
+        """
+        Same ledger semantics as YouTubeToMeTube.process_channel_incremental.
+        """
+        if self.ledger is None:
+            self.ledger = SeenVideoLedger()
+
+        first_poll = await asyncio.to_thread(self.ledger.get_channel, channel_url) is None
+        entries, _ = await self.scraper.fetch_channel_feed(channel_url)
+        if entries is None:
+            return []
+
+        new_entries = await asyncio.to_thread(self.ledger.new_entries, channel_url, entries)
+        if not new_entries:
+            await asyncio.to_thread(self.ledger.mark_seen, channel_url, [])
+            return []
+
+        entries_by_url = {entry['url']: entry for entry in new_entries}
+        candidate_urls = [entry['url'] for entry in new_entries]
+        handled = []
+
+        unchecked = set()
+
+        if filter_content:
+            # Rejected videos are recorded; ones that couldn't be checked are tried again next poll
+            def on_checked(video_url, is_valid, reason):
+                if is_valid is False:
+                    handled.append(entries_by_url[video_url])
+                elif is_valid is None:
+                    unchecked.add(video_url)
+
+            video_urls = await self.scraper.filter_videos(candidate_urls, count, on_checked=on_checked)
+        else:
+            video_urls = candidate_urls[:count]
+
+        results = await self.submit_videos_batch(video_urls, quality, format_type) if video_urls else []
+        submitted = [result['video_url'] for result in results if result['success']]
+        handled.extend(entries_by_url[video_url] for video_url in submitted)
+
+        if first_poll:
+            failed = (set(video_urls) - set(submitted)) | unchecked
+            handled = [entry for entry in entries if entry['url'] not in failed]
+
+        await asyncio.to_thread(self.ledger.mark_seen, channel_url, handled)
+        return submitted
+
+    async def process_channels(self, channel_urls, count=5, quality='best', format_type='any', filter_content=True,
+                               incremental=False):
+        """
+        Process many channels concurrently; returns {channel_url: submitted URLs}.
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrent_channels)
+
+        async def process(channel_url):
+            async with semaphore:
+                try:
+                    submitted = await self.process_channel(channel_url, count, quality, format_type,
+                                                           filter_content, incremental)
+                except Exception as e:
+                    print(f"Error processing {channel_url}: {e}")
+                    submitted = []
+                print(f"{channel_url}: {len(submitted)} video(s) submitted")
+                return channel_url, submitted
+
+        return dict(await asyncio.gather(*(process(channel_url) for channel_url in channel_urls)))
+
+def run_channels(metube_url, channel_urls, count=5, quality='best', format_type='any', filter_content=True,
+                 incremental=False, ledger=None, **options):
+    """
+    Synchronous wrapper: process channels on a fresh event loop and return {channel_url: submitted URLs}.
+    """
+    async def main():
+        async with AsyncYouTubeToMeTube(metube_url, ledger=ledger, **options) as processor:
+            return await processor.process_channels(channel_urls, count, quality, format_type,
+                                                    filter_content, incremental)
+
+    return asyncio.run(main())
+
+def get_channel_videos(channel_url, count=5, filter_content=True, **options):
+    """
+    Synchronous wrapper around AsyncYouTubeChannelScraper.get_channel_videos.
+    """
+    async def main():
+        async with AsyncYouTubeChannelScraper(**options) as scraper:
+            return await scraper.get_channel_videos(channel_url, count, filter_content)
+
+    return asyncio.run(main())
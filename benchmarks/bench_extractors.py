@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: the precompiled extractors in youtube_patterns vs the code they replaced.
+
+Point it at a directory of saved pages (save them with your browser or curl):
+
+    curl -sL https://www.youtube.com/@veritasium/videos -o pages/veritasium.html
+    curl -sL "https://www.youtube.com/watch?v=VIDEO_ID" -o pages/watch_VIDEO_ID.html
+    curl -sL "https://www.youtube.com/feeds/videos.xml?channel_id=UC..." -o pages/feed.xml
+    python benchmarks/bench_extractors.py pages
+
+Files are sorted by content: RSS feeds, watch pages (containing
+ytInitialPlayerResponse) and channel pages. For channel pages the file name
+(without extension) is used as the username for channel ID matching, and
+watch page names should end with the video ID.
+
+Watch pages are classified from the player response only, so a page whose
+only live/member-only markers belong to other videos listed in ytInitialData
+is reported as "differs".
+"""
+
+import argparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_patterns import scan_feed, find_channel_id, find_video_ids
+from video_metadata import extract_video_metadata, classify_video
+
+# --- Previous implementations, kept verbatim apart from dropped logging ---
+
+def legacy_parse_feed_entries(feed_text):
+    entries = []
+    for entry_text in re.findall(r'<entry>(.*?)</entry>', feed_text, re.DOTALL):
+        video_id_match = re.search(r'<yt:videoId>([^<]+)</yt:videoId>', entry_text)
+        if not video_id_match:
+            continue
+        published_match = re.search(r'<published>([^<]+)</published>', entry_text)
+        video_id = video_id_match.group(1)
+        entries.append({
+            'video_id': video_id,
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'published': published_match.group(1) if published_match else None
+        })
+    return entries
+
+def legacy_find_channel_id(page_text, username):
+    match_meta = re.search(r'<meta property="og:url" content="https://www\.youtube\.com/channel/([^"]+)"', page_text)
+    if match_meta:
+        return match_meta.group(1)
+    match_canonical = re.search(r'<link rel="canonical" href="https://www\.youtube\.com/channel/([^"]+)"', page_text)
+    if match_canonical:
+        return match_canonical.group(1)
+    matches = re.findall(r'"channelId":"([^"]+)"', page_text)
+    if matches:
+        for channel_id in matches:
+            context_pattern = rf'"channelId":"{re.escape(channel_id)}"[^}}]*"title":"[^"]*{re.escape(username)}'
+            if re.search(context_pattern, page_text, re.IGNORECASE):
+                return channel_id
+        return matches[0]
+    return None
+
+def legacy_find_video_ids(page_text):
+    all_video_ids = set()
+    for pattern in [r'"videoId":"([^"]+)"', r'/watch\?v=([a-zA-Z0-9_-]{11})', r'watch\?v=([a-zA-Z0-9_-]{11})']:
+        all_video_ids.update(re.findall(pattern, page_text))
+    return {video_id for video_id in all_video_ids if len(video_id) == 11}
+
+def legacy_classify_page(page_text, video_url):
+    member_only_indicators = [
+        '"isAvailable":false',
+        '"reason":{"code":"MEMBERSHIP_CONTENT_NOT_AVAILABLE"',
+        'Join this channel to get access to members-only content',
+        '"unplayableText":"Join this channel'
+    ]
+    if any(indicator in page_text for indicator in member_only_indicators):
+        return False, "member-only content"
+    if '"isShort":true' in page_text:
+        return False, "YouTube Short"
+    if '/shorts/' in video_url:
+        return False, "YouTube Short (URL-based)"
+    live_indicators = [
+        '"liveBroadcastContent":"live"',
+        '"liveBroadcastContent":"upcoming"',
+        '"isLiveNow":true',
+        '"isLive":true',
+        '"wasLive":true'
+    ]
+    title_match = re.search(r'"title":"([^"]*)"', page_text)
+    video_title = title_match.group(1) if title_match else ""
+    generic_live_keywords = ['live stream', 'livestream', '🔴', 'live:', ' live ', 'stream:']
+    is_live = any(indicator in page_text for indicator in live_indicators)
+    is_live_title = any(keyword.lower() in video_title.lower() for keyword in generic_live_keywords)
+    if is_live or is_live_title:
+        return False, "livestream"
+    duration_match = re.search(r'"lengthSeconds":"(\d+)"', page_text)
+    if duration_match:
+        duration = int(duration_match.group(1))
+        if duration <= 60:
+            return False, "short video (≤60s)"
+        elif duration >= 7200:
+            return False, "long video (likely livestream, ≥2h)"
+    return True, "valid"
+
+# --- New implementations, wrapped to return comparable results ---
+
+def new_find_channel_id(page_text, username):
+    return find_channel_id(page_text, username)[0]
+
+def new_find_video_ids(page_text):
+    return set(find_video_ids(page_text))
+
+def new_classify_page(page_text, video_url):
+    return classify_video(extract_video_metadata(page_text), video_url)
+
+def load_pages(directory):
+    pages = {'feed': [], 'watch': [], 'channel': []}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'r', encoding='utf-8', errors='replace') as f:
+            text = f.read()
+        if '<feed' in text[:2000]:
+            pages['feed'].append((name, text))
+        elif 'ytInitialPlayerResponse' in text:
+            pages['watch'].append((name, text))
+        else:
+            pages['channel'].append((name, text))
+    return pages
+
+def compare(label, name, legacy, new, repeat, number):
+    legacy_result = legacy()
+    new_result = new()
+    legacy_time = min(timeit.repeat(legacy, repeat=repeat, number=number)) / number
+    new_time = min(timeit.repeat(new, repeat=repeat, number=number)) / number
+    match = 'same' if legacy_result == new_result else 'differs'
+    print(f"{label:<14} {name[:32]:<32} {legacy_time * 1000:>9.3f} {new_time * 1000:>9.3f} "
+          f"{legacy_time / new_time if new_time else float('inf'):>7.2f}x  {match}")
+    if legacy_result != new_result:
+        print(f"    legacy: {legacy_result!r}"[:200])
+        print(f"    new:    {new_result!r}"[:200])
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare page extractors on saved YouTube pages')
+    parser.add_argument('pages', help='Directory of saved channel pages, watch pages and RSS feeds')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing rounds per extractor (default: 5)')
+    parser.add_argument('--number', type=int, default=20, help='Calls per timing round (default: 20)')
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not any(pages.values()):
+        print(f"No pages found in {args.pages}")
+        return 1
+
+    print(f"{'extractor':<14} {'page':<32} {'old (ms)':>9} {'new (ms)':>9} {'speedup':>8}  result")
+
+    for name, text in pages['feed']:
+        compare('feed', name, lambda: legacy_parse_feed_entries(text), lambda: scan_feed(text),
+                args.repeat, args.number)
+
+    for name, text in pages['channel']:
+        username = os.path.splitext(name)[0]
+        compare('channel id', name, lambda: legacy_find_channel_id(text, username),
+                lambda: new_find_channel_id(text, username), args.repeat, args.number)
+        compare('video ids', name, lambda: legacy_find_video_ids(text), lambda: new_find_video_ids(text),
+                args.repeat, args.number)
+
+    for name, text in pages['watch']:
+        video_url = 'https://www.youtube.com/watch?v=' + os.path.splitext(name)[0][-11:]
+        compare('classify', name, lambda: legacy_classify_page(text, video_url),
+                lambda: new_classify_page(text, video_url), args.repeat, args.number)
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
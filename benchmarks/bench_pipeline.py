@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Pipeline benchmarks against the local fixture server, with no network access.
+
+Three measurements, each at several library sizes (default 10, 1000, 10000):
+
+    channel_to_submit   resolve a channel, read its feed, validate every
+                        upload and submit the valid ones to MeTube
+                        (YouTubeToMeTube.process_channel), as videos/s
+    validate            per-video validation latency on a cold metadata cache
+                        (YouTubeChannelScraper._is_video_valid), one at a time
+    library_refresh     web GUI download-list refresh with a library of that
+                        size (WebGUIHandler.get_downloaded_videos plus the
+                        snapshot/index update), first and repeated
+
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --sizes 10,1000 --latency 0.02 --json before.json
+
+Every run uses a fresh temporary cache directory, so nothing is served from an
+earlier run's caches. Pass --fixtures to replay recorded pages (see
+fixture_server.py for the file names); the channel of a size-N run is @benchN.
+The library benchmark needs the web GUI's dependencies (Flask and
+Flask-SocketIO) and is skipped without them.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import percentile, quiet
+from fixture_server import FixtureServer, redirect_youtube, synthetic_video_id
+
+BENCHMARKS = ('channel_to_submit', 'validate', 'library_refresh')
+
+@contextlib.contextmanager
+def fresh_caches():
+    """
+    Point every on-disk cache at an empty directory for the duration of a run.
+    """
+    previous = os.environ.get('METUBE_SUB_CACHE_DIR')
+    with tempfile.TemporaryDirectory(prefix='metube-bench-') as cache_dir:
+        os.environ['METUBE_SUB_CACHE_DIR'] = cache_dir
+        try:
+            yield cache_dir
+        finally:
+            if previous is None:
+                os.environ.pop('METUBE_SUB_CACHE_DIR', None)
+            else:
+                os.environ['METUBE_SUB_CACHE_DIR'] = previous
+
+def videos_validated():
+    """
+    Videos the scraper has validated so far, from the video_validate stage timings.
+    """
+    from metrics import STAGE_SECONDS
+    return STAGE_SECONDS.summary().get('video_validate', {}).get('count', 0)
+
+def bench_channel_to_submit(server, size, args):
+    from youtube_to_metube import YouTubeToMeTube
+
+    with fresh_caches():
+        processor = YouTubeToMeTube(server.url, max_workers=args.workers, requests_per_second=0,
+                                    max_in_flight=args.max_in_flight)
+        redirect_youtube(processor.scraper.session, server.url)
+        added_before = server.metube.added
+        checked_before = videos_validated()
+
+        start = time.perf_counter()
+        with quiet():
+            processor.process_channel(f"https://www.youtube.com/@bench{size}", count=size)
+        elapsed = time.perf_counter() - start
+
+    submitted = server.metube.added - added_before
+    checked = videos_validated() - checked_before
+    return {
+        'seconds': elapsed,
+        'videos_checked': checked,
+        'videos_submitted': submitted,
+        'checked_per_second': checked / elapsed if elapsed else 0.0,
+        'submitted_per_second': submitted / elapsed if elapsed else 0.0
+    }
+
+def bench_validate(server, size, args):
+    from youtube_channel_scraper import YouTubeChannelScraper
+
+    with fresh_caches():
+        scraper = YouTubeChannelScraper(max_workers=1, requests_per_second=0)
+        redirect_youtube(scraper.session, server.url)
+
+        latencies = []
+        with quiet():
+            for index in range(size):
+                video_url = f"https://www.youtube.com/watch?v={synthetic_video_id(size, index)}"
+                start = time.perf_counter()
+                scraper._is_video_valid(video_url)
+                latencies.append(time.perf_counter() - start)
+
+    return {
+        'seconds': sum(latencies),
+        'videos': size,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'max_ms': max(latencies) * 1000
+    }
+
+def bench_library_refresh(server, size, args):
+    try:
+        import web_gui
+    except ImportError as e:
+        return {'skipped': f"web GUI dependencies missing ({e})"}
+
+    web_gui.log_channel.echo = False
+    server.reset_library(size)
+
+    with fresh_caches():
+        handler = web_gui.WebGUIHandler()
+        timings = []
+        for _ in range(1 + args.repeat):
+            start = time.perf_counter()
+            videos = handler.get_downloaded_videos(server.url)
+            handler.update_downloads_snapshot(server.url, videos)
+            timings.append(time.perf_counter() - start)
+
+    repeated = timings[1:]
+    return {
+        'seconds': sum(timings),
+        'videos': len(videos or []),
+        'first_ms': timings[0] * 1000,
+        'repeat_p50_ms': percentile(repeated, 0.50) * 1000,
+        'repeat_max_ms': max(repeated) * 1000 if repeated else 0.0
+    }
+
+RUNNERS = {
+    'channel_to_submit': bench_channel_to_submit,
+    'validate': bench_validate,
+    'library_refresh': bench_library_refresh
+}
+
+def format_result(name, size, result):
+    if 'skipped' in result:
+        return f"{name:<18} {size:>6}  skipped: {result['skipped']}"
+    details = ', '.join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in result.items() if key != 'seconds')
+    return f"{name:<18} {size:>6}  {result['seconds']:8.3f}s  {details}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scraper, submitter and library refresh offline')
+    parser.add_argument('--sizes', default='10,1000,10000',
+                       help='Comma-separated video counts to run each benchmark at (default: 10,1000,10000)')
+    parser.add_argument('--only', action='append', choices=BENCHMARKS,
+                       help='Run only this benchmark (repeatable)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Simulated YouTube latency per request in seconds (default: 0)')
+    parser.add_argument('--metube-latency', type=float, default=0.0,
+                       help='Simulated MeTube latency per request in seconds (default: 0)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Concurrent video checks, as --workers of the CLI (default: 4)')
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                       help='Concurrent MeTube submissions, as --max-in-flight of the CLI (default: 4)')
+    parser.add_argument('--repeat', type=int, default=3,
+                       help='Repeated library refreshes after the first one (default: 3)')
+    parser.add_argument('--fixtures', help='Directory of recorded pages to replay')
+    parser.add_argument('--watch-page-kb', type=int, default=512,
+                       help='Size of synthetic watch pages in KiB (default: 512)')
+    parser.add_argument('--json', metavar='FILE', help='Also write the results as JSON, for comparing runs')
+
+    args = parser.parse_args()
+
+    try:
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    except ValueError:
+        parser.error('--sizes must be comma-separated integers')
+    if any(size < 1 or size >= 100000 for size in sizes):
+        parser.error('Sizes must be between 1 and 99999')
+
+    results = []
+    with FixtureServer(latency=args.latency, metube_latency=args.metube_latency, fixtures_dir=args.fixtures,
+                       watch_page_kb=args.watch_page_kb) as server:
+        print(f"Fixture server on {server.url}")
+        for name in args.only or BENCHMARKS:
+            for size in sizes:
+                result = RUNNERS[name](server, size, args)
+                results.append({'benchmark': name, 'size': size, **result})
+                print(format_result(name, size, result))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(args), 'results': results}, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the benchmark scripts.
+"""
+
+import contextlib
+import os
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Drop the progress output of the code under test.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
@@ -0,0 +1,590 @@
+#!/usr/bin/env python3
+"""
+A MeTube stand-in for load testing, and a load generator to drive it.
+
+FakeMeTube implements the API that YouTubeToMeTube and WebGUIHandler use:
+
+    POST /add                 queue a URL; it moves to the done list after --download-time
+    GET  /downloads, /history queue, pending and done lists (/downloads can be turned off,
+                              as on MeTube versions that only have /history)
+    GET  /files               every downloaded file with its size (can be turned off too)
+    GET  /info                download_dir and version
+    POST /delete              {'ids': [...], 'where': 'done' | 'queue'}, keyed by URL like MeTube
+    POST /clear               empty the done list
+    HEAD /download/<path>     Content-Length of a downloaded file
+
+It starts with a synthetic library of any size, spread over channel folders
+with nanosecond timestamps, and a third of the entries leave their size to
+/files as older MeTube versions do. Every request can be delayed (fixed
+latency plus random jitter) and fail with a 500 at a given rate.
+
+Serve it and point the command line tool or the web GUI at it:
+
+    python benchmarks/fake_metube.py serve --port 8081 --library-size 10000 --latency 0.02 --error-rate 0.01
+    python youtube_to_metube.py --metube-url http://localhost:8081 --test-video "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+Or run the load generator, which starts its own server (or uses --target) and
+drives the code paths of the command line tool and the web GUI in-process:
+
+    python benchmarks/fake_metube.py load --library-size 10000 --videos 2000 --concurrency 1,4,8,16
+
+Scenarios: submit (YouTubeToMeTube.submit_videos_batch at each --concurrency,
+i.e. --max-in-flight), refresh (WebGUIHandler download-list refreshes),
+query (concurrent library pages from --clients threads) and delete
+(YouTubeToMeTube.delete_videos_batch). Each reports throughput and
+p50/p95/p99 latency.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_utils import percentile, quiet
+
+ENDPOINTS = ('add', 'downloads', 'history', 'files', 'info', 'delete', 'clear', 'download')
+SCENARIOS = ('submit', 'refresh', 'query', 'delete')
+FILE_SIZE = 50 * 1024 * 1024
+
+def synthetic_library(size, now=None, prefix=None):
+    """
+    MeTube 'done' entries for a library of size videos spread over 25 channel folders.
+    """
+    now = time.time() if now is None else now
+    prefix = f"v{size % 100000:05d}" if prefix is None else prefix
+    library = []
+    for index in range(size):
+        video_id = f"{prefix}{index:05d}"
+        folder = f"Channel {index % 25:02d}"
+        filename = f"Benchmark video {index} [{video_id}].mp4"
+        library.append({
+            'id': video_id,
+            'title': f"Benchmark video {index}",
+            'url': f"https://www.youtube.com/watch?v={video_id}",
+            'filename': filename,
+            'folder': folder,
+            'filepath': f"{folder}/{filename}",
+            'status': 'finished',
+            # MeTube reports nanoseconds
+            'timestamp': int((now - index * 600) * 1e9),
+            # Every third entry leaves its size to /files, as older MeTube versions do
+            'filesize': None if index % 3 == 0 else FILE_SIZE + index
+        })
+    return library
+
+class FakeMeTube:
+    """
+    In-memory MeTube state and API, independent of the HTTP server that exposes it.
+    """
+    def __init__(self, library_size=0, latency=0.0, jitter=0.0, error_rate=0.0, error_endpoints=ENDPOINTS,
+                 download_seconds=0.0, history_only=False, files_listing=True,
+                 download_dir='/nonexistent/metube-benchmark', seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_endpoints = set(error_endpoints)
+        self.download_seconds = download_seconds
+        self.history_only = history_only
+        self.files_listing = files_listing
+        self.download_dir = download_dir
+
+        self.lock = threading.Lock()
+        self.random = random.Random(seed)
+        # url -> entry, url -> (entry, ready time); like MeTube, a URL is the key everywhere
+        self.done = {}
+        self.queue = {}
+        # Real file sizes (entries may not report them) and download paths -> url
+        self.sizes = {}
+        self.paths = {}
+        self.added = 0
+        self.requests = {endpoint: 0 for endpoint in ENDPOINTS}
+        self.errors = {endpoint: 0 for endpoint in ENDPOINTS}
+
+        for entry in synthetic_library(library_size):
+            self._store(entry, FILE_SIZE + len(self.done))
+
+    def _store(self, entry, size):
+        self.done[entry['url']] = entry
+        self.sizes[entry['url']] = size
+        self.paths[entry['filepath']] = entry['url']
+        self.paths[entry['filename']] = entry['url']
+
+    def _forget(self, url):
+        entry = self.done.pop(url, None)
+        if entry is not None:
+            self.sizes.pop(url, None)
+            self.paths.pop(entry['filepath'], None)
+            self.paths.pop(entry['filename'], None)
+
+    def _promote(self):
+        # Queued downloads finish once their time is up
+        now = time.monotonic()
+        for url, (entry, ready) in list(self.queue.items()):
+            if ready <= now:
+                del self.queue[url]
+                entry['status'] = 'finished'
+                entry['timestamp'] = int(time.time() * 1e9)
+                self._store(entry, entry['filesize'])
+
+    def respond(self, method, path, payload=None):
+        """
+        Answer one API request with (status, body, headers), or None if path isn't part of the API.
+        """
+        endpoint = path.split('/')[1] if path.count('/') else ''
+        if endpoint not in ENDPOINTS:
+            return None
+
+        delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+
+        with self.lock:
+            self.requests[endpoint] += 1
+            if endpoint in self.error_endpoints and self.error_rate and self.random.random() < self.error_rate:
+                self.errors[endpoint] += 1
+                return 500, {'status': 'error', 'msg': 'Injected failure'}, {}
+
+            handler = getattr(self, f"_{method.lower()}_{endpoint}", None)
+            if handler is None:
+                return 405, {'status': 'error', 'msg': 'Method not allowed'}, {}
+            return handler(path, payload or {})
+
+    def _post_add(self, path, payload):
+        url = payload.get('url')
+        if not url:
+            return 400, {'status': 'error', 'msg': 'Missing URL'}, {}
+        self.added += 1
+        if url in self.done or url in self.queue:
+            return 200, {'status': 'ok'}, {}
+
+        video_id = parse_qs(urlparse(url).query).get('v', [f"added{self.added}"])[0]
+        folder = payload.get('folder') or ''
+        filename = f"{video_id}.mp4"
+        entry = {
+            'id': video_id, 'title': video_id, 'url': url, 'filename': filename, 'folder': folder,
+            'filepath': f"{folder}/{filename}" if folder else filename, 'status': 'pending',
+            'quality': payload.get('quality'), 'format': payload.get('format'),
+            'timestamp': int(time.time() * 1e9), 'filesize': FILE_SIZE
+        }
+        self.queue[url] = (entry, time.monotonic() + self.download_seconds)
+        if not self.download_seconds:
+            self._promote()
+        return 200, {'status': 'ok'}, {}
+
+    def _listing(self):
+        self._promote()
+        return {'queue': [entry for entry, _ in self.queue.values()], 'pending': [],
+                'done': list(self.done.values())}
+
+    def _get_downloads(self, path, payload):
+        if self.history_only:
+            return 404, {'status': 'error', 'msg': 'Not found'}, {}
+        return 200, self._listing(), {}
+
+    def _get_history(self, path, payload):
+        return 200, self._listing(), {}
+
+    def _get_files(self, path, payload):
+        if not self.files_listing:
+            return 404, {'status': 'error', 'msg': 'Not found'}, {}
+        self._promote()
+        return 200, {'files': [{'name': entry['filename'], 'path': entry['filepath'], 'size': self.sizes[url]}
+                               for url, entry in self.done.items()]}, {}
+
+    def _get_info(self, path, payload):
+        return 200, {'download_dir': self.download_dir, 'version': 'fake'}, {}
+
+    def _post_delete(self, path, payload):
+        ids = payload.get('ids') or []
+        if payload.get('where') == 'queue':
+            for url in ids:
+                self.queue.pop(url, None)
+        else:
+            for url in ids:
+                self._forget(url)
+        # MeTube answers ok even for identifiers it doesn't know
+        return 200, {'status': 'ok'}, {}
+
+    def _post_clear(self, path, payload):
+        for url in list(self.done):
+            self._forget(url)
+        return 200, {'status': 'ok'}, {}
+
+    def _head_download(self, path, payload):
+        self._promote()
+        url = self.paths.get(unquote(path[len('/download/'):]))
+        if url is None:
+            return 404, b'', {}
+        return 200, b'', {'Content-Type': 'video/mp4', 'Content-Length': str(self.sizes[url])}
+
+    def stats(self):
+        with self.lock:
+            return {'library': len(self.done), 'queued': len(self.queue), 'added': self.added,
+                    'requests': dict(self.requests), 'errors': dict(self.errors)}
+
+class QuietHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients drop connections mid-response on purpose
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+class MeTubeRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves server.metube; subclasses add routes by overriding fallback().
+    """
+    # Keep-alive, so pooled sessions behave as they do against the real server
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; without this, delayed ACKs add ~40ms per response
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status, body, content_type='text/html; charset=utf-8', headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+            content_type = 'application/json'
+        headers = dict(headers or {})
+        self.send_response(status)
+        self.send_header('Content-Type', headers.pop('Content-Type', content_type))
+        self.send_header('Content-Length', headers.pop('Content-Length', str(len(body))))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD' and body:
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                self.close_connection = True
+
+    def _route(self):
+        parsed = urlparse(self.path)
+        payload = None
+        if self.command == 'POST':
+            length = int(self.headers.get('Content-Length') or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError:
+                return self.send_body(400, {'status': 'error', 'msg': 'Invalid JSON'})
+
+        response = self.server.metube.respond(self.command, parsed.path, payload)
+        if response is not None:
+            return self.send_body(response[0], response[1], headers=response[2])
+        self.fallback(parsed)
+
+    def fallback(self, parsed):
+        self.send_body(404, b'Not found', 'text/plain')
+
+    do_GET = do_POST = do_HEAD = _route
+
+class FakeMeTubeServer:
+    """
+    A FakeMeTube behind an HTTP server on a background thread; use as a context manager.
+    """
+    handler_class = MeTubeRequestHandler
+
+    def __init__(self, metube=None, host='127.0.0.1', port=0):
+        self.httpd = QuietHTTPServer((host, port), self.handler_class)
+        self.httpd.metube = metube or FakeMeTube()
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def metube(self):
+        return self.httpd.metube
+
+    @metube.setter
+    def metube(self, metube):
+        self.httpd.metube = metube
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='fake-metube', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+# --- Load generator ---
+
+def summarize(latencies, failures, elapsed, **extra):
+    return {
+        'operations': len(latencies),
+        'failures': failures,
+        'seconds': elapsed,
+        'per_second': len(latencies) / elapsed if elapsed else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        **extra
+    }
+
+def load_submit(metube_url, videos, concurrency, run_id):
+    """
+    Submit videos new URLs the way the command line tool does, timing every /add.
+    """
+    from youtube_to_metube import YouTubeToMeTube
+
+    processor = YouTubeToMeTube(metube_url, max_in_flight=concurrency)
+    latencies = []
+    lock = threading.Lock()
+    submit = processor.submit_to_metube
+
+    def timed_submit(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return submit(*args, **kwargs)
+        finally:
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    processor.submit_to_metube = timed_submit
+    urls = [f"https://www.youtube.com/watch?v=L{run_id:04d}{index:06d}" for index in range(videos)]
+
+    start = time.perf_counter()
+    with quiet():
+        results = processor.submit_videos_batch(urls)
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, sum(1 for result in results if not result['success']), elapsed,
+                     concurrency=concurrency)
+
+def load_refresh(metube_url, rounds):
+    """
+    Refresh the web GUI's download list and library index repeatedly, as the fetch_downloaded job does.
+    """
+    import web_gui
+    web_gui.log_channel.echo = False
+
+    handler = web_gui.WebGUIHandler()
+    latencies = []
+    failures = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        round_start = time.perf_counter()
+        videos = handler.get_downloaded_videos(metube_url)
+        if videos is None:
+            failures += 1
+        else:
+            handler.update_downloads_snapshot(metube_url, videos)
+        latencies.append(time.perf_counter() - round_start)
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, failures, elapsed, first_ms=latencies[0] * 1000 if latencies else 0.0)
+
+def load_query(metube_url, clients, rounds, seed=None):
+    """
+    Page through the library from several clients at once, as the paged downloads view does.
+    """
+    import web_gui
+    web_gui.log_channel.echo = False
+
+    handler = web_gui.WebGUIHandler()
+    # Build the index once up front; the scenario measures queries against it
+    handler.query_library(metube_url)
+    pages = random.Random(seed)
+    total = handler.library_indexes[metube_url].stats()['total_videos'] or 1
+
+    latencies = []
+    failures = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal failures
+        for _ in range(rounds):
+            with lock:
+                params = {
+                    'page': pages.randint(1, max(1, total // 50)),
+                    'sort': pages.choice(['timestamp', 'title', 'size', 'folder']),
+                    'order': pages.choice(['asc', 'desc']),
+                    'search': pages.choice(['', '', 'video 1', 'channel 0'])
+                }
+            start = time.perf_counter()
+            try:
+                handler.query_library(metube_url, **params)
+                ok = True
+            except Exception:
+                ok = False
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                failures += 0 if ok else 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for _ in range(clients):
+            executor.submit(client)
+    elapsed = time.perf_counter() - start
+    return summarize(latencies, failures, elapsed, clients=clients)
+
+def load_delete(metube_url, videos):
+    """
+    Delete the oldest videos with batched /delete requests, as retention.py does.
+    """
+    from youtube_to_metube import YouTubeToMeTube
+
+    processor = YouTubeToMeTube(metube_url)
+    done = processor.list_done_downloads() or []
+    targets = done[-videos:] if videos else []
+    # Latency of each /delete request; one request covers a whole batch of videos
+    latencies = []
+
+    def record_delete(response, *args, **kwargs):
+        if urlparse(response.url).path == '/delete':
+            latencies.append(response.elapsed.total_seconds())
+
+    # The session is shared process-wide, so the hook only stays for this run
+    processor.session.hooks['response'].append(record_delete)
+    try:
+        start = time.perf_counter()
+        with quiet():
+            results = processor.delete_videos_batch(targets)
+        elapsed = time.perf_counter() - start
+    finally:
+        processor.session.hooks['response'].remove(record_delete)
+    failures = sum(1 for result in results if not result['success'])
+    return summarize(latencies, failures, elapsed, videos=len(results),
+                     videos_per_second=len(results) / elapsed if elapsed else 0.0)
+
+def format_result(name, result):
+    details = ', '.join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                        for key, value in result.items() if key not in ('seconds',))
+    return f"{name:<8} {result['seconds']:8.3f}s  {details}"
+
+def build_metube(args):
+    return FakeMeTube(
+        library_size=args.library_size,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        error_endpoints=args.error_endpoint or ENDPOINTS,
+        download_seconds=args.download_time,
+        history_only=args.history_only,
+        files_listing=not args.no_files,
+        seed=args.seed
+    )
+
+def run_load(args):
+    try:
+        concurrency = [int(value) for value in args.concurrency.split(',') if value.strip()]
+    except ValueError:
+        raise SystemExit('--concurrency must be comma-separated integers')
+
+    server = None
+    metube_url = args.target
+    if not metube_url:
+        server = FakeMeTubeServer(build_metube(args)).start()
+        metube_url = server.url
+        print(f"Fake MeTube on {metube_url} with {args.library_size} videos")
+
+    results = []
+    try:
+        for scenario in args.scenario or SCENARIOS:
+            if scenario == 'submit':
+                for run_id, level in enumerate(concurrency):
+                    results.append(('submit', load_submit(metube_url, args.videos, level, run_id)))
+                    print(format_result(*results[-1]))
+                continue
+            if scenario in ('refresh', 'query'):
+                try:
+                    import web_gui  # noqa: F401
+                except ImportError as e:
+                    print(f"{scenario:<8} skipped: web GUI dependencies missing ({e})")
+                    continue
+            if scenario == 'refresh':
+                results.append(('refresh', load_refresh(metube_url, args.rounds)))
+            elif scenario == 'query':
+                results.append(('query', load_query(metube_url, args.clients, args.rounds, args.seed)))
+            elif scenario == 'delete':
+                results.append(('delete', load_delete(metube_url, args.videos)))
+            print(format_result(*results[-1]))
+
+        if server is not None:
+            stats = server.metube.stats()
+            print(f"Server: {stats['library']} videos, requests {stats['requests']}, injected errors {stats['errors']}")
+    finally:
+        if server is not None:
+            server.stop()
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'options': vars(args), 'results': [{'scenario': name, **result} for name, result in results]},
+                      f, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake MeTube server and load generator')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--library-size', type=int, default=1000,
+                       help='Completed downloads the server starts with (default: 1000)')
+    common.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds to wait before answering each request (default: 0)')
+    common.add_argument('--jitter', type=float, default=0.0,
+                       help='Extra random delay of up to this many seconds per request (default: 0)')
+    common.add_argument('--error-rate', type=float, default=0.0,
+                       help='Fraction of requests answered with a 500 (default: 0)')
+    common.add_argument('--error-endpoint', action='append', choices=ENDPOINTS,
+                       help='Only inject errors on this endpoint (repeatable; default: all)')
+    common.add_argument('--download-time', type=float, default=0.0,
+                       help='Seconds an added video stays queued before it is done (default: 0)')
+    common.add_argument('--history-only', action='store_true',
+                       help='Answer /downloads with 404, like MeTube versions that only have /history')
+    common.add_argument('--no-files', action='store_true',
+                       help='Answer /files with 404, so sizes come from HEAD requests')
+    common.add_argument('--seed', type=int, help='Random seed for jitter, errors and queries')
+
+    serve = subparsers.add_parser('serve', parents=[common], help='Run the fake MeTube server')
+    serve.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    serve.add_argument('--port', type=int, default=8081, help='Port to listen on (default: 8081)')
+
+    load = subparsers.add_parser('load', parents=[common], help='Generate load and report latency')
+    load.add_argument('--target', help='URL of an already running (fake or real) MeTube instead of starting one')
+    load.add_argument('--scenario', action='append', choices=SCENARIOS,
+                      help='Run only this scenario (repeatable; default: all)')
+    load.add_argument('--videos', type=int, default=1000,
+                      help='Videos per submit and delete run (default: 1000)')
+    load.add_argument('--concurrency', default='1,4,8,16',
+                      help='Submissions in flight to try, comma-separated (default: 1,4,8,16)')
+    load.add_argument('--clients', type=int, default=8,
+                      help='Concurrent clients for the query scenario (default: 8)')
+    load.add_argument('--rounds', type=int, default=20,
+                      help='Refreshes, and queries per client (default: 20)')
+    load.add_argument('--json', metavar='FILE', help='Also write the results as JSON')
+
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        run_load(args)
+        return
+
+    server = FakeMeTubeServer(build_metube(args), args.host, args.port)
+    print(f"Fake MeTube on {server.url} with {args.library_size} videos (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for YouTube and MeTube, used by the pipeline benchmarks.
+
+The server answers the requests the scraper makes (channel pages, RSS feeds
+and watch pages) and, through FakeMeTube from fake_metube.py, the MeTube API
+calls of the submitter and web GUI (/add, /downloads, /history, /files,
+/info, /delete, ...), with a configurable delay per request so network
+latency can be simulated.
+
+YouTube pages are replayed from a directory of recordings when one is given,
+and generated otherwise. Recordings are matched by file name:
+
+    feed_<channel_id>.xml     RSS feed of a channel
+    channel_<handle>.html     page served for /@<handle>, /c/<handle> and /user/<handle>
+    watch_<video_id>.html     watch page of a video
+
+Anything without a recording is synthetic. A synthetic channel's handle says
+how many uploads it has: @bench1000 resolves to a channel whose feed lists
+1000 videos. Every 10th upload is a Short, every 17th a livestream and every
+23rd member-only, so filtering has something to reject; the rest are normal
+ten-minute videos. Watch pages are padded to a realistic size with the player
+response where YouTube puts it.
+
+Run it on its own to point other tools at it:
+
+    python benchmarks/fixture_server.py --port 8765 --latency 0.05 --library-size 1000
+
+YouTube requests are sent to it by mounting YouTubeRedirectAdapter on a
+requests.Session (see bench_pipeline.py), so the code under test keeps using
+its real https://www.youtube.com URLs.
+"""
+
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlparse, urlunparse
+
+from requests.adapters import HTTPAdapter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_metube import FakeMeTube, FakeMeTubeServer, MeTubeRequestHandler
+
+YOUTUBE_HOSTS = ('www.youtube.com', 'youtube.com', 'm.youtube.com')
+HANDLE_PATTERN = re.compile(r'^bench(\d+)$')
+CHANNEL_ID_PATTERN = re.compile(r'^UCbench(\d{17})$')
+VIDEO_ID_PATTERN = re.compile(r'^v(\d{5})(\d{5})$')
+
+def synthetic_channel_id(size):
+    return f"UCbench{size:017d}"
+
+def synthetic_video_id(size, index):
+    return f"v{size % 100000:05d}{index:05d}"
+
+def video_kind(index):
+    """
+    What a synthetic upload is: 'short', 'live', 'member' or 'normal'.
+    """
+    if index % 10 == 9:
+        return 'short'
+    if index % 17 == 16:
+        return 'live'
+    if index % 23 == 22:
+        return 'member'
+    return 'normal'
+
+def make_feed(channel_id, size):
+    entries = []
+    for index in range(size):
+        video_id = synthetic_video_id(size, index)
+        # Newest first, one upload an hour
+        published = time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(1700000000 - index * 3600))
+        entries.append(
+            f"<entry><id>yt:video:{video_id}</id><yt:videoId>{video_id}</yt:videoId>"
+            f"<yt:channelId>{channel_id}</yt:channelId><title>Benchmark video {index}</title>"
+            f"<link rel=\"alternate\" href=\"https://www.youtube.com/watch?v={video_id}\"/>"
+            f"<published>{published}</published></entry>"
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<feed xmlns:yt="http://www.youtube.com/xml/schemas/2015" xmlns="http://www.w3.org/2005/Atom">'
+        f"<yt:channelId>{channel_id}</yt:channelId><title>Benchmark channel</title>"
+        + ''.join(entries) + '</feed>'
+    )
+
+def make_channel_page(handle, channel_id, size, padding_kb=64):
+    video_ids = [synthetic_video_id(size, index) for index in range(min(size, 30))]
+    items = ','.join(f'{{"videoId":"{video_id}","title":"Benchmark video"}}' for video_id in video_ids)
+    return (
+        '<!DOCTYPE html><html><head>'
+        f'<link rel="canonical" href="https://www.youtube.com/channel/{channel_id}">'
+        f'<meta property="og:url" content="https://www.youtube.com/channel/{channel_id}">'
+        '</head><body>'
+        '<script>' + ('/*' + 'x' * (padding_kb * 1024) + '*/') + '</script>'
+        f'<script>var ytInitialData = {{"header":{{"channelId":"{channel_id}","title":"{handle}"}},'
+        f'"items":[{items}]}};</script>'
+        '</body></html>'
+    )
+
+def make_watch_page(video_id, index, page_kb=512):
+    kind = video_kind(index)
+    length = {'short': 45, 'live': 0}.get(kind, 600)
+    playability = ('{"status":"UNPLAYABLE","isAvailable":false,'
+                   '"reason":{"code":"MEMBERSHIP_CONTENT_NOT_AVAILABLE"}}' if kind == 'member'
+                   else '{"status":"OK"}')
+    player = (
+        f'{{"playabilityStatus":{playability},'
+        f'"videoDetails":{{"videoId":"{video_id}","title":"Benchmark video {index}",'
+        f'"lengthSeconds":"{length}","isLiveContent":{"true" if kind == "live" else "false"}}},'
+        f'"microformat":{{"playerMicroformatRenderer":{{"isShort":{"true" if kind == "short" else "false"}'
+        + (',"liveBroadcastDetails":{"isLiveNow":true}' if kind == 'live' else '') + '}}}'
+    )
+    # Related videos after ytInitialData carry markers that must not be read as this video's
+    related = '{"videoId":"relatedvid01","isLive":true,"title":"Someone else\'s stream"}'
+
+    head = '<!DOCTYPE html><html><head><title>Benchmark</title></head><body>'
+    # YouTube puts roughly a fifth of the page in front of the player response
+    lead = '<script>/*' + 'x' * (page_kb * 1024 // 5) + '*/</script>'
+    body = (f'<script>var ytInitialPlayerResponse = {player};</script>'
+            f'<script>var ytInitialData = {{"contents":[{related}]}};</script>')
+    tail_size = max(0, page_kb * 1024 - len(head) - len(lead) - len(body))
+    return head + lead + body + '<script>/*' + 'x' * tail_size + '*/</script></body></html>'
+
+class Fixtures:
+    """
+    Recorded pages by name, with synthetic pages for everything else.
+    """
+    def __init__(self, directory=None, watch_page_kb=512):
+        self.watch_page_kb = watch_page_kb
+        self.recorded = {}
+        if directory:
+            for name in os.listdir(directory):
+                with open(os.path.join(directory, name), 'rb') as f:
+                    self.recorded[os.path.splitext(name)[0]] = f.read()
+        # Synthetic pages are built once per name; channels and feeds are requested repeatedly
+        self.generated = {}
+        self.lock = threading.Lock()
+
+    def _page(self, name, build):
+        page = self.recorded.get(name)
+        if page is not None:
+            return page
+        with self.lock:
+            page = self.generated.get(name)
+        if page is None:
+            text = build()
+            if text is None:
+                return None
+            page = text.encode('utf-8')
+            if not name.startswith('watch_'):
+                with self.lock:
+                    self.generated[name] = page
+        return page
+
+    def channel_page(self, handle):
+        def build():
+            match = HANDLE_PATTERN.match(handle)
+            if not match:
+                return None
+            size = int(match.group(1))
+            return make_channel_page(handle, synthetic_channel_id(size), size)
+        return self._page(f"channel_{handle}", build)
+
+    def feed(self, channel_id):
+        def build():
+            match = CHANNEL_ID_PATTERN.match(channel_id)
+            if not match:
+                return None
+            return make_feed(channel_id, int(match.group(1)))
+        return self._page(f"feed_{channel_id}", build)
+
+    def watch_page(self, video_id):
+        def build():
+            match = VIDEO_ID_PATTERN.match(video_id)
+            if not match:
+                return None
+            return make_watch_page(video_id, int(match.group(2)), self.watch_page_kb)
+        return self._page(f"watch_{video_id}", build)
+
+class FixtureRequestHandler(MeTubeRequestHandler):
+    """
+    The fake MeTube API, with YouTube pages for every other path.
+    """
+    def fallback(self, parsed):
+        path = parsed.path
+        latency = self.server.latency
+        if latency:
+            time.sleep(latency)
+
+        fixtures = self.server.fixtures
+        page = None
+        content_type = 'text/html; charset=utf-8'
+        if path == '/watch':
+            page = fixtures.watch_page(parse_qs(parsed.query).get('v', [''])[0])
+        elif path == '/feeds/videos.xml':
+            page = fixtures.feed(parse_qs(parsed.query).get('channel_id', [''])[0])
+            content_type = 'application/atom+xml; charset=utf-8'
+        else:
+            match = re.match(r'^/(?:@|c/|user/)([^/]+)', path)
+            if match:
+                page = fixtures.channel_page(unquote(match.group(1)))
+
+        if page is None:
+            return self.send_body(404, b'Not found', 'text/plain')
+        self.send_body(200, page, content_type)
+
+class FixtureServer(FakeMeTubeServer):
+    """
+    The stand-in server on a background thread; use as a context manager or call start()/stop().
+    """
+    handler_class = FixtureRequestHandler
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, metube_latency=0.0, library_size=0,
+                 fixtures_dir=None, watch_page_kb=512):
+        super().__init__(FakeMeTube(library_size, latency=metube_latency), host, port)
+        self.httpd.latency = latency
+        self.httpd.fixtures = Fixtures(fixtures_dir, watch_page_kb)
+
+    def reset_library(self, size):
+        self.metube = FakeMeTube(size, latency=self.metube.latency)
+
+class YouTubeRedirectAdapter(HTTPAdapter):
+    """
+    Transport adapter sending requests for YouTube hosts to the fixture server instead.
+    """
+    def __init__(self, base_url, **kwargs):
+        self.base = urlparse(base_url)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parsed = urlparse(request.url)
+        if parsed.hostname in YOUTUBE_HOSTS:
+            request.url = urlunparse(parsed._replace(scheme=self.base.scheme, netloc=self.base.netloc))
+        return super().send(request, **kwargs)
+
+def redirect_youtube(session, base_url):
+    """
+    Route a session's YouTube traffic to the fixture server at base_url.
+    """
+    adapter = YouTubeRedirectAdapter(base_url, pool_maxsize=32)
+    for host in YOUTUBE_HOSTS:
+        session.mount(f"https://{host}/", adapter)
+        session.mount(f"http://{host}/", adapter)
+    return session
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve recorded or synthetic YouTube pages and a fake MeTube API')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                       help='Seconds to wait before answering each YouTube request')
+    parser.add_argument('--metube-latency', type=float, default=0.0,
+                       help='Seconds to wait before answering each MeTube request')
+    parser.add_argument('--library-size', type=int, default=0,
+                       help='Number of completed downloads the fake MeTube starts with')
+    parser.add_argument('--fixtures', help='Directory of recorded pages to replay')
+    parser.add_argument('--watch-page-kb', type=int, default=512,
+                       help='Size of synthetic watch pages in KiB (default: 512)')
+
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, args.latency, args.metube_latency, args.library_size,
+                           args.fixtures, args.watch_page_kb)
+    print(f"Serving fixtures on {server.url} (Ctrl+C to stop)")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+On-disk JSON stores for the caches shared by the CLI, web GUI and desktop GUI.
+
+Every cache lives in one directory (default ~/.cache/youtube-to-metube, override
+with the METUBE_SUB_CACHE_DIR environment variable) so separate processes
+pointed at the same channels reuse each other's work. Updates take an flock on
+a sidecar .lock file, so processes don't overwrite each other's entries; where
+fcntl is unavailable (Windows) only threads are serialised.
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def default_cache_dir():
+    """
+    Directory used for all persistent caches.
+    """
+    cache_dir = os.environ.get('METUBE_SUB_CACHE_DIR')
+    if not cache_dir:
+        cache_dir = os.path.join(os.path.expanduser('~'), '.cache', 'youtube-to-metube')
+    return cache_dir
+
+class JsonFileStore:
+    """
+    A JSON document on disk, written atomically and safe to share between threads and processes.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+
+    def load(self):
+        """
+        Read the document, returning an empty dict if it is missing or corrupt.
+        """
+        with self.lock:
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                return data if isinstance(data, dict) else {}
+            except (OSError, ValueError):
+                return {}
+
+    def save(self, data):
+        """
+        Replace the document on disk. Failures are reported but never raised.
+        """
+        with self.lock:
+            try:
+                directory = os.path.dirname(self.path) or '.'
+                os.makedirs(directory, exist_ok=True)
+                fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.json')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(data, f)
+                os.replace(tmp_path, self.path)
+                return True
+            except OSError as e:
+                print(f"Warning: could not write cache file {self.path}: {e}")
+                return False
+
+    @contextmanager
+    def _file_lock(self):
+        # Held across load-mutate-save so another process can't replace the file in between
+        lock_file = None
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                lock_file = open(self.path + '.lock', 'a')
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            except OSError as e:
+                print(f"Warning: could not lock cache file {self.path}: {e}")
+                if lock_file is not None:
+                    lock_file.close()
+                    lock_file = None
+        try:
+            yield
+        finally:
+            if lock_file is not None:
+                # Closing the file releases the lock
+                lock_file.close()
+
+    def update(self, mutate):
+        """
+        Load the latest document, apply mutate(data) to it and save it back.
+
+        Re-reading before every write, under the file lock, keeps entries added by other processes.
+        """
+        with self.lock, self._file_lock():
+            data = self.load()
+            mutate(data)
+            self.save(data)
+            return data
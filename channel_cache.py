@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Persistent cache of YouTube handle/username -> channel ID resolutions.
+
+Resolving an @handle, /c/ or /user/ URL means downloading up to three large
+channel pages, so results (including "not found") are kept on disk and reused
+by every front end until they expire.
+"""
+
+import os
+import time
+from cache_store import JsonFileStore, default_cache_dir
+
+# Handles whose page resolves to the wrong channel; these never expire
+KNOWN_CHANNELS = {
+    'LinusTechTips': 'UCXuqSBlHAE6Xw-yeJA0Tunw',  # Main LTT channel
+    'linus': 'UCXuqSBlHAE6Xw-yeJA0Tunw',          # Alternative
+    'ShortCircuit': 'UCdBK94H6oZT2Q7l0-b0xmMg',   # Short Circuit
+    'TechLinked': 'UCeeFfhMcJa1kjtfZAGskOCA',      # TechLinked
+    'ChannelSuperFun': 'UCdBK94H6oZT2Q7l0-b0xmMg'  # Channel Super Fun
+}
+
+# Returned by lookup() when there is no usable entry
+MISS = object()
+
+class ChannelIdCache:
+    def __init__(self, path=None, ttl=30 * 24 * 3600, negative_ttl=24 * 3600, guess_ttl=3600):
+        """
+        ttl applies to resolved channel IDs, negative_ttl to handles that did not resolve
+        and guess_ttl to IDs picked from a page without anything confirming them.
+        """
+        self.path = path or os.path.join(default_cache_dir(), 'channel_ids.json')
+        self.store = JsonFileStore(self.path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.guess_ttl = guess_ttl
+        self.pinned = {self._key(name): channel_id for name, channel_id in KNOWN_CHANNELS.items()}
+        self.entries = self.store.load()
+
+    def _key(self, username):
+        # Handles and legacy usernames are case-insensitive on YouTube
+        return username.strip().lower()
+
+    def lookup(self, username):
+        """
+        Return the cached channel ID, None for a cached negative result, or MISS.
+        """
+        key = self._key(username)
+        if key in self.pinned:
+            return self.pinned[key]
+
+        entry = self.entries.get(key)
+        if entry is None:
+            # Another process may have resolved it since we loaded the file
+            self.entries = self.store.load()
+            entry = self.entries.get(key)
+
+        if entry is None or entry.get('expires', 0) < time.time():
+            return MISS
+
+        return entry.get('channel_id')
+
+    def store_result(self, username, channel_id, guessed=False):
+        """
+        Remember a resolution; channel_id=None records a negative result.
+
+        A guessed channel ID is kept only briefly, so a wrong guess is soon retried.
+        """
+        if not channel_id:
+            ttl = self.negative_ttl
+        elif guessed:
+            ttl = self.guess_ttl
+        else:
+            ttl = self.ttl
+        entry = {
+            'channel_id': channel_id,
+            'expires': time.time() + ttl
+        }
+        key = self._key(username)
+
+        def mutate(data):
+            data[key] = entry
+            # Drop expired entries while we are rewriting the file anyway
+            now = time.time()
+            for stale_key in [k for k, v in data.items() if v.get('expires', 0) < now]:
+                del data[stale_key]
+
+        self.entries = self.store.update(mutate)
+
+    def invalidate(self, username):
+        """
+        Forget a cached resolution.
+        """
+        key = self._key(username)
+        self.entries = self.store.update(lambda data: data.pop(key, None))
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Versioned snapshots of MeTube's downloaded-videos list.
+
+The web GUI refreshes the list every few seconds. The server keeps the last
+snapshot and works out only the entries that were added, removed or changed,
+tagged with the version they apply to, so the library index is updated in
+place and clients are only told about refreshes that changed something.
+"""
+
+import threading
+import time
+
+def entry_key(video):
+    """
+    Stable identity of a download entry.
+    """
+    return video.get('id') or video.get('filepath') or video.get('filename')
+
+class DownloadsSnapshot:
+    def __init__(self):
+        # Starting from the clock means a restarted server never reuses a version a client still holds
+        self.version = int(time.time() * 1000)
+        self.videos = []
+        self.by_key = {}
+        self.lock = threading.Lock()
+
+    def update(self, videos):
+        """
+        Replace the snapshot with a fresh list.
+
+        Returns (delta, version): delta is None if nothing changed, a dict with
+        base_version, version, added ([index, video] pairs in ascending index
+        order), changed (videos) and removed (keys), or 'full' if the change
+        can't be expressed as a delta (e.g. existing entries were reordered).
+        """
+        with self.lock:
+            by_key = {}
+            for video in videos:
+                by_key.setdefault(entry_key(video), video)
+            videos = list(by_key.values())
+
+            added = [[index, video] for index, video in enumerate(videos) if entry_key(video) not in self.by_key]
+            removed = [key for key in self.by_key if key not in by_key]
+            changed = [video for video in videos
+                       if entry_key(video) in self.by_key and self.by_key[entry_key(video)] != video]
+
+            if not added and not removed and not changed:
+                return None, self.version
+
+            # Deltas keep the order of retained entries; anything else needs a full resync
+            kept_before = [key for key in self.by_key if key in by_key]
+            kept_after = [key for key in by_key if key in self.by_key]
+
+            base_version = self.version
+            self.version += 1
+            self.videos = videos
+            self.by_key = by_key
+
+            if kept_before != kept_after:
+                return 'full', self.version
+
+            return {
+                'base_version': base_version,
+                'version': self.version,
+                'added': added,
+                'changed': changed,
+                'removed': removed
+            }, self.version
+
+    def full(self):
+        """
+        Return (videos, version) for a client that needs the whole list.
+        """
+        with self.lock:
+            return list(self.videos), self.version
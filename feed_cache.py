@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Persistent store of RSS feed validators (ETag / Last-Modified) and parsed entries.
+
+Lets the scraper send conditional requests: when YouTube answers 304 Not
+Modified, the previously parsed entries are reused without downloading or
+parsing the feed again.
+"""
+
+import os
+import time
+from cache_store import JsonFileStore, default_cache_dir
+
+class FeedCache:
+    def __init__(self, path=None, max_feeds=5000):
+        self.path = path or os.path.join(default_cache_dir(), 'feeds.json')
+        self.store = JsonFileStore(self.path)
+        self.max_feeds = max_feeds
+        self.feeds = self.store.load()
+
+    def get(self, feed_url):
+        """
+        Return {'etag', 'last_modified', 'entries'} for a feed, or None.
+        """
+        feed = self.feeds.get(feed_url)
+        if feed is None:
+            # Another process may have fetched it since we loaded the file
+            self.feeds = self.store.load()
+            feed = self.feeds.get(feed_url)
+        return feed
+
+    def put(self, feed_url, etag, last_modified, entries):
+        """
+        Remember a feed's validators together with its parsed entries.
+        """
+        if not etag and not last_modified:
+            # Nothing to revalidate with, so there is no point storing it
+            return
+
+        feed = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'entries': entries,
+            'fetched_at': time.time()
+        }
+
+        def mutate(data):
+            data[feed_url] = feed
+            if len(data) > self.max_feeds:
+                oldest = sorted(data, key=lambda key: data[key].get('fetched_at', 0))
+                for key in oldest[:len(data) - self.max_feeds]:
+                    del data[key]
+
+        self.feeds = self.store.update(mutate)
+
+    def touch(self, feed_url):
+        """
+        Record that a feed was revalidated (kept in memory; saved with the next put).
+        """
+        feed = self.feeds.get(feed_url)
+        if feed is not None:
+            feed['fetched_at'] = time.time()
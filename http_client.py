@@ -0,0 +1,454 @@
+#!/usr/bin/env python3
+"""
+Rate limiting, retries and circuit breaking for outgoing HTTP requests.
+
+ThrottledSession is a requests.Session that keeps per-host state shared by
+every session in the process, so the scraper, the web GUI and any other
+component talking to the same host stay within one budget:
+
+- A token bucket paces requests to hosts that have a rate limit. The rate
+  adapts: every successful response raises it a little, up to the host's
+  maximum, and every 429 or 503 halves it.
+- 429 and 5xx responses, connection errors, timeouts and truncated bodies
+  put the whole host on hold for an exponential backoff with jitter, or for
+  as long as the server's Retry-After header asks. Idempotent requests (GET,
+  HEAD, OPTIONS) are then retried; the last response is returned if every
+  attempt fails. Sessions for YouTube and thumbnails time out reads after
+  30 seconds unless a request sets its own timeout.
+- After a run of consecutive failures the host's circuit opens and requests
+  fail at once with CircuitOpenError instead of piling onto a host that is
+  down or blocking us. After a cooldown one trial request is let through;
+  success closes the circuit, failure doubles the cooldown.
+
+The first session to use a host sets its rate limits.
+
+shared_session() hands out one session per role (YouTube pages, thumbnails,
+MeTube) for the whole process, with connection pools sized per host, so
+repeated operations reuse open connections. Set METUBE_SUB_HTTP2=1 (or call
+enable_http2()) to talk HTTP/2 to YouTube when httpx and h2 are installed.
+"""
+
+import email.utils
+import os
+import random
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from metrics import REGISTRY, instrument_session
+
+HTTP_RETRIES = REGISTRY.counter(
+    'metube_http_retries_total', 'Requests retried after a throttled or failed attempt, by host and reason',
+    ['host', 'reason'])
+HTTP_RATE = REGISTRY.gauge(
+    'metube_http_rate_limit', 'Current adaptive request rate per host (requests per second)', ['host'])
+CIRCUIT_OPEN = REGISTRY.gauge(
+    'metube_http_circuit_open', 'Whether a host\'s circuit breaker is open (1) or closed (0)', ['host'])
+
+YOUTUBE_HOSTS = ('www.youtube.com', 'youtube.com', 'm.youtube.com')
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'OPTIONS'])
+THROTTLE_STATUSES = frozenset([429, 503])
+# Statuses worth retrying; other 4xx answers are final
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+# Transport failures worth retrying, by the reason they are counted under; other errors (bad URLs, ...) are final
+RETRY_ERRORS = (
+    (requests.Timeout, 'timeout'),
+    (requests.ConnectionError, 'connection'),
+    (requests.exceptions.ChunkedEncodingError, 'incomplete'),
+    (requests.exceptions.ContentDecodingError, 'incomplete')
+)
+# (connect, read) seconds for requests to YouTube that don't set their own timeout
+DEFAULT_TIMEOUT = (10, 30)
+
+class CircuitOpenError(requests.ConnectionError):
+    """
+    Raised instead of sending a request while the host's circuit is open.
+    """
+
+def parse_retry_after(value, now=None):
+    """
+    Seconds to wait from a Retry-After header (delta-seconds or an HTTP date), or None.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    now = time.time() if now is None else now
+    return max(0.0, when.timestamp() - now)
+
+class HostState:
+    """
+    Token bucket, backoff and circuit breaker for one host.
+    """
+    def __init__(self, host, requests_per_second=None, max_requests_per_second=None, min_requests_per_second=0.2,
+                 failure_threshold=5, reset_timeout=30.0, max_reset_timeout=300.0):
+        self.host = host
+        self.lock = threading.Lock()
+
+        # No rate means no pacing; backoff and circuit breaking still apply
+        self.rate = requests_per_second or None
+        self.max_rate = max(max_requests_per_second or 0, self.rate or 0) or None
+        self.min_rate = min(min_requests_per_second, self.rate) if self.rate else min_requests_per_second
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+
+        self.blocked_until = 0.0
+        self.consecutive_failures = 0
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.base_reset_timeout = reset_timeout
+        self.max_reset_timeout = max_reset_timeout
+        self.opened_at = None
+        self.trial_in_flight = False
+
+        if self.rate:
+            HTTP_RATE.set(self.rate, host=host)
+        CIRCUIT_OPEN.set(0, host=host)
+
+    def acquire(self):
+        """
+        Block until the host may be sent a request; raises CircuitOpenError while the circuit is open.
+        """
+        is_trial = False
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.opened_at is not None and not is_trial:
+                    if now - self.opened_at < self.reset_timeout or self.trial_in_flight:
+                        raise CircuitOpenError(f"Too many failed requests to {self.host}; "
+                                               f"pausing requests for up to {self.reset_timeout:.0f}s")
+                    # Half-open: this request is the trial
+                    self.trial_in_flight = is_trial = True
+
+                delay = self.blocked_until - now
+                if delay <= 0 and self.rate:
+                    # Burst of up to one second's worth of requests
+                    capacity = max(1.0, self.rate)
+                    self.tokens = min(capacity, self.tokens + (now - self.updated) * self.rate)
+                    self.updated = now
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    delay = (1 - self.tokens) / self.rate
+                elif delay <= 0:
+                    return
+
+            time.sleep(delay)
+
+    def record_success(self):
+        with self.lock:
+            self.consecutive_failures = 0
+            if self.opened_at is not None:
+                self.opened_at = None
+                self.trial_in_flight = False
+                self.reset_timeout = self.base_reset_timeout
+                CIRCUIT_OPEN.set(0, host=self.host)
+            if self.rate and self.max_rate and self.rate < self.max_rate:
+                # Additive increase: about a hundred clean responses to go from nothing to the maximum
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 100)
+                HTTP_RATE.set(self.rate, host=self.host)
+
+    def record_failure(self, throttled=False, retry_after=None, backoff_base=0.5, max_backoff=60.0):
+        """
+        Register a failed attempt and return how long the host is put on hold.
+        """
+        with self.lock:
+            self.consecutive_failures += 1
+            if throttled and self.rate:
+                # Multiplicative decrease
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                HTTP_RATE.set(self.rate, host=self.host)
+
+            if retry_after is not None:
+                delay = min(retry_after, max_backoff * 5)
+            else:
+                # Full jitter keeps concurrent workers from retrying in lockstep
+                delay = random.uniform(0, min(max_backoff, backoff_base * 2 ** (self.consecutive_failures - 1)))
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+
+            if self.opened_at is not None:
+                # The trial failed
+                self.opened_at = time.monotonic()
+                self.trial_in_flight = False
+                self.reset_timeout = min(self.max_reset_timeout, self.reset_timeout * 2)
+            elif self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+                CIRCUIT_OPEN.set(1, host=self.host)
+            return delay
+
+    def release_trial(self):
+        """
+        Let another trial through when one ended without a verdict (e.g. it was cancelled).
+        """
+        with self.lock:
+            self.trial_in_flight = False
+
+class HostRegistry:
+    """
+    HostState per host name, shared by every ThrottledSession using the registry.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def get(self, host, **limits):
+        with self.lock:
+            state = self.hosts.get(host)
+            if state is None:
+                state = self.hosts[host] = HostState(host, **limits)
+            return state
+
+HOSTS = HostRegistry()
+
+def _retry_reason(error):
+    for error_class, reason in RETRY_ERRORS:
+        if isinstance(error, error_class):
+            return reason
+    return None
+
+class ThrottledSession(requests.Session):
+    def __init__(self, rate_limits=None, max_retries=3, backoff_base=0.5, max_backoff=60.0, registry=None,
+                 timeout=None):
+        """
+        rate_limits maps host names to (requests_per_second, max_requests_per_second); hosts not
+        listed are not paced. Requests with an idempotent method are retried up to max_retries times.
+        timeout applies to requests that don't pass their own.
+        """
+        super().__init__()
+        self.timeout = timeout
+        self.rate_limits = dict(rate_limits or {})
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.registry = registry or HOSTS
+
+    def host_state(self, host):
+        rate, max_rate = self.rate_limits.get(host, (None, None))
+        return self.registry.get(host, requests_per_second=rate, max_requests_per_second=max_rate)
+
+    def request(self, method, url, *args, **kwargs):
+        host = urlparse(url).hostname or ''
+        state = self.host_state(host)
+        retries = self.max_retries if method.upper() in IDEMPOTENT_METHODS else 0
+        if self.timeout is not None and kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+
+        attempt = 0
+        while True:
+            state.acquire()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except requests.RequestException as e:
+                reason = _retry_reason(e)
+                if reason is None:
+                    state.release_trial()
+                    raise
+                state.record_failure(backoff_base=self.backoff_base, max_backoff=self.max_backoff)
+                if attempt >= retries:
+                    raise
+                HTTP_RETRIES.inc(host=host, reason=reason)
+                attempt += 1
+                continue
+            except BaseException:
+                state.release_trial()
+                raise
+
+            if response.status_code not in RETRY_STATUSES:
+                state.record_success()
+                return response
+
+            state.record_failure(
+                throttled=response.status_code in THROTTLE_STATUSES,
+                retry_after=parse_retry_after(response.headers.get('Retry-After')),
+                backoff_base=self.backoff_base,
+                max_backoff=self.max_backoff
+            )
+            if attempt >= retries:
+                return response
+            HTTP_RETRIES.inc(host=host, reason=str(response.status_code))
+            response.close()
+            attempt += 1
+
+def youtube_session(requests_per_second=2.0, max_requests_per_second=None, **kwargs):
+    """
+    ThrottledSession pacing YouTube hosts, starting at requests_per_second (0: unpaced) and
+    speeding up to max_requests_per_second (default: five times the starting rate) while
+    YouTube answers normally.
+    """
+    if requests_per_second:
+        limit = (requests_per_second, max_requests_per_second or requests_per_second * 5)
+        kwargs.setdefault('rate_limits', {host: limit for host in YOUTUBE_HOSTS})
+    # A read that hangs must fail (and count against the circuit) instead of blocking a worker forever
+    kwargs.setdefault('timeout', DEFAULT_TIMEOUT)
+    return ThrottledSession(**kwargs)
+
+class _HTTPXBody:
+    """
+    File-like view of a streamed httpx response, standing in for urllib3's raw response.
+    """
+    def __init__(self, response):
+        self.response = response
+        self.chunks = response.iter_bytes()
+        self.buffer = b''
+
+    def read(self, amt=None, decode_content=True, **kwargs):
+        while amt is None or len(self.buffer) < amt:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        if amt is None:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:amt], self.buffer[amt:]
+        return data
+
+    def close(self):
+        self.response.close()
+
+    def release_conn(self):
+        self.response.close()
+
+class HTTP2Adapter(BaseAdapter):
+    """
+    Transport adapter sending requests through an httpx.Client, which negotiates HTTP/2 when
+    the server supports it. Needs httpx, and h2 for HTTP/2 itself.
+    """
+    def __init__(self, max_connections=20, http2=True):
+        import httpx
+        super().__init__()
+        self.httpx = httpx
+        self.client = httpx.Client(http2=http2, follow_redirects=False, limits=httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections))
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        httpx = self.httpx
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        else:
+            timeout = httpx.Timeout(timeout)
+
+        try:
+            httpx_request = self.client.build_request(request.method, request.url, headers=dict(request.headers),
+                                                      content=request.body, timeout=timeout)
+            httpx_response = self.client.send(httpx_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.TransportError as e:
+            raise requests.ConnectionError(e, request=request)
+
+        response = requests.Response()
+        response.status_code = httpx_response.status_code
+        response.reason = httpx_response.reason_phrase
+        # httpx already decodes the body, so the encoding header no longer applies
+        response.headers = CaseInsensitiveDict((name, value) for name, value in httpx_response.headers.items()
+                                               if name.lower() != 'content-encoding')
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = _HTTPXBody(httpx_response)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        self.client.close()
+
+# Connections kept per host, by role; shared_session(pool_size=...) raises them for busier setups
+POOL_SIZES = {'youtube': 20, 'thumbnails': 16, 'metube': 32}
+THUMBNAIL_HOSTS = ('img.youtube.com', 'i.ytimg.com')
+BROWSER_USER_AGENT = ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+                      'Chrome/120.0.0.0 Safari/537.36')
+
+_sessions = {}
+_pool_sizes = {}
+_sessions_lock = threading.Lock()
+_http2 = os.environ.get('METUBE_SUB_HTTP2', '').lower() in ('1', 'true', 'yes')
+
+def http2_available():
+    try:
+        import httpx  # noqa: F401
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def http2_enabled():
+    """
+    Whether YouTube requests go over HTTP/2.
+    """
+    return _http2 and http2_available()
+
+def enable_http2(enabled=True):
+    """
+    Use HTTP/2 for YouTube and thumbnail hosts (also set by METUBE_SUB_HTTP2=1).
+
+    Returns whether HTTP/2 is in use; without httpx and h2 everything stays on HTTP/1.1.
+    """
+    global _http2
+    with _sessions_lock:
+        _http2 = enabled
+        for role, session in _sessions.items():
+            _mount(role, session, _pool_sizes[role])
+    return http2_enabled()
+
+def _mount(role, session, pool_size):
+    if role == 'metube':
+        # A few MeTube instances at most, each with room for every concurrent request
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return
+
+    hosts = YOUTUBE_HOSTS if role == 'youtube' else THUMBNAIL_HOSTS
+    if http2_enabled():
+        # One client multiplexes requests over few connections; the limit only caps them
+        adapter = HTTP2Adapter(max_connections=pool_size)
+    else:
+        adapter = HTTPAdapter(pool_connections=len(hosts), pool_maxsize=pool_size)
+    for host in hosts:
+        session.mount(f"https://{host}/", adapter)
+
+def shared_session(role, pool_size=None, requests_per_second=2.0, max_requests_per_second=None):
+    """
+    The process-wide session for 'youtube', 'thumbnails' or 'metube', created on first use.
+
+    Every component shares it, so connections (and TLS handshakes) are reused
+    across operations. pool_size raises the connections kept per host; the
+    rate options only apply when the YouTube session is created.
+    """
+    if role not in POOL_SIZES:
+        raise ValueError(f"Unknown session role: {role}")
+
+    with _sessions_lock:
+        session = _sessions.get(role)
+        if session is None:
+            if role == 'youtube':
+                session = youtube_session(requests_per_second, max_requests_per_second)
+            elif role == 'thumbnails':
+                session = ThrottledSession(timeout=DEFAULT_TIMEOUT)
+            else:
+                session = ThrottledSession()
+            if role != 'metube':
+                session.headers['User-Agent'] = BROWSER_USER_AGENT
+            instrument_session(session)
+            _sessions[role] = session
+            _pool_sizes[role] = 0
+
+        size = max(pool_size or 0, POOL_SIZES[role])
+        if size > _pool_sizes[role]:
+            _mount(role, session, size)
+            _pool_sizes[role] = size
+        return session
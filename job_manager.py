@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Background jobs for the web GUI.
+
+Each operation (fetching a channel, submitting videos, refreshing or pruning a
+library, ...) runs as a job on a bounded thread pool. A job names the
+resources it touches, e.g. 'channel:<url>' or 'file:<metube>:<path>'; jobs
+that share a resource run one after another in the order they were
+submitted, and everything else runs concurrently. Jobs can be cancelled: a
+queued job never starts, and a running job sees job.cancelled and stops at its
+next check.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_current = threading.local()
+
+def current_job():
+    """
+    Return the job running on this thread, or None outside a job.
+    """
+    return getattr(_current, 'job', None)
+
+class Job:
+    def __init__(self, job_id, kind, target, resources, description, owner):
+        self.id = job_id
+        self.kind = kind
+        self.target = target
+        self.resources = frozenset(resources)
+        self.description = description
+        self.owner = owner
+        self.status = 'queued'
+        self.message = None
+        self.error = None
+        # Whatever target(job) returned, for callers that poll instead of listening to events
+        self.result = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def to_dict(self):
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'description': self.description,
+            'status': self.status,
+            'cancel_requested': self.cancelled,
+            'message': self.message,
+            'error': self.error,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished
+        }
+
+class JobManager:
+    # Finished jobs kept for status queries
+    HISTORY = 100
+
+    def __init__(self, max_workers=4, on_update=None):
+        """
+        on_update(job) is called whenever a job changes status or reports progress.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self.max_workers = max_workers
+        self.on_update = on_update
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.jobs = {}
+        self.pending = deque()
+        self.busy = set()
+        # Jobs handed to the executor; never more than it has threads, so 'running' means running
+        self.running = 0
+        self.finished = deque()
+
+    def submit(self, kind, target, resources=(), description='', owner=None):
+        """
+        Queue target(job) to run once none of its resources are in use, and return the job.
+        """
+        with self.lock:
+            job = Job(next(self.ids), kind, target, resources, description or kind, owner)
+            self.jobs[job.id] = job
+            self.pending.append(job)
+        self._notify(job)
+        self._dispatch()
+        return job
+
+    def _dispatch(self):
+        started = []
+        with self.lock:
+            # Resources claimed by earlier queued jobs stay blocked, so each resource is served in order
+            blocked = set(self.busy)
+            for job in list(self.pending):
+                if self.running >= self.max_workers:
+                    # The rest stay queued (and cancellable) until a worker frees up
+                    break
+                if not job.resources & blocked:
+                    self.pending.remove(job)
+                    self.busy |= job.resources
+                    self.running += 1
+                    job.status = 'running'
+                    job.started = time.time()
+                    started.append(job)
+                blocked |= job.resources
+
+        for job in started:
+            self._notify(job)
+            self.executor.submit(self._run, job)
+
+    def _run(self, job):
+        _current.job = job
+        try:
+            job.result = job.target(job)
+            job.status = 'cancelled' if job.cancelled else 'done'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            _current.job = None
+            job.finished = time.time()
+            with self.lock:
+                self.busy -= job.resources
+                self.running -= 1
+                self._retire(job)
+            self._notify(job)
+            self._dispatch()
+
+    def _retire(self, job):
+        self.finished.append(job.id)
+        while len(self.finished) > self.HISTORY:
+            self.jobs.pop(self.finished.popleft(), None)
+
+    def progress(self, message, job=None):
+        """
+        Record a progress message on a job (by default the one running on this thread).
+        """
+        job = job or current_job()
+        if job is None:
+            return
+        job.message = message
+        self._notify(job)
+
+    def cancel(self, job_id):
+        """
+        Cancel a job; returns False if it is unknown or already finished.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status not in ('queued', 'running'):
+                return False
+
+            job.cancel_event.set()
+            if job.status == 'queued':
+                self.pending.remove(job)
+                job.status = 'cancelled'
+                job.finished = time.time()
+                self._retire(job)
+                queued = True
+            else:
+                queued = False
+
+        self._notify(job)
+        if queued:
+            # Jobs behind it may now be free to start
+            self._dispatch()
+        return True
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self, owner=None):
+        with self.lock:
+            return [job for job in self.jobs.values() if owner is None or job.owner == owner]
+
+    def _notify(self, job):
+        if self.on_update:
+            try:
+                self.on_update(job)
+            except Exception as e:
+                print(f"Error reporting job {job.id}: {e}")
@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+In-memory index of the downloaded library for paged, sorted and searched queries.
+
+The index is kept in step with downloads_feed snapshots: deltas are applied
+entry by entry, keeping one sorted view per sort key, so a query only touches
+the page it returns (plus a scan of the matching entries when searching).
+"""
+
+import threading
+from bisect import bisect_left, insort
+from downloads_feed import entry_key
+
+SORT_KEYS = ('timestamp', 'size', 'title', 'folder')
+ORDERS = ('asc', 'desc')
+
+def video_folder(video):
+    """
+    Channel folder of a download: the first path component, else MeTube's folder field.
+    """
+    filepath = video.get('filepath') or video.get('filename') or ''
+    if '/' in filepath:
+        return filepath.split('/')[0]
+    return video.get('folder') or 'Unknown'
+
+def video_size(video):
+    """
+    File size in bytes, or None when unknown.
+    """
+    filesize = video.get('filesize')
+    if isinstance(filesize, (int, float)):
+        return filesize
+    try:
+        return float(filesize)
+    except (TypeError, ValueError):
+        return None
+
+def _check_sort(sort, order):
+    if sort not in SORT_KEYS:
+        raise ValueError(f"Unknown sort key: {sort}")
+    if order not in ORDERS:
+        raise ValueError(f"Unknown sort order: {order}")
+
+def _sort_value(video, sort_key):
+    if sort_key == 'timestamp':
+        timestamp = video.get('timestamp')
+        return timestamp if isinstance(timestamp, (int, float)) else 0
+    if sort_key == 'size':
+        size = video_size(video)
+        return size if size is not None else -1
+    if sort_key == 'title':
+        return (video.get('title') or '').lower()
+    return video_folder(video).lower()
+
+class LibraryIndex:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.records = {}
+        # sort key -> sorted list of (value, key)
+        self.sorted = {sort_key: [] for sort_key in SORT_KEYS}
+        self.total_size = 0
+        self.folders = {}
+
+    def rebuild(self, videos, version):
+        """
+        Replace the whole index, e.g. for a new or reordered snapshot.
+        """
+        with self.lock:
+            self.records = {}
+            self.total_size = 0
+            self.folders = {}
+            for video in videos:
+                self._add(video)
+            for sort_key in SORT_KEYS:
+                self.sorted[sort_key] = sorted(
+                    (_sort_value(record['video'], sort_key), key) for key, record in self.records.items()
+                )
+            self.version = version
+
+    def apply_delta(self, delta):
+        """
+        Apply a downloads_feed delta (added/changed/removed entries).
+        """
+        with self.lock:
+            for key in delta['removed']:
+                self._remove(key)
+            for video in delta['changed']:
+                self._remove(entry_key(video))
+                self._insert(video)
+            for _, video in delta['added']:
+                self._insert(video)
+            self.version = delta['version']
+
+    def _add(self, video):
+        key = entry_key(video)
+        if key in self.records:
+            self._remove(key)
+
+        folder = video_folder(video)
+        self.records[key] = {
+            'video': video,
+            # One lowercase haystack per entry for substring search
+            'text': ' '.join([video.get('title') or '', video.get('filename') or '', folder]).lower(),
+            'title': (video.get('title') or '').lower(),
+            'filename': (video.get('filename') or '').lower()
+        }
+        self.total_size += video_size(video) or 0
+        self.folders[folder] = self.folders.get(folder, 0) + 1
+        return key
+
+    def _insert(self, video):
+        key = self._add(video)
+        for sort_key in SORT_KEYS:
+            insort(self.sorted[sort_key], (_sort_value(video, sort_key), key))
+
+    def _remove(self, key):
+        record = self.records.pop(key, None)
+        if record is None:
+            return
+
+        video = record['video']
+        for sort_key in SORT_KEYS:
+            entries = self.sorted[sort_key]
+            position = bisect_left(entries, (_sort_value(video, sort_key), key))
+            if position < len(entries) and entries[position][1] == key:
+                del entries[position]
+
+        self.total_size -= video_size(video) or 0
+        folder = video_folder(video)
+        self.folders[folder] -= 1
+        if not self.folders[folder]:
+            del self.folders[folder]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'total_videos': len(self.records),
+                'total_channels': len(self.folders),
+                'total_size': self.total_size
+            }
+
+    def videos(self, sort='timestamp', order='desc'):
+        """
+        Return every indexed video in one sort order.
+        """
+        _check_sort(sort, order)
+        with self.lock:
+            entries = self.sorted[sort]
+            if order == 'desc':
+                entries = reversed(entries)
+            return [self.records[key]['video'] for _, key in entries]
+
+    def query(self, page=1, page_size=50, sort='timestamp', order='desc', search='', match='substring'):
+        """
+        Return one page of downloads.
+
+        sort is one of SORT_KEYS, order 'asc' or 'desc'. search filters on
+        title, filename and folder ('substring') or on the start of the title
+        or filename ('prefix').
+        """
+        _check_sort(sort, order)
+        page = max(1, int(page))
+        page_size = max(1, min(int(page_size), 500))
+        needle = (search or '').strip().lower()
+
+        with self.lock:
+            entries = self.sorted[sort]
+            if order == 'desc':
+                entries = reversed(entries)
+
+            if needle:
+                if match == 'prefix':
+                    matches = lambda record: record['title'].startswith(needle) or record['filename'].startswith(needle)
+                else:
+                    matches = lambda record: needle in record['text']
+                keys = [key for _, key in entries if matches(self.records[key])]
+                total = len(keys)
+            else:
+                keys = None
+                total = len(self.records)
+
+            # A page past the end (e.g. after deletions) shows the last page instead
+            pages = max(1, -(-total // page_size))
+            page = min(page, pages)
+            start = (page - 1) * page_size
+
+            if keys is not None:
+                page_keys = keys[start:start + page_size]
+            elif order == 'desc':
+                stop = len(self.sorted[sort]) - start
+                page_keys = [key for _, key in reversed(self.sorted[sort][max(0, stop - page_size):stop])]
+            else:
+                page_keys = [key for _, key in self.sorted[sort][start:start + page_size]]
+
+            return {
+                'videos': [self.records[key]['video'] for key in page_keys],
+                'total': total,
+                'page': page,
+                'page_size': page_size,
+                'pages': pages,
+                'sort': sort,
+                'order': order,
+                'search': search or '',
+                'version': self.version
+            }
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Buffered log delivery for the web GUI.
+
+Log messages are queued per destination (a Socket.IO room, or None for
+messages that only go to the console) and flushed by one background thread
+every interval, so a burst of messages becomes a single log_batch event and
+one console write. Each destination gets at most max_rate messages per second;
+the rest wait for later batches. When a backlog builds up, debug messages are
+dropped first and only counted, and past max_backlog everything below warning
+is dropped. Every batch that follows drops says how many were lost.
+"""
+
+import sys
+import threading
+import time
+from collections import deque
+
+LEVELS = {'debug': 10, 'info': 20, 'warning': 30, 'error': 40}
+
+class LogChannel:
+    def __init__(self, emit, interval=0.1, max_rate=200, debug_backlog=100, max_backlog=2000, echo=True):
+        """
+        emit(room, entries) delivers one batch; entries are dicts with message, level, job_id and time.
+        Rooms are never None when emit is called; echo also writes every entry to stdout.
+        """
+        self.emit = emit
+        self.interval = interval
+        self.batch_limit = max(1, int(max_rate * interval))
+        self.debug_backlog = debug_backlog
+        self.max_backlog = max_backlog
+        self.echo = echo
+
+        self.condition = threading.Condition()
+        # room -> deque of entries, and room -> {level: dropped count}
+        self.queues = {}
+        self.dropped = {}
+        self.thread = None
+
+    def log(self, message, level='info', room=None, job_id=None):
+        """
+        Queue a message for a room (None: console only).
+        """
+        if level not in LEVELS:
+            level = 'info'
+
+        with self.condition:
+            queue = self.queues.setdefault(room, deque())
+            if (level == 'debug' and len(queue) >= self.debug_backlog) or \
+                    (LEVELS[level] < LEVELS['warning'] and len(queue) >= self.max_backlog):
+                counts = self.dropped.setdefault(room, {})
+                counts[level] = counts.get(level, 0) + 1
+                return
+
+            queue.append({'message': message, 'level': level, 'job_id': job_id, 'time': time.time()})
+
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='log-channel', daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not any(self.queues.values()) and not self.dropped:
+                    self.condition.wait()
+
+            # Let a burst collect before sending it
+            time.sleep(self.interval)
+            self.flush()
+
+    def flush(self):
+        """
+        Send one batch per room with pending messages.
+        """
+        batches = []
+        with self.condition:
+            for room, queue in list(self.queues.items()):
+                entries = [queue.popleft() for _ in range(min(len(queue), self.batch_limit))]
+
+                counts = self.dropped.pop(room, None)
+                if counts:
+                    summary = ', '.join(f"{count} {level}" for level, count in counts.items())
+                    entries.append({'message': f"Log backlog: dropped {summary} message(s)", 'level': 'warning',
+                                    'job_id': None, 'time': time.time()})
+
+                if not queue:
+                    del self.queues[room]
+                if entries:
+                    batches.append((room, entries))
+
+        if self.echo and batches:
+            lines = []
+            for room, entries in batches:
+                for entry in entries:
+                    job = f" [job {entry['job_id']}]" if entry['job_id'] else ''
+                    lines.append(f"[{entry['level'].upper()}]{job} {entry['message']}")
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+
+        for room, entries in batches:
+            if room is None:
+                continue
+            try:
+                self.emit(room, entries)
+            except Exception as e:
+                sys.stderr.write(f"Error sending logs: {e}\n")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Local index of downloaded media files and their sizes.
+
+When the GUI runs on the same host as MeTube (or has its download directory
+mounted), file sizes are read straight from the filesystem instead of asking
+MeTube over HTTP. The directory tree is walked once with os.scandir; later
+refreshes only re-list directories whose mtime changed, which covers files
+being added, removed or renamed into place when a download finishes.
+
+The download directory is taken from the METUBE_DOWNLOAD_DIR environment
+variable, else the download_dir MeTube reports in /info, else the first common
+location that exists here.
+"""
+
+import os
+import threading
+import time
+
+DOWNLOAD_DIR_ENV = 'METUBE_DOWNLOAD_DIR'
+
+COMMON_DOWNLOAD_DIRS = [
+    '/downloads',
+    './downloads',
+    'downloads',
+    '/app/downloads',
+    '/data/downloads'
+]
+
+def find_download_dir(reported_dir=None):
+    """
+    Return the first usable local download directory, or None if MeTube's files aren't reachable here.
+    """
+    candidates = [os.environ.get(DOWNLOAD_DIR_ENV), reported_dir] + COMMON_DOWNLOAD_DIRS
+    for candidate in candidates:
+        if candidate and os.path.isdir(candidate):
+            return os.path.abspath(candidate)
+    return None
+
+class MediaScanner:
+    def __init__(self, root, min_interval=2.0):
+        """
+        min_interval limits how often lookups trigger a refresh of the tree.
+        """
+        self.root = os.path.abspath(root)
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        # Directory path -> {'mtime', 'files' (relative paths), 'subdirs' (absolute paths)}
+        self.dirs = {}
+        # Relative path ('/'-separated, as MeTube reports it) -> (size, mtime)
+        self.files = {}
+        self.by_name = None
+        self.last_refresh = None
+
+    def refresh(self, force=False):
+        """
+        Bring the index up to date, re-listing only directories that changed since the last refresh.
+        """
+        with self.lock:
+            now = time.monotonic()
+            if not force and self.last_refresh is not None and now - self.last_refresh < self.min_interval:
+                return
+            self.last_refresh = now
+
+            seen = set()
+            stack = [self.root]
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    continue
+
+                seen.add(path)
+                entry = self.dirs.get(path)
+                if entry is None or entry['mtime'] != mtime:
+                    entry = self._list_dir(path, mtime, entry)
+                    self.dirs[path] = entry
+                stack.extend(entry['subdirs'])
+
+            # Directories that disappeared take their files with them
+            for path in [path for path in self.dirs if path not in seen]:
+                for relative_path in self.dirs.pop(path)['files']:
+                    self.files.pop(relative_path, None)
+                self.by_name = None
+
+    def _list_dir(self, path, mtime, old_entry):
+        files = set()
+        subdirs = set()
+
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            subdirs.add(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            relative_path = os.path.relpath(entry.path, self.root).replace(os.sep, '/')
+                            self.files[relative_path] = (stat.st_size, stat.st_mtime)
+                            files.add(relative_path)
+                    except OSError:
+                        continue
+        except OSError:
+            pass
+
+        if old_entry is not None:
+            for relative_path in old_entry['files'] - files:
+                self.files.pop(relative_path, None)
+
+        self.by_name = None
+        return {'mtime': mtime, 'files': files, 'subdirs': subdirs}
+
+    def stat(self, relative_path):
+        """
+        Return (size, mtime) for a path relative to the download directory, or None.
+        """
+        self.refresh()
+        return self.files.get(relative_path.replace(os.sep, '/').lstrip('/'))
+
+    def lookup(self, filename, filepath=None):
+        """
+        Return the size of a downloaded file by MeTube filepath or filename, or None.
+        """
+        self.refresh()
+
+        for candidate in (filepath, filename):
+            if candidate:
+                found = self.files.get(candidate.replace(os.sep, '/').lstrip('/'))
+                if found:
+                    return found[0]
+
+        if filename:
+            with self.lock:
+                if self.by_name is None:
+                    self.by_name = {}
+                    for relative_path in self.files:
+                        self.by_name.setdefault(relative_path.rsplit('/', 1)[-1], []).append(relative_path)
+                relative_path = self._best_match(self.by_name.get(os.path.basename(filename), ()),
+                                                 filepath or filename)
+                found = self.files.get(relative_path) if relative_path else None
+            if found:
+                return found[0]
+
+        return None
+
+    def _best_match(self, relative_paths, path):
+        """
+        The indexed path sharing the most trailing components with path, or None if that is ambiguous.
+
+        The same filename often exists in several channel folders, so a bare
+        name only matches when it is unique.
+        """
+        if len(relative_paths) == 1:
+            return relative_paths[0]
+
+        parts = path.replace(os.sep, '/').strip('/').split('/')
+        best = None
+        best_length = 0
+        tied = False
+        for relative_path in relative_paths:
+            candidate = relative_path.split('/')
+            length = 0
+            while (length < len(parts) and length < len(candidate)
+                   and parts[-1 - length] == candidate[-1 - length]):
+                length += 1
+            if length > best_length:
+                best, best_length, tied = relative_path, length, False
+            elif length == best_length:
+                tied = True
+        return None if tied else best
+
+    def __len__(self):
+        return len(self.files)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Process-wide metrics for the scraper, the MeTube client and the web GUI.
+
+Counters, gauges and histograms live in one registry and can be rendered in
+the Prometheus text format (the web GUI serves it at /metrics) or as a JSON
+summary (printed by the command line tool with --metrics-json). Everything is
+kept in memory with no extra dependencies.
+
+HTTP traffic is recorded by instrument_session(), which adds a response hook
+to a requests.Session: request counts by host, method and status, latency
+until the response headers arrived, and body bytes as they are read.
+"""
+
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = list(zip(labelnames, key)) + (extra or [])
+    if not pairs:
+        return ''
+    escaped = ['{}="{}"'.format(name, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for name, value in pairs]
+    return '{' + ','.join(escaped) + '}'
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, None, value) for key, value in self.values.items()]
+
+    def summary(self):
+        with self.lock:
+            return {','.join(key) or 'total': value for key, value in self.values.items()}
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def __init__(self, name, description, labelnames=()):
+        super().__init__(name, description, labelnames)
+        # Label key -> callable evaluated when the gauge is read
+        self.functions = {}
+
+    def set(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function, **labels):
+        """
+        Read the value from function() whenever metrics are collected, e.g. a queue's length.
+        """
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            self.functions[key] = function
+
+    def _collect(self):
+        with self.lock:
+            values = dict(self.values)
+            functions = dict(self.functions)
+        for key, function in functions.items():
+            try:
+                values[key] = function()
+            except Exception:
+                continue
+        return values
+
+    def samples(self):
+        return [(self.name, key, None, value) for key, value in self._collect().items()]
+
+    def summary(self):
+        return {','.join(key) or 'value': value for key, value in self._collect().items()}
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self.lock:
+            entry = self.values.get(key)
+            if entry is None:
+                entry = self.values[key] = {'counts': [0] * len(self.buckets), 'count': 0, 'sum': 0.0,
+                                            'max': 0.0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry['counts'][index] += 1
+                    break
+            entry['count'] += 1
+            entry['sum'] += value
+            entry['max'] = max(entry['max'], value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe how long the with-block takes, including when it raises.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, entry in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, entry['counts']):
+                    cumulative += count
+                    samples.append((self.name + '_bucket', key, [('le', repr(float(bound)))], cumulative))
+                samples.append((self.name + '_bucket', key, [('le', '+Inf')], entry['count']))
+                samples.append((self.name + '_sum', key, None, entry['sum']))
+                samples.append((self.name + '_count', key, None, entry['count']))
+        return samples
+
+    def _quantile(self, entry, quantile):
+        # Upper bound of the bucket holding the quantile; past the last bucket, the largest value seen
+        rank = quantile * entry['count']
+        cumulative = 0
+        for bound, count in zip(self.buckets, entry['counts']):
+            cumulative += count
+            if cumulative >= rank:
+                return min(bound, entry['max'])
+        return entry['max']
+
+    def summary(self):
+        with self.lock:
+            return {','.join(key) or 'all': {
+                'count': entry['count'],
+                'total_seconds': round(entry['sum'], 6),
+                'avg_seconds': round(entry['sum'] / entry['count'], 6) if entry['count'] else 0,
+                'p50_seconds': round(self._quantile(entry, 0.5), 6),
+                'p95_seconds': round(self._quantile(entry, 0.95), 6),
+                'max_seconds': round(entry['max'], 6)
+            } for key, entry in self.values.items()}
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.metrics = {}
+
+    def _register(self, cls, name, description, labelnames, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = cls(name, description, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, description, labelnames=()):
+        return self._register(Counter, name, description, labelnames)
+
+    def gauge(self, name, description, labelnames=()):
+        return self._register(Gauge, name, description, labelnames)
+
+    def histogram(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, description, labelnames, buckets=buckets)
+
+    def render_prometheus(self):
+        """
+        All metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(metric.labelnames, key, extra)} {value}")
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):
+        """
+        All metrics as a JSON-serialisable dict, skipping ones that recorded nothing.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        result = {}
+        for metric in metrics:
+            values = metric.summary()
+            if values:
+                result[metric.name] = values
+        return result
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'metube_stage_duration_seconds', 'Time spent per pipeline stage', ['stage'])
+HTTP_REQUESTS = REGISTRY.counter(
+    'metube_http_requests_total', 'HTTP responses received, by host, method and status', ['host', 'method', 'status'])
+HTTP_SECONDS = REGISTRY.histogram(
+    'metube_http_response_seconds', 'Time until HTTP response headers arrived, by host', ['host'])
+HTTP_BYTES = REGISTRY.counter(
+    'metube_http_response_bytes_total', 'HTTP response body bytes read, by host', ['host'])
+CACHE_LOOKUPS = REGISTRY.counter(
+    'metube_cache_lookups_total', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result'])
+QUEUE_DEPTH = REGISTRY.gauge(
+    'metube_queue_depth', 'Items waiting or in progress, by queue', ['queue'])
+
+def stage_timer(stage):
+    """
+    Context manager timing one pipeline stage.
+    """
+    return STAGE_SECONDS.time(stage=stage)
+
+def timed(stage):
+    """
+    Decorator timing every call of a function as one pipeline stage.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with STAGE_SECONDS.time(stage=stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_cache(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result='hit' if hit else 'miss')
+
+def _host(url):
+    return urlparse(url).netloc or 'unknown'
+
+def _record_response(response, *args, **kwargs):
+    host = _host(response.url)
+    method = response.request.method if response.request is not None else 'GET'
+    HTTP_REQUESTS.inc(host=host, method=method, status=str(response.status_code))
+    HTTP_SECONDS.observe(response.elapsed.total_seconds(), host=host)
+
+    # Count body bytes as they are read, so streamed pages closed early only count what was downloaded
+    raw = response.raw
+    read = getattr(raw, 'read', None)
+    if read is not None and not getattr(raw, '_metrics_counted', False):
+        def counting_read(*read_args, **read_kwargs):
+            data = read(*read_args, **read_kwargs)
+            if data:
+                HTTP_BYTES.inc(len(data), host=host)
+            return data
+        try:
+            raw.read = counting_read
+            raw._metrics_counted = True
+        except AttributeError:
+            pass
+    return response
+
+async def record_httpx_response(response):
+    """
+    httpx event hook counting responses of the asyncio pipeline.
+    """
+    HTTP_REQUESTS.inc(host=response.url.netloc.decode('ascii', 'replace') or 'unknown',
+                      method=response.request.method, status=str(response.status_code))
+
+def instrument_session(session):
+    """
+    Record every response made through a requests.Session. Safe to call more than once.
+    """
+    if _record_response not in session.hooks['response']:
+        session.hooks['response'].append(_record_response)
+    return session
+
+def write_summary(destination='-'):
+    """
+    Write the JSON summary to stdout ('-') or to a file.
+    """
+    text = json.dumps(REGISTRY.summary(), indent=2, sort_keys=True)
+    if destination == '-':
+        print("\n=== Metrics ===")
+        print(text)
+    else:
+        with open(destination, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
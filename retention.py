@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Retention rules for pruning the downloaded library.
+
+A policy limits how many videos each channel folder keeps, how old a video may
+get and how many bytes the whole library may use. Planning walks the library
+once, newest first: a video is kept if it is within the age limit, its folder
+still has room and it fits in the byte budget. The count and age rules keep
+each channel's newest uploads, but the byte budget does not look at folders;
+once it is used up, every older video is deleted whichever channel it is
+from. Plans can be printed as a dry run or applied through batched MeTube
+deletes.
+
+Run it from cron (or with --interval) to keep disk usage bounded:
+
+    python retention.py --metube-url http://your-metube-server:8081 --max-per-folder 20 --max-total-size 500G --apply
+
+Without --apply it only reports what it would delete, like POST /api/retention
+without "dry_run": false.
+"""
+
+import argparse
+import re
+import time
+from library_index import video_folder, video_size
+from media_scanner import MediaScanner, find_download_dir
+from youtube_to_metube import YouTubeToMeTube
+
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+REASONS = {
+    'max_age': 'older than the age limit',
+    'max_per_folder': 'beyond the per-folder count',
+    'max_total_bytes': 'over the total size limit'
+}
+
+def parse_size(text):
+    """
+    Parse a byte count such as '500G', '1.5TB' or '123456'.
+    """
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)(?:i?b)?\s*$', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {text!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+def timestamp_seconds(timestamp):
+    """
+    Unix time in seconds from a MeTube timestamp (seconds, milliseconds or nanoseconds), or None.
+    """
+    if not isinstance(timestamp, (int, float)) or timestamp <= 0:
+        return None
+    if timestamp > 1e17:
+        return timestamp / 1e9
+    if timestamp > 1e12:
+        return timestamp / 1e3
+    return float(timestamp)
+
+class RetentionPolicy:
+    def __init__(self, max_per_folder=None, max_age_days=None, max_total_bytes=None, folder_limits=None):
+        """
+        Every limit is optional; folder_limits maps a channel folder to its own max count.
+        """
+        self.max_per_folder = max_per_folder
+        self.max_age_days = max_age_days
+        self.max_total_bytes = max_total_bytes
+        self.folder_limits = dict(folder_limits or {})
+
+        limits = [max_per_folder, max_age_days, max_total_bytes] + list(self.folder_limits.values())
+        if any(limit is not None and limit < 0 for limit in limits):
+            raise ValueError("Retention limits can't be negative")
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a policy from a JSON payload; max_total_bytes may also be given as max_total_size ('500G').
+        """
+        known = {'max_per_folder', 'max_age_days', 'max_total_bytes', 'max_total_size', 'folder_limits'}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown retention rules: {', '.join(sorted(unknown))}")
+
+        def optional(key, convert):
+            value = data.get(key)
+            if value is None or value == '':
+                return None
+            try:
+                return convert(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid value for {key}: {value!r}")
+
+        max_total_bytes = optional('max_total_bytes', int)
+        if max_total_bytes is None:
+            max_total_bytes = optional('max_total_size', parse_size)
+
+        folder_limits = data.get('folder_limits') or {}
+        if not isinstance(folder_limits, dict):
+            raise ValueError("folder_limits must map folder names to counts")
+        try:
+            folder_limits = {folder: int(limit) for folder, limit in folder_limits.items()}
+        except (TypeError, ValueError):
+            raise ValueError("folder_limits must map folder names to counts")
+
+        return cls(
+            max_per_folder=optional('max_per_folder', int),
+            max_age_days=optional('max_age_days', float),
+            max_total_bytes=max_total_bytes,
+            folder_limits=folder_limits
+        )
+
+    def to_dict(self):
+        return {
+            'max_per_folder': self.max_per_folder,
+            'max_age_days': self.max_age_days,
+            'max_total_bytes': self.max_total_bytes,
+            'folder_limits': dict(self.folder_limits)
+        }
+
+    def is_empty(self):
+        return (self.max_per_folder is None and self.max_age_days is None and self.max_total_bytes is None
+                and not self.folder_limits)
+
+def plan_retention(videos, policy, now=None):
+    """
+    Decide which downloads a policy removes.
+
+    Videos are walked newest first (videos without a timestamp count as oldest).
+    A video is kept if it is within the age limit, its folder hasn't reached its
+    count and it fits in what is left of the byte budget; once the budget runs
+    out, every older video goes too. Videos of unknown age are never removed by
+    the age rule, and unknown sizes count as zero bytes.
+
+    Returns a report with the deletions ({'video', 'reasons'}) newest first,
+    totals for kept and deleted videos and a count per reason.
+    """
+    now = time.time() if now is None else now
+    max_age = policy.max_age_days * 86400 if policy.max_age_days is not None else None
+
+    # Timsort makes this a single linear pass when the input is already in index order
+    ordered = sorted(videos, key=lambda video: timestamp_seconds(video.get('timestamp')) or 0, reverse=True)
+
+    kept_per_folder = {}
+    kept_videos = 0
+    kept_bytes = 0
+    over_budget = False
+    deletions = []
+    delete_bytes = 0
+    by_reason = {reason: 0 for reason in REASONS}
+    unknown_sizes = 0
+
+    for video in ordered:
+        folder = video_folder(video)
+        size = video_size(video)
+        if size is None:
+            unknown_sizes += 1
+            size = 0
+
+        reasons = []
+        seconds = timestamp_seconds(video.get('timestamp'))
+        if max_age is not None and seconds is not None and now - seconds > max_age:
+            reasons.append('max_age')
+
+        limit = policy.folder_limits.get(folder, policy.max_per_folder)
+        if limit is not None and kept_per_folder.get(folder, 0) >= limit:
+            reasons.append('max_per_folder')
+
+        if policy.max_total_bytes is not None and not reasons:
+            over_budget = over_budget or kept_bytes + size > policy.max_total_bytes
+        if over_budget:
+            reasons.append('max_total_bytes')
+
+        if reasons:
+            deletions.append({'video': video, 'reasons': reasons})
+            delete_bytes += size
+            for reason in reasons:
+                by_reason[reason] += 1
+        else:
+            kept_per_folder[folder] = kept_per_folder.get(folder, 0) + 1
+            kept_videos += 1
+            kept_bytes += size
+
+    return {
+        'policy': policy.to_dict(),
+        'generated_at': now,
+        'total_videos': len(ordered),
+        'kept_videos': kept_videos,
+        'kept_bytes': kept_bytes,
+        'deletions': deletions,
+        'delete_bytes': delete_bytes,
+        'by_reason': by_reason,
+        'unknown_sizes': unknown_sizes
+    }
+
+def apply_retention(processor, report, on_result=None):
+    """
+    Delete a plan's videos through YouTubeToMeTube.delete_videos_batch and return its results.
+    """
+    return processor.delete_videos_batch([deletion['video'] for deletion in report['deletions']],
+                                         on_result=on_result)
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024:
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{int(size)} B"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def format_report(report, limit=20):
+    """
+    Human-readable summary of a plan, listing up to limit deletions.
+    """
+    deletions = report['deletions']
+    lines = [
+        f"Library: {report['total_videos']} videos",
+        f"Keep:    {report['kept_videos']} videos ({format_size(report['kept_bytes'])})",
+        f"Delete:  {len(deletions)} videos ({format_size(report['delete_bytes'])})"
+    ]
+    for reason, count in report['by_reason'].items():
+        if count:
+            lines.append(f"  {count} {REASONS[reason]}")
+    if report['unknown_sizes']:
+        lines.append(f"Note: {report['unknown_sizes']} videos have no known size and count as 0 bytes")
+
+    for deletion in deletions[:limit]:
+        video = deletion['video']
+        name = video.get('filepath') or video.get('filename') or video.get('title') or video.get('url')
+        lines.append(f"  - {name} ({', '.join(REASONS[reason] for reason in deletion['reasons'])})")
+    if len(deletions) > limit:
+        lines.append(f"  ... and {len(deletions) - limit} more")
+
+    return '\n'.join(lines)
+
+def load_library(processor):
+    """
+    Fetch MeTube's completed downloads, filling in missing sizes from the local download directory if reachable.
+    """
+    done = processor.list_done_downloads()
+    if done is None:
+        return None
+
+    videos = []
+    for entry in done:
+        videos.append({
+            'id': entry.get('id'),
+            'title': entry.get('title'),
+            'url': entry.get('url'),
+            'filename': entry.get('filename'),
+            'filepath': entry.get('filepath', entry.get('filename', '')),
+            'folder': entry.get('folder', ''),
+            'timestamp': entry.get('timestamp'),
+            'filesize': entry.get('filesize')
+        })
+
+    download_dir = find_download_dir()
+    if download_dir:
+        scanner = MediaScanner(download_dir)
+        for video in videos:
+            if video_size(video) is None:
+                size = scanner.lookup(video['filename'], video['filepath'])
+                if size is not None:
+                    video['filesize'] = size
+
+    return videos
+
+def run_once(processor, policy, dry_run):
+    videos = load_library(processor)
+    if videos is None:
+        print("Could not fetch the download list from MeTube")
+        return
+
+    report = plan_retention(videos, policy)
+    print(format_report(report))
+
+    if dry_run or not report['deletions']:
+        return
+
+    def on_result(result, completed, total):
+        video = result['video']
+        status = "✓" if result['success'] else "✗"
+        print(f"[{completed}/{total}] {status} {video.get('filepath') or video.get('filename')}")
+
+    results = apply_retention(processor, report, on_result=on_result)
+    print(f"Deleted {sum(1 for result in results if result['success'])} of {len(results)} videos")
+
+def main():
+    parser = argparse.ArgumentParser(description='Delete downloads from MeTube that fall outside retention limits')
+    parser.add_argument('--metube-url', default='http://192.168.1.76:8081',
+                       help='MeTube instance URL (default: http://192.168.1.76:8081)')
+    parser.add_argument('--max-per-folder', type=int,
+                       help='Keep at most this many videos per channel folder')
+    parser.add_argument('--folder-limit', action='append', default=[], metavar='FOLDER=COUNT',
+                       help='Per-folder count overriding --max-per-folder (repeatable)')
+    parser.add_argument('--max-age-days', type=float,
+                       help='Delete videos downloaded more than this many days ago')
+    parser.add_argument('--max-total-size',
+                       help='Keep the library under this size, deleting the oldest videos first (e.g. 500G)')
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--apply', action='store_true',
+                     help='Delete the videos outside the limits (default: only report them)')
+    mode.add_argument('--dry-run', action='store_true',
+                     help='Only report what would be deleted (the default)')
+    parser.add_argument('--interval', type=float,
+                       help='Repeat every this many seconds instead of running once')
+
+    args = parser.parse_args()
+
+    folder_limits = {}
+    for item in args.folder_limit:
+        folder, _, count = item.rpartition('=')
+        if not folder or not count.isdigit():
+            parser.error(f"--folder-limit must look like FOLDER=COUNT, got {item!r}")
+        folder_limits[folder] = int(count)
+
+    try:
+        policy = RetentionPolicy(
+            max_per_folder=args.max_per_folder,
+            max_age_days=args.max_age_days,
+            max_total_bytes=parse_size(args.max_total_size) if args.max_total_size else None,
+            folder_limits=folder_limits
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    if policy.is_empty():
+        parser.error('Give at least one of --max-per-folder, --folder-limit, --max-age-days or --max-total-size')
+
+    processor = YouTubeToMeTube(args.metube_url)
+
+    while True:
+        run_once(processor, policy, dry_run=not args.apply)
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Persistent per-channel ledger of videos that have already been handled.
+
+Incremental polling uses it to skip videos that were submitted to MeTube (or
+rejected by the filter) on an earlier run, so only new uploads are validated
+and submitted.
+"""
+
+import os
+import time
+from cache_store import JsonFileStore, default_cache_dir
+
+class SeenVideoLedger:
+    def __init__(self, path=None, max_ids_per_channel=1000):
+        """
+        max_ids_per_channel bounds the ledger; RSS feeds only list the newest 15 uploads.
+        """
+        self.path = path or os.path.join(default_cache_dir(), 'seen_videos.json')
+        self.store = JsonFileStore(self.path)
+        self.max_ids_per_channel = max_ids_per_channel
+
+    def _key(self, channel_url):
+        return channel_url.strip().rstrip('/').lower()
+
+    def get_channel(self, channel_url):
+        """
+        Return the ledger entry for a channel, or None if it has never been polled.
+        """
+        return self.store.load().get(self._key(channel_url))
+
+    def new_entries(self, channel_url, entries):
+        """
+        Return the feed entries that have not been handled yet, keeping feed order.
+        """
+        channel = self.get_channel(channel_url)
+        if channel is None:
+            return list(entries)
+
+        seen = set(channel.get('video_ids', []))
+        return [entry for entry in entries if entry['video_id'] not in seen]
+
+    def mark_seen(self, channel_url, entries):
+        """
+        Record feed entries as handled and advance the channel's last seen timestamp.
+        """
+        key = self._key(channel_url)
+
+        def mutate(data):
+            channel = data.setdefault(key, {'video_ids': [], 'last_published': None})
+            video_ids = channel['video_ids']
+            known = set(video_ids)
+
+            for entry in entries:
+                if entry['video_id'] not in known:
+                    video_ids.append(entry['video_id'])
+                    known.add(entry['video_id'])
+
+                published = entry.get('published')
+                # ISO 8601 timestamps in the same zone compare correctly as strings
+                if published and (channel['last_published'] is None or published > channel['last_published']):
+                    channel['last_published'] = published
+
+            # Oldest IDs go first once the channel's list is full
+            if len(video_ids) > self.max_ids_per_channel:
+                del video_ids[:len(video_ids) - self.max_ids_per_channel]
+
+            channel['last_polled'] = time.time()
+
+        self.store.update(mutate)
+
+    def reset(self, channel_url):
+        """
+        Forget everything recorded for a channel.
+        """
+        key = self._key(channel_url)
+        self.store.update(lambda data: data.pop(key, None))
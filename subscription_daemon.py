@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+YouTube to MeTube Subscription Daemon
+
+Long-running process that polls many channels from a channel list file, each on
+its own interval, and submits new uploads to MeTube. One process replaces a
+cron job per channel: HTTP sessions, caches and the seen-video ledger are shared
+across all channels.
+
+Channel list format (one channel per line, '#' starts a comment):
+
+    https://www.youtube.com/@channelname
+    https://www.youtube.com/@otherchannel  interval=900 count=3 quality=1080p format=mp4 filter=no
+"""
+
+import argparse
+import heapq
+import os
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from http_client import shared_session
+from youtube_to_metube import YouTubeToMeTube
+from seen_ledger import SeenVideoLedger
+
+class Subscription:
+    def __init__(self, channel_url, interval, count=5, quality='best', format_type='any', filter_content=True):
+        self.channel_url = channel_url
+        self.interval = interval
+        self.count = count
+        self.quality = quality
+        self.format_type = format_type
+        self.filter_content = filter_content
+
+    def settings(self):
+        return (self.interval, self.count, self.quality, self.format_type, self.filter_content)
+
+def load_subscriptions(path, default_interval, default_count=5, default_quality='best', default_format='any'):
+    """
+    Parse a channel list file into {channel_url: Subscription}.
+    """
+    subscriptions = {}
+
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+
+            parts = line.split()
+            channel_url = parts[0]
+            options = {}
+            for part in parts[1:]:
+                if '=' not in part:
+                    print(f"Warning: ignoring '{part}' on line {line_number} of {path}")
+                    continue
+                key, value = part.split('=', 1)
+                options[key.strip().lower()] = value.strip()
+
+            try:
+                subscriptions[channel_url] = Subscription(
+                    channel_url,
+                    interval=float(options.get('interval', default_interval)),
+                    count=int(options.get('count', default_count)),
+                    quality=options.get('quality', default_quality),
+                    format_type=options.get('format', default_format),
+                    filter_content=options.get('filter', 'yes').lower() not in ('no', 'false', '0', 'off')
+                )
+            except ValueError as e:
+                print(f"Warning: skipping line {line_number} of {path}: {e}")
+
+    return subscriptions
+
+class SubscriptionDaemon:
+    def __init__(self, processor, channels_file, default_interval=3600, jitter=0.1,
+                 max_concurrent=4, default_count=5, default_quality='best', default_format='any'):
+        self.processor = processor
+        self.channels_file = channels_file
+        self.default_interval = default_interval
+        self.jitter = jitter
+        self.max_concurrent = max(1, max_concurrent)
+        self.defaults = (default_count, default_quality, default_format)
+
+        self.subscriptions = {}
+        self.channels_mtime = None
+        # Priority queue of (next_run, sequence, channel_url)
+        self.schedule = []
+        self.sequence = 0
+        self.running = {}
+        self.stop_event = threading.Event()
+
+    def _jittered(self, interval):
+        """
+        Spread polls out so channels with the same interval don't fire together.
+        """
+        spread = interval * self.jitter
+        return max(1.0, interval + random.uniform(-spread, spread))
+
+    def _schedule(self, channel_url, run_at):
+        self.sequence += 1
+        heapq.heappush(self.schedule, (run_at, self.sequence, channel_url))
+
+    def reload_channels(self):
+        """
+        (Re)read the channel list when it changes; new channels are staggered over their first interval.
+        """
+        try:
+            mtime = os.path.getmtime(self.channels_file)
+        except OSError as e:
+            print(f"Cannot read channel list {self.channels_file}: {e}")
+            return
+
+        if mtime == self.channels_mtime:
+            return
+
+        self.channels_mtime = mtime
+        count, quality, format_type = self.defaults
+        subscriptions = load_subscriptions(self.channels_file, self.default_interval, count, quality, format_type)
+
+        now = time.time()
+        added = [url for url in subscriptions if url not in self.subscriptions]
+        removed = [url for url in self.subscriptions if url not in subscriptions]
+
+        # A channel removed and re-added may still be queued or running
+        queued = {url for _, _, url in self.schedule} | set(self.running.values())
+        for channel_url in added:
+            if channel_url in queued:
+                continue
+            subscription = subscriptions[channel_url]
+            self._schedule(channel_url, now + random.uniform(0, min(subscription.interval, 60.0)))
+
+        self.subscriptions = subscriptions
+        # Removed channels are dropped lazily when they reach the front of the queue
+        print(f"Loaded {len(subscriptions)} channels ({len(added)} added, {len(removed)} removed)")
+
+    def poll(self, subscription):
+        """
+        Poll one channel and submit any new uploads.
+        """
+        try:
+            self.processor.process_channel(
+                subscription.channel_url,
+                subscription.count,
+                subscription.quality,
+                subscription.format_type,
+                subscription.filter_content,
+                incremental=True
+            )
+        except Exception as e:
+            print(f"Error polling {subscription.channel_url}: {e}")
+
+    def run(self):
+        """
+        Run until stop() is called or the process receives SIGINT/SIGTERM.
+        """
+        self.reload_channels()
+        print(f"Subscription daemon started with {len(self.subscriptions)} channels "
+              f"(up to {self.max_concurrent} polled at once)")
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent)
+        try:
+            while not self.stop_event.is_set():
+                self.reload_channels()
+                now = time.time()
+
+                # Start every due channel we have capacity for
+                while self.schedule and self.schedule[0][0] <= now and len(self.running) < self.max_concurrent:
+                    _, _, channel_url = heapq.heappop(self.schedule)
+                    subscription = self.subscriptions.get(channel_url)
+                    if subscription is None:
+                        continue
+                    future = executor.submit(self.poll, subscription)
+                    self.running[future] = channel_url
+
+                # Reschedule channels whose poll finished; a channel is never polled twice at once
+                for future in [f for f in self.running if f.done()]:
+                    channel_url = self.running.pop(future)
+                    subscription = self.subscriptions.get(channel_url)
+                    if subscription is not None:
+                        self._schedule(channel_url, time.time() + self._jittered(subscription.interval))
+
+                # Sleep until the next channel is due or a running poll finishes
+                if self.schedule and len(self.running) < self.max_concurrent:
+                    timeout = min(max(0.0, self.schedule[0][0] - time.time()), 5.0)
+                else:
+                    timeout = 5.0
+
+                if self.running:
+                    wait(list(self.running), timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    self.stop_event.wait(timeout)
+        finally:
+            print("Stopping subscription daemon...")
+            executor.shutdown(wait=True)
+
+    def stop(self, *args):
+        self.stop_event.set()
+
+def main():
+    parser = argparse.ArgumentParser(description='Poll many YouTube channels and submit new uploads to MeTube')
+    parser.add_argument('--channels', required=True,
+                       help='Channel list file (one channel URL per line, optional key=value settings)')
+    parser.add_argument('--metube-url', default='http://192.168.1.76:8081',
+                       help='MeTube instance URL (default: http://192.168.1.76:8081)')
+    parser.add_argument('--interval', type=float, default=3600,
+                       help='Default seconds between polls of a channel (default: 3600)')
+    parser.add_argument('--jitter', type=float, default=0.1,
+                       help='Random fraction of the interval added or removed per poll (default: 0.1)')
+    parser.add_argument('--concurrency', type=int, default=4,
+                       help='Number of channels polled at the same time (default: 4)')
+    parser.add_argument('--count', type=int, default=5,
+                       help='Default max new videos submitted per poll (default: 5)')
+    parser.add_argument('--quality', default='best',
+                       choices=['best', '2160p', '1440p', '1080p', '720p', '480p', 'worst', 'audio'],
+                       help='Default video quality (default: best)')
+    parser.add_argument('--format', default='any',
+                       choices=['any', 'mp4', 'm4a', 'mp3', 'opus', 'wav', 'flac'],
+                       help='Default video format (default: any)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Number of videos validated in parallel per channel (default: 4)')
+    parser.add_argument('--rate-limit', type=float, default=2.0,
+                       help='Starting YouTube requests per second, shared by all channels; adapts to '
+                            'throttling (default: 2.0, 0 for no limit)')
+    parser.add_argument('--max-rate', type=float,
+                       help='Highest YouTube requests per second to speed up to (default: 5x --rate-limit)')
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                       help='Number of submissions sent to MeTube at the same time per channel (default: 4)')
+    parser.add_argument('--ledger',
+                       help='Seen-video ledger file (default: in the cache directory)')
+
+    args = parser.parse_args()
+
+    ledger = SeenVideoLedger(args.ledger) if args.ledger else SeenVideoLedger()
+    processor = YouTubeToMeTube(args.metube_url, args.workers, args.rate_limit, ledger, args.max_in_flight,
+                                args.max_rate)
+
+    # Connection pools per host sized for every channel's workers at once
+    pool_size = max(10, args.concurrency * max(args.workers, args.max_in_flight))
+    for role in ('youtube', 'metube'):
+        shared_session(role, pool_size=pool_size)
+
+    daemon = SubscriptionDaemon(
+        processor,
+        args.channels,
+        default_interval=args.interval,
+        jitter=args.jitter,
+        max_concurrent=args.concurrency,
+        default_count=args.count,
+        default_quality=args.quality,
+        default_format=args.format
+    )
+
+    signal.signal(signal.SIGTERM, daemon.stop)
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        daemon.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""Test that watch page scanning stops at ytInitialData."""
+
+from video_metadata import WatchPageScanner, classify_video, extract_video_metadata
+
+# Title but no lengthSeconds in the player response; the related videos after it are live and short
+PAGE = (b'<script>var ytInitialPlayerResponse = {"videoDetails":{"title":"A normal upload"}};</script>'
+        b'<script>var ytInitialData = {"contents":[{"isLive":true,"isShort":true,"lengthSeconds":"30"}]};</script>')
+
+def test_related_videos_do_not_leak():
+    metadata = extract_video_metadata(PAGE.decode('utf-8'))
+    assert metadata['title'] == "A normal upload"
+    assert metadata['length_seconds'] is None
+    assert not metadata['is_live'] and not metadata['is_short']
+    assert not metadata['complete']
+    assert classify_video(metadata, "https://www.youtube.com/watch?v=aaaaaaaaaaa") == (True, "valid")
+
+def test_later_chunks_are_not_scanned():
+    scanner = WatchPageScanner(stop_on_verdict=False)
+    split = PAGE.index(b'var ytInitialData') + 5
+    assert scanner.feed(PAGE[:split]) is False
+    assert scanner.feed(PAGE[split:]) is True
+    assert scanner.feed(b'"isLive":true,"lengthSeconds":"30"') is True
+    metadata = scanner.finish(reached_eof=True)
+    assert not metadata['is_live'] and metadata['length_seconds'] is None
+    assert not metadata['complete']
+
+if __name__ == "__main__":
+    test_related_videos_do_not_leak()
+    test_later_chunks_are_not_scanned()
+    print("OK")
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of video thumbnails, served by the web GUI at /thumbnail/<video_id>.
+
+Browsers ask the GUI for thumbnails instead of img.youtube.com. The first
+image YouTube has for a video (maxresdefault, then hqdefault, then mqdefault)
+is downloaded once through the shared thumbnails session and kept on disk;
+every request after that is answered from the cache, downscaled to the width
+the page asked for. Originals and scaled copies share one size budget (256 MB
+by default, or METUBE_SUB_THUMBNAIL_CACHE_MB), and the least recently served
+files are removed when it is exceeded.
+
+Scaling needs Pillow (pip install Pillow); without it the original image is
+served whatever width is asked for.
+"""
+
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+from cache_store import default_cache_dir
+from http_client import shared_session
+from metrics import REGISTRY, record_cache
+
+THUMBNAIL_URL = 'https://img.youtube.com/vi/{video_id}/{name}.jpg'
+# Largest first; YouTube answers 404 for sizes a video doesn't have
+SOURCES = ('maxresdefault', 'hqdefault', 'mqdefault')
+# Requested widths are rounded up to one of these, so each video has few scaled copies
+WIDTHS = (120, 240, 320, 480, 640, 960)
+VIDEO_ID = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+THUMBNAIL_CACHE_BYTES = REGISTRY.gauge(
+    'metube_thumbnail_cache_bytes', 'Bytes of thumbnails kept in the on-disk cache')
+
+# Every live cache, so the gauge is bound once and covers them all
+_caches = weakref.WeakSet()
+
+def _cached_bytes():
+    # Caches sharing a directory hold the same files
+    return sum({cache.directory: cache.total_bytes for cache in list(_caches)}.values())
+
+THUMBNAIL_CACHE_BYTES.set_function(_cached_bytes)
+
+def default_max_bytes():
+    try:
+        return int(float(os.environ.get('METUBE_SUB_THUMBNAIL_CACHE_MB', 256)) * 1024 * 1024)
+    except ValueError:
+        return 256 * 1024 * 1024
+
+class ThumbnailCache:
+    def __init__(self, directory=None, max_bytes=None, session=None, missing_ttl=3600, quality=82):
+        """
+        missing_ttl is how long a video without any thumbnail is answered from memory before asking YouTube again.
+        """
+        self.directory = directory or os.path.join(default_cache_dir(), 'thumbnails')
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+        self.session = session or shared_session('thumbnails')
+        self.missing_ttl = missing_ttl
+        self.quality = quality
+        self.lock = threading.Lock()
+        # File name -> size, least recently served first
+        self.files = None
+        self.total_bytes = 0
+        # Video ID -> when YouTube last had no thumbnail for it, oldest first
+        self.missing = OrderedDict()
+        # Video ID -> [lock held while its original downloads, requests using it], so concurrent
+        # requests fetch it once
+        self.fetching = {}
+        with self.lock:
+            self._load_index()
+        _caches.add(self)
+
+    def snap_width(self, width):
+        """
+        The scaled width served for a requested one, or None for the original image.
+        """
+        if not width or Image is None:
+            return None
+        for candidate in WIDTHS:
+            if candidate >= width:
+                return candidate
+        return None
+
+    def get(self, video_id, width=None):
+        """
+        JPEG bytes of a video's thumbnail at most width pixels wide, or None if YouTube has none.
+
+        Raises ValueError for a malformed video ID and requests.RequestException
+        when YouTube could not be reached.
+        """
+        if not VIDEO_ID.match(video_id or ''):
+            raise ValueError(f"Invalid video ID: {video_id!r}")
+
+        width = self.snap_width(width)
+        if width:
+            name = f"{video_id}-{width}.jpg"
+            data = self._read(name)
+            if data is not None:
+                record_cache('thumbnails', True)
+                return data
+
+        original, downloaded = self._original(video_id)
+        record_cache('thumbnails', not downloaded)
+        if original is None or not width:
+            return original
+
+        scaled = self._scale(original, width)
+        if scaled is None:
+            # Already narrow enough (or not an image Pillow can read)
+            return original
+        self._write(name, scaled)
+        return scaled
+
+    def _original(self, video_id):
+        """
+        (image, downloaded) for the full-size thumbnail, fetching it from YouTube if it isn't cached.
+        """
+        name = f"{video_id}.jpg"
+        data = self._read(name)
+        if data is not None:
+            return data, False
+
+        with self.lock:
+            fetch = self.fetching.setdefault(video_id, [threading.Lock(), 0])
+            fetch[1] += 1
+            fetch_lock = fetch[0]
+        try:
+            with fetch_lock:
+                # Another request may have fetched it (or found there is none) while we waited
+                data = self._read(name)
+                if data is not None:
+                    return data, False
+                with self.lock:
+                    self._expire_missing()
+                    if video_id in self.missing:
+                        return None, False
+
+                data = self._download(video_id)
+                if data is None:
+                    with self.lock:
+                        self.missing[video_id] = time.time()
+                        self._expire_missing()
+                    return None, True
+                self._write(name, data)
+                return data, True
+        finally:
+            with self.lock:
+                # Dropped only by the last request, so nobody arriving meanwhile gets a second lock
+                fetch[1] -= 1
+                if fetch[1] == 0 and self.fetching.get(video_id) is fetch:
+                    del self.fetching[video_id]
+
+    def _expire_missing(self):
+        # Called with self.lock held; entries are added in time order, so expired ones are at the front
+        cutoff = time.time() - self.missing_ttl
+        while self.missing and next(iter(self.missing.values())) <= cutoff:
+            self.missing.popitem(last=False)
+
+    def _download(self, video_id):
+        for source in SOURCES:
+            response = self.session.get(THUMBNAIL_URL.format(video_id=video_id, name=source), timeout=10)
+            if response.status_code == 200 and response.content:
+                return response.content
+            if response.status_code != 404:
+                response.raise_for_status()
+        return None
+
+    def _scale(self, data, width):
+        try:
+            with Image.open(io.BytesIO(data)) as image:
+                if image.width <= width:
+                    return None
+                height = max(1, round(image.height * width / image.width))
+                # Lets the JPEG decoder skip detail we are about to throw away
+                image.draft('RGB', (width, height))
+                scaled = image.convert('RGB').resize((width, height), Image.LANCZOS)
+            output = io.BytesIO()
+            scaled.save(output, 'JPEG', quality=self.quality, optimize=True, progressive=True)
+            return output.getvalue()
+        except (OSError, ValueError):
+            return None
+
+    def _load_index(self):
+        # Called with self.lock held
+        if self.files is not None:
+            return
+        entries = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if entry.name.endswith('.jpg') and entry.is_file():
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+        except OSError:
+            pass
+        self.files = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.total_bytes = sum(self.files.values())
+
+    def _read(self, name):
+        with self.lock:
+            self._load_index()
+            if name not in self.files:
+                return None
+            self.files.move_to_end(name)
+
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except OSError:
+            with self.lock:
+                self.total_bytes -= self.files.pop(name, 0)
+            return None
+        try:
+            # Keeps the serving order across restarts, when the index is rebuilt from mtimes
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, name, data):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix='.part')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, os.path.join(self.directory, name))
+        except OSError as e:
+            print(f"Warning: could not write thumbnail {name}: {e}")
+            return
+
+        with self.lock:
+            self._load_index()
+            self.total_bytes += len(data) - self.files.pop(name, 0)
+            self.files[name] = len(data)
+            evicted = []
+            while self.total_bytes > self.max_bytes and len(self.files) > 1:
+                old_name, size = self.files.popitem(last=False)
+                self.total_bytes -= size
+                evicted.append(old_name)
+
+        for old_name in evicted:
+            try:
+                os.remove(os.path.join(self.directory, old_name))
+            except OSError:
+                pass
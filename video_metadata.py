@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Video metadata extraction and caching.
+
+A watch page is downloaded once per video: the fields needed for filtering
+(member-only, Short and livestream flags, duration) and for the web details
+view (title, duration) are pulled out in one step and cached by video ID, in
+memory (LRU) and on disk. Pages are scanned as they stream in, and the download
+stops as soon as the answer is known.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from cache_store import JsonFileStore, default_cache_dir
+from youtube_patterns import VIDEO_ID_PATTERN, WATCH_PAGE_END, scan_watch_page
+
+# Generic livestream keywords (avoid channel-specific terms)
+GENERIC_LIVE_KEYWORDS = ['live stream', 'livestream', '🔴', 'live:', ' live ', 'stream:']
+
+def extract_video_id(video_url):
+    """
+    Return the 11-character video ID from a watch/short/youtu.be URL, or "".
+    """
+    match = VIDEO_ID_PATTERN.search(video_url or '')
+    return match.group(1) if match else ""
+
+class WatchPageScanner:
+    """
+    Incrementally scan a watch page as it downloads.
+
+    feed() returns True as soon as the page has told us enough: a reason to
+    reject the video (when stop_on_verdict is set) or every field we use.
+    """
+    # Carried between chunks so markers split across a boundary are still found
+    OVERLAP = 4096
+
+    def __init__(self, stop_on_verdict=True):
+        self.stop_on_verdict = stop_on_verdict
+        self.metadata = {
+            'title': None,
+            'length_seconds': None,
+            'is_member_only': False,
+            'is_short': False,
+            'is_live': False,
+            'complete': False
+        }
+        self.tail = b''
+        self.seen_end = False
+
+    def feed(self, chunk):
+        if self.seen_end:
+            return True
+
+        buffer = self.tail + chunk
+        metadata = self.metadata
+
+        end = buffer.find(WATCH_PAGE_END)
+        if end != -1:
+            # Everything from here on is about other videos, whose flags and durations must not leak in
+            self.seen_end = True
+            scan_watch_page(buffer, metadata, 0, end)
+            metadata['complete'] = metadata['title'] is not None and metadata['length_seconds'] is not None
+            return True
+
+        scan_watch_page(buffer, metadata)
+        self.tail = buffer[-self.OVERLAP:]
+
+        if self.stop_on_verdict and not classify_video(metadata, '')[0]:
+            return True
+
+        return False
+
+    def finish(self, reached_eof=False):
+        """
+        Return the metadata; reached_eof marks a page that was read to the end.
+        """
+        if reached_eof and not self.seen_end:
+            # No ytInitialData marker, so the whole page was this video's
+            self.metadata['complete'] = True
+        return self.metadata
+
+def extract_video_metadata(page_text):
+    """
+    Extract everything we use from a complete watch page in one step.
+    """
+    scanner = WatchPageScanner(stop_on_verdict=False)
+    scanner.feed(page_text.encode('utf-8'))
+    return scanner.finish(reached_eof=True)
+
+def classify_video(metadata, video_url):
+    """
+    Decide whether a video should be kept, returning (is_valid, reason).
+    """
+    if metadata.get('is_member_only'):
+        return False, "member-only content"
+
+    # Check for YouTube Shorts (multiple indicators)
+    if metadata.get('is_short'):
+        return False, "YouTube Short"
+
+    # Check if it's a short based on URL
+    if '/shorts/' in video_url:
+        return False, "YouTube Short (URL-based)"
+
+    video_title = (metadata.get('title') or "").lower()
+    is_live_title = any(keyword.lower() in video_title for keyword in GENERIC_LIVE_KEYWORDS)
+
+    if metadata.get('is_live') or is_live_title:
+        return False, "livestream"
+
+    # Additional check for video duration
+    duration = metadata.get('length_seconds')
+    if duration is not None:
+        if duration <= 60:  # Videos 60 seconds or less are likely Shorts
+            return False, "short video (≤60s)"
+        elif duration >= 7200:  # Videos 2+ hours are likely livestreams
+            return False, "long video (likely livestream, ≥2h)"
+
+    # If we got here without any issues, it's likely valid
+    return True, "valid"
+
+class VideoMetadataCache:
+    def __init__(self, path=None, max_entries=1000, max_disk_entries=10000,
+                 ttl=7 * 24 * 3600, live_ttl=3600):
+        """
+        live_ttl applies to videos flagged live/upcoming, whose status changes quickly.
+        """
+        self.path = path or os.path.join(default_cache_dir(), 'video_metadata.json')
+        self.store = JsonFileStore(self.path)
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self.live_ttl = live_ttl
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.dirty = {}
+        self.disk = None
+
+    def _is_fresh(self, entry):
+        ttl = self.live_ttl if entry.get('is_live') else self.ttl
+        return entry.get('fetched_at', 0) + ttl > time.time()
+
+    def get(self, video_id):
+        """
+        Return cached metadata for a video ID, or None.
+        """
+        if not video_id:
+            return None
+
+        with self.lock:
+            entry = self.memory.get(video_id)
+            if entry is not None:
+                if self._is_fresh(entry):
+                    self.memory.move_to_end(video_id)
+                    return entry
+                del self.memory[video_id]
+
+            if self.disk is None:
+                self.disk = self.store.load()
+
+            entry = self.disk.get(video_id)
+            if entry is None or not self._is_fresh(entry):
+                return None
+
+            self._remember(video_id, entry)
+            return entry
+
+    def put(self, video_id, metadata):
+        """
+        Cache metadata for a video ID. Call flush() to persist it.
+        """
+        if not video_id:
+            return
+
+        entry = dict(metadata, fetched_at=time.time())
+        with self.lock:
+            self._remember(video_id, entry)
+            self.dirty[video_id] = entry
+
+    def _remember(self, video_id, entry):
+        self.memory[video_id] = entry
+        self.memory.move_to_end(video_id)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def flush(self):
+        """
+        Write entries added since the last flush to disk.
+        """
+        with self.lock:
+            if not self.dirty:
+                return
+            dirty, self.dirty = self.dirty, {}
+
+        def mutate(data):
+            data.update(dirty)
+            if len(data) > self.max_disk_entries:
+                # Keep the most recently fetched entries
+                oldest = sorted(data, key=lambda key: data[key].get('fetched_at', 0))
+                for key in oldest[:len(data) - self.max_disk_entries]:
+                    del data[key]
+
+        disk = self.store.update(mutate)
+        with self.lock:
+            self.disk = disk
@@ -5,125 +5,249 @@ YouTube to MeTube Web GUI
 A modern web interface for the YouTube to MeTube automation tool.
 """
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from flask_socketio import SocketIO, emit
+from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response
+from flask_socketio import SocketIO, emit, join_room, leave_room
 import threading
-import time
 import json
-import re
 import requests
 import os
+from concurrent.futures import ThreadPoolExecutor
 from youtube_to_metube import YouTubeToMeTube
 from youtube_channel_scraper import YouTubeChannelScraper
+from video_metadata import extract_video_id
+from media_scanner import MediaScanner, find_download_dir
+from downloads_feed import DownloadsSnapshot
+from library_index import LibraryIndex
+from retention import RetentionPolicy, plan_retention
+from job_manager import JobManager, current_job
+from log_channel import LogChannel
+from metrics import REGISTRY, QUEUE_DEPTH, timed, record_cache
+from http_client import shared_session
+from thumbnail_cache import ThumbnailCache
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = 'youtube-metube-secret-key'
 socketio = SocketIO(app, cors_allowed_origins="*")
 
+# Clients that page through the downloads list get change notices and query the page they show
+DOWNLOAD_PAGES_ROOM = 'downloads:pages'
+
+# Thumbnails don't change once cached, so browsers may keep them for a week
+THUMBNAIL_MAX_AGE = 7 * 24 * 3600
+
+# Log messages reach clients in log_batch events, at most every 100 ms per client
+log_channel = LogChannel(lambda room, entries: socketio.emit('log_batch', {'entries': entries}, to=room))
+
+def job_abort_event():
+    """Cancel event of the job running on this thread, if any."""
+    job = current_job()
+    return job.cancel_event if job else None
+
 class WebGUIHandler:
     def __init__(self):
-        self.is_running = False
-        self.current_videos = []
-        self.video_details = {}
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        # Per-client state (fetched videos and their details) by Socket.IO session ID
+        self.sessions = {}
+        # The process-wide MeTube session: GETs are retried with backoff, and a MeTube that keeps failing is paused
+        self.session = shared_session('metube')
+        # One scraper so filtering and the details view share video metadata
+        self.scraper = YouTubeChannelScraper()
+        # One processor per MeTube instance, reused by every submit and delete
+        self.processors = {}
+        # download_dir reported by each MeTube instance, and local indexes by directory
+        self.download_dirs = {}
+        self.media_scanners = {}
+        # Last downloaded-videos list sent to clients, and its query index, per MeTube instance
+        self.download_snapshots = {}
+        self.library_indexes = {}
+        # Guards each instance's snapshot and index, which queries, refreshes and retention all update
+        self.library_locks = {}
+        self.library_locks_lock = threading.Lock()
+        # Thumbnails are proxied through the GUI, fetched from YouTube once and served scaled from disk
+        self.thumbnails = ThumbnailCache()
         
     def emit_log(self, message, level="info"):
-        """Emit log message to connected clients."""
-        socketio.emit('log_message', {'message': message, 'level': level})
-        print(f"[{level.upper()}] {message}")
+        """Queue a log message for the client whose job it came from, tagged with the job ID."""
+        job = current_job()
+        if job is not None:
+            log_channel.log(message, level, room=job.owner, job_id=job.id)
+        else:
+            log_channel.log(message, level)
+    
+    def emit_to_requester(self, event, data):
+        """Send an event to the client that started the job running on this thread, if any."""
+        job = current_job()
+        if job is not None and job.owner:
+            socketio.emit(event, data, to=job.owner)
+    
+    def get_processor(self, metube_url):
+        """YouTubeToMeTube for a MeTube instance, created once and sharing the handler's scraper."""
+        processor = self.processors.get(metube_url)
+        if processor is None:
+            processor = self.processors.setdefault(metube_url, YouTubeToMeTube(metube_url, scraper=self.scraper))
+        return processor
     
-    def get_file_size_from_disk(self, metube_url, filename, filepath=None):
-        """Try to get actual file size by checking the filesystem directly."""
+    def session_state(self, sid):
+        """State kept for one connected client."""
+        return self.sessions.setdefault(sid, {'videos': [], 'details': {}})
+    
+    def build_file_index(self, metube_url):
+        """
+        Fetch MeTube's /info and /files once and index file sizes by name, path and basename.
+        """
+        index = {'download_dir': None, 'by_name': {}, 'by_path': {}, 'by_basename': {}}
+        
         try:
-            # First try to get the download directory from MeTube
             info_url = f"{metube_url.rstrip('/')}/info"
             response = self.session.get(info_url)
-            
-            download_dir = None
             if response.status_code == 200:
-                info_data = response.json()
-                download_dir = info_data.get('download_dir')
-            
-            # Common MeTube download directories to try
-            common_dirs = [
-                download_dir if download_dir else None,
-                '/downloads',
-                './downloads',
-                'downloads',
-                '/app/downloads',
-                '/data/downloads'
-            ]
-            
-            # Remove None values
-            common_dirs = [d for d in common_dirs if d]
-            
-            # Try to find the file in various locations
-            possible_paths = []
-            for base_dir in common_dirs:
-                if filepath:
-                    # Try with the full filepath
-                    possible_paths.append(os.path.join(base_dir, filepath))
-                if filename:
-                    # Try with just the filename
-                    possible_paths.append(os.path.join(base_dir, filename))
-                    # Try in a subdirectory based on the filepath
-                    if filepath and '/' in filepath:
-                        subfolder = filepath.split('/')[0]
-                        possible_paths.append(os.path.join(base_dir, subfolder, filename))
+                index['download_dir'] = response.json().get('download_dir')
+                self.download_dirs[metube_url] = index['download_dir']
+        except Exception:
+            pass
+        
+        try:
+            files_url = f"{metube_url.rstrip('/')}/files"
+            files_response = self.session.get(files_url)
             
-            # Try to get file size via MeTube's file listing API
-            try:
-                files_url = f"{metube_url.rstrip('/')}/files"
-                files_response = self.session.get(files_url)
-                
-                if files_response.status_code == 200:
-                    files_data = files_response.json()
-                    if isinstance(files_data, dict) and 'files' in files_data:
-                        for file_info in files_data['files']:
-                            file_name = file_info.get('name', '')
-                            file_path = file_info.get('path', '')
-                            file_size = file_info.get('size')
-                            
-                            # Check if this matches our target file
-                            if (filename and file_name == filename) or \
-                               (filepath and file_path == filepath) or \
-                               (filename and filepath and file_path.endswith(filename)):
-                                if file_size and file_size > 0:
-                                    return file_size
-                
-            except Exception:
-                pass
+            if files_response.status_code == 200:
+                files_data = files_response.json()
+                if isinstance(files_data, dict) and 'files' in files_data:
+                    for file_info in files_data['files']:
+                        file_size = file_info.get('size')
+                        if not file_size or file_size <= 0:
+                            continue
+                        
+                        # The first listed file wins, as with the old linear search
+                        file_name = file_info.get('name', '')
+                        file_path = file_info.get('path', '')
+                        if file_name:
+                            index['by_name'].setdefault(file_name, file_size)
+                        if file_path:
+                            index['by_path'].setdefault(file_path, file_size)
+                            index['by_basename'].setdefault(os.path.basename(file_path), file_size)
+        except Exception:
+            pass
+        
+        return index
+    
+    def get_media_scanner(self, metube_url):
+        """Local index of MeTube's download directory, or None if it isn't reachable from this host."""
+        root = find_download_dir(self.download_dirs.get(metube_url))
+        if root is None:
+            return None
+        
+        scanner = self.media_scanners.get(root)
+        if scanner is None:
+            scanner = self.media_scanners.setdefault(root, MediaScanner(root))
+        return scanner
+    
+    def lookup_file_size(self, file_index, filename, filepath=None):
+        """Resolve a file size from an index built by build_file_index, or None."""
+        if filename and filename in file_index['by_name']:
+            return file_index['by_name'][filename]
+        if filepath and filepath in file_index['by_path']:
+            return file_index['by_path'][filepath]
+        if filename and filepath and filename in file_index['by_basename']:
+            return file_index['by_basename'][filename]
+        return None
+    
+    def head_file_size(self, metube_url, filename, filepath=None):
+        """Ask MeTube's file server for a file's Content-Length without downloading it."""
+        try:
+            if filepath:
+                file_url = f"{metube_url.rstrip('/')}/download/{filepath}"
+            else:
+                file_url = f"{metube_url.rstrip('/')}/download/{filename}"
             
-            # If MeTube API doesn't work, try a direct file stat request
-            # This works if MeTube serves files directly
-            try:
-                if filepath:
-                    file_url = f"{metube_url.rstrip('/')}/download/{filepath}"
-                else:
-                    file_url = f"{metube_url.rstrip('/')}/download/{filename}"
-                
-                # Use HEAD request to get file size without downloading
-                head_response = self.session.head(file_url)
-                if head_response.status_code == 200:
-                    content_length = head_response.headers.get('Content-Length')
-                    if content_length:
-                        return int(content_length)
-            except Exception:
-                pass
-                            
-        except Exception as e:
-            # Silently fail - this is just a best-effort attempt
+            head_response = self.session.head(file_url)
+            if head_response.status_code == 200:
+                content_length = head_response.headers.get('Content-Length')
+                if content_length:
+                    return int(content_length)
+        except Exception:
             pass
         
         return None
     
+    def get_file_size_from_disk(self, metube_url, filename, filepath=None, file_index=None):
+        """Best-effort size of a single downloaded file; pass file_index to avoid refetching /files."""
+        scanner = self.get_media_scanner(metube_url)
+        if scanner is not None:
+            file_size = scanner.lookup(filename, filepath)
+            if file_size is not None:
+                return file_size
+        
+        if file_index is None:
+            file_index = self.build_file_index(metube_url)
+        
+        file_size = self.lookup_file_size(file_index, filename, filepath)
+        if file_size is None:
+            file_size = self.head_file_size(metube_url, filename, filepath)
+        return file_size
+    
+    @timed('file_sizes')
+    def resolve_file_sizes(self, metube_url, videos, max_workers=8):
+        """
+        Fill in missing 'filesize' values for a download list.
+        
+        Files are looked up in the local download directory first when it is
+        reachable, without any HTTP. The rest come from one /info and /files
+        fetch for the whole list; only files the listing doesn't cover fall
+        back to HEAD requests, sent concurrently. Sizes that can't be found
+        are set to 'unknown'.
+        """
+        missing = [video for video in videos if video.get('filesize') is None]
+        if not missing:
+            return videos
+        
+        unresolved = missing
+        file_index = None
+        
+        scanner = self.get_media_scanner(metube_url)
+        if scanner is None and metube_url not in self.download_dirs:
+            # /info tells us where MeTube keeps its files; it may be mounted here
+            file_index = self.build_file_index(metube_url)
+            scanner = self.get_media_scanner(metube_url)
+        
+        if scanner is not None:
+            unresolved = []
+            for video in missing:
+                video['filesize'] = scanner.lookup(video.get('filename'), video.get('filepath'))
+                record_cache('local_file_sizes', video['filesize'] is not None)
+                if video['filesize'] is None:
+                    unresolved.append(video)
+        
+        if unresolved and file_index is None:
+            file_index = self.build_file_index(metube_url)
+        
+        remaining = []
+        for video in unresolved:
+            video['filesize'] = self.lookup_file_size(file_index, video.get('filename'), video.get('filepath'))
+            record_cache('files_listing', video['filesize'] is not None)
+            if video['filesize'] is None:
+                remaining.append(video)
+        unresolved = remaining
+        
+        if unresolved:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(unresolved)))) as executor:
+                sizes = executor.map(
+                    lambda video: self.head_file_size(metube_url, video.get('filename'), video.get('filepath')),
+                    unresolved
+                )
+                for video, file_size in zip(unresolved, sizes):
+                    video['filesize'] = file_size
+        
+        for video in missing:
+            if video['filesize'] is None:
+                video['filesize'] = 'unknown'
+        
+        return videos
+    
+    @timed('library_refresh')
     def get_downloaded_videos(self, metube_url):
         """Get list of currently available downloaded videos from MeTube."""
         try:
-            self.emit_log("Fetching current downloads from MeTube...")
+            self.emit_log("Fetching current downloads from MeTube...", "debug")
             
             # Try to get current status instead of history
             status_url = f"{metube_url.rstrip('/')}/downloads"
@@ -137,33 +261,23 @@ class WebGUIHandler:
                 # Check if there's a 'done' section in current downloads
                 if isinstance(downloads_data, dict) and 'done' in downloads_data:
                     for video in downloads_data['done']:
-                        # Handle missing filesize - try to get from file system
-                        filesize = video.get('filesize')
-                        if filesize is None:
-                            # Try to get file size from disk/MeTube's file system
-                            filesize = self.get_file_size_from_disk(
-                                metube_url, 
-                                video.get('filename'), 
-                                video.get('filepath')
-                            )
-                            if filesize is None:
-                                filesize = 'unknown'
-                        
                         video_info = {
                             'id': video.get('id'),
                             'title': video.get('title', 'Unknown Title'),
                             'url': video.get('url'),
                             'filename': video.get('filename'),
                             'timestamp': video.get('timestamp'),
-                            'filesize': filesize,
+                            'filesize': video.get('filesize'),
                             'status': video.get('status'),
                             'folder': video.get('folder', ''),
                             'filepath': video.get('filepath', video.get('filename', ''))
                         }
-                        self.emit_log(f"Video data: {video_info['filename']}, size: {video_info['filesize']}, timestamp: {video_info['timestamp']}", "info")
                         downloaded_videos.append(video_info)
                 
-                self.emit_log(f"Found {len(downloaded_videos)} currently available videos")
+                # Missing sizes are resolved for the whole list at once
+                self.resolve_file_sizes(metube_url, downloaded_videos)
+                
+                self.emit_log(f"Found {len(downloaded_videos)} currently available videos", "debug")
                 return downloaded_videos
             
             else:
@@ -191,16 +305,6 @@ class WebGUIHandler:
                         )
                         
                         if is_valid_download:
-                            # Try to get file size if missing
-                            if filesize is None:
-                                filesize = self.get_file_size_from_disk(
-                                    metube_url,
-                                    filename,
-                                    video.get('filepath')
-                                )
-                                if filesize is None:
-                                    filesize = 'unknown'
-                            
                             video_info = {
                                 'id': video.get('id'),
                                 'title': video.get('title', 'Unknown Title'),
@@ -214,6 +318,8 @@ class WebGUIHandler:
                             }
                             downloaded_videos.append(video_info)
                 
+                self.resolve_file_sizes(metube_url, downloaded_videos)
+                
                 total_history = len(history_data.get('done', []))
                 self.emit_log(f"Found {len(downloaded_videos)} available videos from {total_history} history entries")
                 
@@ -224,51 +330,180 @@ class WebGUIHandler:
             
         except Exception as e:
             self.emit_log(f"Error fetching downloaded videos: {e}", "error")
-            return []
+            # None rather than [] so a failed refresh isn't mistaken for an empty library
+            return None
+    
+    def library_lock(self, metube_url):
+        """Lock serialising changes to one MeTube instance's snapshot and index."""
+        with self.library_locks_lock:
+            return self.library_locks.setdefault(metube_url, threading.RLock())
+    
+    def update_downloads_snapshot(self, metube_url, videos):
+        """
+        Record a refreshed download list and keep the library index in step.
+        
+        Returns (snapshot, delta, is_new) with delta as from DownloadsSnapshot.update.
+        """
+        with self.library_lock(metube_url):
+            return self._update_downloads_snapshot(metube_url, videos)
+    
+    def _update_downloads_snapshot(self, metube_url, videos):
+        snapshot = self.download_snapshots.get(metube_url)
+        is_new = snapshot is None
+        if is_new:
+            snapshot = self.download_snapshots[metube_url] = DownloadsSnapshot()
+        delta, version = snapshot.update(videos)
+        
+        index = self.library_indexes.setdefault(metube_url, LibraryIndex())
+        if is_new or delta == 'full' or index.version is None:
+            index.rebuild(*snapshot.full())
+        elif delta is not None:
+            index.apply_delta(delta)
+        
+        if delta is not None and not is_new:
+            if delta == 'full':
+                self.emit_log("Downloads list reordered")
+            else:
+                self.emit_log(f"Downloads changed: {len(delta['added'])} added, {len(delta['removed'])} removed, "
+                              f"{len(delta['changed'])} updated")
+        
+        return snapshot, delta, is_new
+    
+    def publish_downloaded_videos(self, metube_url, videos, sid=None, known_version=None, paged=False):
+        """
+        Tell clients about a refreshed download list.
+        
+        Clients that page through the library (paged=True) get a small
+        downloads_updated notice when it changed and query the page they show.
+        The requesting client (sid) otherwise gets the full list, unless its
+        known_version shows it already holds it.
+        """
+        with self.library_lock(metube_url):
+            self._publish_downloaded_videos(metube_url, videos, sid, known_version, paged)
+    
+    def _publish_downloaded_videos(self, metube_url, videos, sid, known_version, paged):
+        snapshot, delta, is_new = self._update_downloads_snapshot(metube_url, videos)
+        version = snapshot.version
+        # A brand new snapshot has no version any client could hold, so only the requester needs it
+        changed = delta is not None and not is_new
+        
+        if changed:
+            socketio.emit('downloads_updated', {
+                'metube_url': metube_url,
+                'version': version,
+                'stats': self.library_indexes[metube_url].stats()
+            }, to=DOWNLOAD_PAGES_ROOM)
+        
+        if paged:
+            if not changed and known_version != version:
+                socketio.emit('downloads_updated', {
+                    'metube_url': metube_url,
+                    'version': version,
+                    'stats': self.library_indexes[metube_url].stats()
+                }, to=sid)
+            return
+        
+        if known_version == version:
+            return
+        
+        videos, version = snapshot.full()
+        socketio.emit('downloaded_videos', {'metube_url': metube_url, 'videos': videos, 'version': version}, to=sid)
+    
+    def query_library(self, metube_url, **params):
+        """
+        Return one page of the downloaded library plus overall stats.
+        
+        The index is built from a fresh download list the first time an
+        instance is queried; after that, refreshes keep it up to date.
+        """
+        with self.library_lock(metube_url):
+            index = self.library_indexes.get(metube_url)
+            if index is None or index.version is None:
+                # Concurrent first queries wait here and reuse the index this one builds
+                videos = self.get_downloaded_videos(metube_url)
+                if videos is None:
+                    raise RuntimeError("Could not fetch downloads from MeTube")
+                self._update_downloads_snapshot(metube_url, videos)
+                index = self.library_indexes[metube_url]
+        
+        result = index.query(**params)
+        result['stats'] = index.stats()
+        result['metube_url'] = metube_url
+        return result
     
-    def delete_video(self, metube_url, video_id, filename, filepath=None):
-        """Delete a downloaded video from MeTube."""
+    def delete_videos(self, metube_url, videos):
+        """
+        Delete downloaded videos from MeTube in batches, reporting each result as soon as it is known.
+        
+        videos are dicts with the download's url, id, filename and filepath.
+        Returns the number of videos deleted.
+        """
         try:
-            display_name = filepath or filename
-            self.emit_log(f"Deleting video: {display_name}")
+            self.emit_log(f"Deleting {len(videos)} video(s) from MeTube...")
+            processor = self.get_processor(metube_url)
             
-            # Use MeTube's delete API
-            delete_url = f"{metube_url.rstrip('/')}/delete"
+            def on_result(result, completed, total):
+                video = result['video']
+                display_name = video.get('filepath') or video.get('filename') or video.get('url')
+                if result['success']:
+                    self.emit_log(f"[{completed}/{total}] ✓ Deleted: {display_name}", "debug")
+                else:
+                    self.emit_log(f"[{completed}/{total}] ✗ Could not delete: {display_name}", "error")
+                self.emit_to_requester('video_deleted', {
+                    'video_id': video.get('id'),
+                    'filename': video.get('filename'),
+                    'filepath': video.get('filepath'),
+                    'success': result['success'],
+                    'completed': completed,
+                    'total': total
+                })
+                jobs.progress(f"{completed}/{total} deleted")
             
-            # Try using the full filepath first, then fall back to video_id
-            delete_identifiers = []
-            if filepath and filepath != filename:
-                delete_identifiers.append(filepath)
-            if video_id:
-                delete_identifiers.append(video_id)
-            if filename:
-                delete_identifiers.append(filename)
+            results = processor.delete_videos_batch(videos, on_result=on_result, abort=job_abort_event())
+            deleted = sum(1 for result in results if result['success'])
             
-            # Try each identifier until one works
-            for identifier in delete_identifiers:
-                try:
-                    data = {
-                        "ids": [identifier],
-                        "where": "done"
-                    }
-                    
-                    response = self.session.post(delete_url, json=data)
-                    response.raise_for_status()
-                    
-                    result = response.json()
-                    if result.get('status') == 'ok':
-                        self.emit_log(f"Successfully deleted: {display_name}")
-                        return True
-                except Exception as delete_error:
-                    self.emit_log(f"Delete attempt with {identifier} failed: {delete_error}", "warning")
-                    continue
+            self.emit_log(f"Deleted {deleted} of {len(results)} video(s)")
+            return deleted
             
-            self.emit_log(f"All delete attempts failed for: {display_name}", "error")
-            return False
-                
         except Exception as e:
-            self.emit_log(f"Error deleting video {filename}: {e}", "error")
-            return False
+            self.emit_log(f"Error deleting videos: {e}", "error")
+            return 0
+
+    def run_retention(self, metube_url, policy, dry_run=True):
+        """
+        Plan a retention policy against a fresh download list and, unless dry_run, queue its deletes.
+        
+        Returns the plan report; the deletes run as their own job, whose ID is
+        in the report's delete_job_id.
+        """
+        videos = self.get_downloaded_videos(metube_url)
+        if videos is None:
+            raise RuntimeError("Could not fetch downloads from MeTube")
+        with self.library_lock(metube_url):
+            self._update_downloads_snapshot(metube_url, videos)
+            # The index already holds the library newest first
+            library = self.library_indexes[metube_url].videos('timestamp', 'desc')
+        report = plan_retention(library, policy)
+        self.emit_log(f"Retention plan: keep {report['kept_videos']}, delete {len(report['deletions'])} "
+                      f"of {report['total_videos']} videos" + (" (dry run)" if dry_run else ""))
+        
+        report['dry_run'] = dry_run
+        report['delete_job_id'] = None
+        if not dry_run and report['deletions']:
+            videos = [deletion['video'] for deletion in report['deletions']]
+            job = current_job()
+            
+            def delete_job(job):
+                deleted = self.delete_videos(metube_url, videos)
+                self.emit_to_requester('delete_finished', {'deleted': deleted, 'failed': len(videos) - deleted})
+                return {'deleted': deleted, 'failed': len(videos) - deleted}
+            
+            # Holds the library too, so no refresh or other retention run interleaves with the deletes
+            resources = [f"library:{metube_url}"] + delete_resources(metube_url, videos)
+            report['delete_job_id'] = jobs.submit('retention_delete', delete_job, resources,
+                                                  f"Delete {len(videos)} video(s) outside retention limits",
+                                                  owner=job.owner if job else None).id
+        return report
     
     def clear_metube_history(self, metube_url):
         """Clear MeTube download history."""
@@ -294,25 +529,29 @@ class WebGUIHandler:
             self.emit_log(f"Error clearing history: {e}", "error")
             return False
     
-    def fetch_videos(self, channel_url, count, filter_content):
-        """Fetch videos from YouTube channel."""
+    def fetch_videos(self, channel_url, count, filter_content, state):
+        """Fetch videos from YouTube channel into one client's session state."""
         try:
             self.emit_log(f"Fetching {count} videos from: {channel_url}")
             if filter_content:
                 self.emit_log("Filtering enabled: excluding member-only, Shorts, and livestreams")
             
-            scraper = YouTubeChannelScraper()
-            videos = scraper.get_channel_videos(channel_url, count, filter_content)
+            videos = self.scraper.get_channel_videos(channel_url, count, filter_content)
+            
+            abort = job_abort_event()
+            if abort is not None and abort.is_set():
+                self.emit_log("Fetch cancelled", "warning")
+                return []
             
             if videos:
-                self.current_videos = videos
+                state['videos'] = videos
                 self.emit_log(f"Successfully found {len(videos)} videos")
                 
                 # Get video details for better quality control
                 video_details = self._get_video_details(videos)
-                self.video_details = video_details
+                state['details'] = video_details
                 
-                socketio.emit('videos_found', {'videos': videos, 'details': video_details})
+                self.emit_to_requester('videos_found', {'videos': videos, 'details': video_details})
                 return videos
             else:
                 self.emit_log("No videos found", "warning")
@@ -324,92 +563,55 @@ class WebGUIHandler:
     
     def submit_videos(self, videos, metube_url, quality, format_type):
         """Submit videos to MeTube."""
-        try:
-            processor = YouTubeToMeTube(metube_url)
-            
-            self.emit_log(f"Submitting {len(videos)} videos to MeTube...")
-            self.emit_log(f"Quality: {quality}, Format: {format_type}")
-            
-            successful = 0
-            failed = 0
-            
-            for i, video_url in enumerate(videos, 1):
-                self.emit_log(f"[{i}/{len(videos)}] Processing: {video_url}")
-                socketio.emit('progress_update', {
-                    'current': i, 
-                    'total': len(videos), 
-                    'video_url': video_url
-                })
-                
-                if processor.submit_to_metube(video_url, quality, format_type):
-                    successful += 1
-                    self.emit_log(f"✓ Successfully submitted")
-                    socketio.emit('video_result', {'video_url': video_url, 'success': True})
-                else:
-                    failed += 1
-                    self.emit_log(f"✗ Failed to submit", "error")
-                    socketio.emit('video_result', {'video_url': video_url, 'success': False})
-                
-                if i < len(videos):
-                    time.sleep(1)
-            
-            self.emit_log(f"\n=== Summary ===")
-            self.emit_log(f"Successfully submitted: {successful}")
-            self.emit_log(f"Failed: {failed}")
-            self.emit_log(f"Total processed: {len(videos)}")
-            
-            socketio.emit('submission_complete', {
-                'successful': successful,
-                'failed': failed,
-                'total': len(videos)
-            })
-            
-        except Exception as e:
-            self.emit_log(f"Error during submission: {e}", "error")
+        self.emit_log(f"Submitting {len(videos)} videos to MeTube...")
+        self.emit_log(f"Quality: {quality}, Format: {format_type}")
+        
+        self._submit_batch(videos, metube_url, quality, format_type)
     
     def submit_videos_with_quality(self, selected_videos, metube_url, format_type):
         """Submit videos with individual quality settings."""
+        self.emit_log(f"Submitting {len(selected_videos)} videos to MeTube...")
+        self.emit_log(f"Format: {format_type}")
+        
+        self._submit_batch(selected_videos, metube_url, 'best', format_type)
+    
+    def _submit_batch(self, videos, metube_url, quality, format_type):
+        """Submit videos concurrently, reporting each result as soon as it completes."""
         try:
-            processor = YouTubeToMeTube(metube_url)
-            
-            self.emit_log(f"Submitting {len(selected_videos)} videos to MeTube...")
-            self.emit_log(f"Format: {format_type}")
+            processor = self.get_processor(metube_url)
             
-            successful = 0
-            failed = 0
-            
-            for i, video_data in enumerate(selected_videos, 1):
-                video_url = video_data['url']
-                quality = video_data['quality']
-                
-                self.emit_log(f"[{i}/{len(selected_videos)}] Processing: {video_url} (Quality: {quality})")
-                socketio.emit('progress_update', {
-                    'current': i, 
-                    'total': len(selected_videos), 
-                    'video_url': video_url
+            def on_result(result, completed, total):
+                video_url = result['video_url']
+                job = current_job()
+                self.emit_to_requester('progress_update', {
+                    'current': completed,
+                    'total': total,
+                    'video_url': video_url,
+                    'job_id': job.id if job else None
                 })
+                jobs.progress(f"{completed}/{total} submitted")
                 
-                if processor.submit_to_metube(video_url, quality, format_type):
-                    successful += 1
-                    self.emit_log(f"✓ Successfully submitted")
-                    socketio.emit('video_result', {'video_url': video_url, 'success': True})
+                if result['success']:
+                    self.emit_log(f"[{completed}/{total}] ✓ Successfully submitted: {video_url} (Quality: {result['quality']})")
                 else:
-                    failed += 1
-                    self.emit_log(f"✗ Failed to submit", "error")
-                    socketio.emit('video_result', {'video_url': video_url, 'success': False})
-                
-                if i < len(selected_videos):
-                    time.sleep(1)
+                    self.emit_log(f"[{completed}/{total}] ✗ Failed to submit: {video_url}", "error")
+                self.emit_to_requester('video_result', {'video_url': video_url, 'success': result['success']})
+            
+            results = processor.submit_videos_batch(videos, quality, format_type, on_result=on_result,
+                                                   abort=job_abort_event())
+            
+            successful = sum(1 for result in results if result['success'])
+            failed = len(results) - successful
             
             self.emit_log(f"\n=== Summary ===")
             self.emit_log(f"Successfully submitted: {successful}")
             self.emit_log(f"Failed: {failed}")
-            self.emit_log(f"Total processed: {len(selected_videos)}")
+            self.emit_log(f"Total processed: {len(results)}")
             
-            socketio.emit('submission_complete', {
+            self.emit_to_requester('submission_complete', {
                 'successful': successful,
                 'failed': failed,
-                'total': len(selected_videos)
+                'total': len(results)
             })
             
         except Exception as e:
@@ -420,235 +622,307 @@ class WebGUIHandler:
         details = {}
         
         for video_url in videos:
+            video_id = extract_video_id(video_url)
             try:
                 self.emit_log(f"Getting details for: {video_url}")
-                response = self.session.get(video_url)
+                # Served from the metadata cache when filtering already fetched the page
+                metadata = self.scraper.get_video_metadata(video_url, need_details=True)
                 
-                if response.status_code == 200:
-                    # Extract title
-                    title_match = re.search(r'"title":"([^"]*)"', response.text)
-                    title = title_match.group(1) if title_match else "Unknown Title"
-                    
-                    # Extract duration
-                    duration_match = re.search(r'"lengthSeconds":"(\d+)"', response.text)
-                    duration_seconds = int(duration_match.group(1)) if duration_match else 0
-                    
-                    # Extract video ID for thumbnail
-                    video_id_match = re.search(r'watch\?v=([a-zA-Z0-9_-]{11})', video_url)
-                    video_id = video_id_match.group(1) if video_id_match else ""
-                    
-                    # YouTube thumbnail URLs (high quality first, then fallbacks)
-                    thumbnail_urls = [
-                        f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",
-                        f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
-                        f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"
-                    ]
-                    
-                    # Convert to readable format
-                    hours = duration_seconds // 3600
-                    minutes = (duration_seconds % 3600) // 60
-                    seconds = duration_seconds % 60
-                    
-                    if hours > 0:
-                        duration_str = f"{hours}:{minutes:02d}:{seconds:02d}"
-                    else:
-                        duration_str = f"{minutes}:{seconds:02d}"
-                    
-                    details[video_url] = {
-                        'title': title.encode('utf-8').decode('unicode_escape'),
-                        'duration': duration_str,
-                        'duration_seconds': duration_seconds,
-                        'video_id': video_id,
-                        'thumbnail_urls': thumbnail_urls
-                    }
-                    
-                    # Suggest quality based on duration
-                    if duration_seconds > 3600:  # > 1 hour
-                        suggested_quality = "720p"  # Lower quality for long videos
-                    elif duration_seconds > 1800:  # > 30 min
-                        suggested_quality = "1080p"
-                    else:
-                        suggested_quality = "best"
-                    
-                    details[video_url]['suggested_quality'] = suggested_quality
+                title = metadata.get('title') or "Unknown Title"
+                duration_seconds = metadata.get('length_seconds') or 0
                 
-            except Exception as e:
-                video_id_match = re.search(r'watch\?v=([a-zA-Z0-9_-]{11})', video_url)
-                video_id = video_id_match.group(1) if video_id_match else ""
+                # Served by the thumbnail proxy, which picks the largest size YouTube has
+                thumbnail_url = f"/thumbnail/{video_id}"
+                
+                # Convert to readable format
+                hours = duration_seconds // 3600
+                minutes = (duration_seconds % 3600) // 60
+                seconds = duration_seconds % 60
+                
+                if hours > 0:
+                    duration_str = f"{hours}:{minutes:02d}:{seconds:02d}"
+                else:
+                    duration_str = f"{minutes}:{seconds:02d}"
                 
+                details[video_url] = {
+                    'title': title.encode('utf-8').decode('unicode_escape'),
+                    'duration': duration_str,
+                    'duration_seconds': duration_seconds,
+                    'video_id': video_id,
+                    'thumbnail_url': thumbnail_url
+                }
+                
+                # Suggest quality based on duration
+                if duration_seconds > 3600:  # > 1 hour
+                    suggested_quality = "720p"  # Lower quality for long videos
+                elif duration_seconds > 1800:  # > 30 min
+                    suggested_quality = "1080p"
+                else:
+                    suggested_quality = "best"
+                
+                details[video_url]['suggested_quality'] = suggested_quality
+                
+            except Exception as e:
                 details[video_url] = {
                     'title': 'Error loading title',
                     'duration': 'Unknown',
                     'duration_seconds': 0,
                     'suggested_quality': 'best',
                     'video_id': video_id,
-                    'thumbnail_urls': [
-                        f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",
-                        f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg"
-                    ] if video_id else []
+                    'thumbnail_url': f"/thumbnail/{video_id}" if video_id else None
                 }
-                
+        
+        self.scraper.metadata_cache.flush()
         return details
 
 handler = WebGUIHandler()
 
+def report_job(job):
+    # Each client only hears about its own jobs
+    if job.owner:
+        socketio.emit('job_status', job.to_dict(), to=job.owner)
+
+jobs = JobManager(max_workers=8, on_update=report_job)
+
+QUEUE_DEPTH.set_function(lambda: len(jobs.pending), queue='jobs_queued')
+QUEUE_DEPTH.set_function(lambda: sum(1 for job in jobs.list() if job.status == 'running'), queue='jobs_running')
+QUEUE_DEPTH.set_function(lambda: sum(len(queue) for queue in list(log_channel.queues.values())), queue='log_backlog')
+
 @app.route('/')
 def index():
     return render_template('index_new.html')
 
+def start_job(kind, target, resources=(), description=''):
+    """Queue a job for the requesting client and tell it the job's ID."""
+    job = jobs.submit(kind, target, resources, description, owner=request.sid)
+    emit('job_queued', job.to_dict())
+    return job
+
 @socketio.on('fetch_videos')
 def handle_fetch_videos(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
-        return
+    channel_url = data['channel_url']
     
-    handler.is_running = True
-    emit('operation_started')
+    state = handler.session_state(request.sid)
     
-    def fetch_thread():
-        try:
-            videos = handler.fetch_videos(
-                data['channel_url'],
-                int(data['count']),
-                data['filter_content']
-            )
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
-    
-    thread = threading.Thread(target=fetch_thread)
-    thread.daemon = True
-    thread.start()
+    def fetch_job(job):
+        handler.fetch_videos(channel_url, int(data['count']), data['filter_content'], state)
+    
+    start_job('fetch_videos', fetch_job, [f"channel:{channel_url}"], f"Fetch {channel_url}")
 
 @socketio.on('submit_videos')
 def handle_submit_videos(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
-        return
-    
-    if not handler.current_videos:
+    if not handler.session_state(request.sid)['videos']:
         emit('error', {'message': 'No videos to submit. Fetch videos first.'})
         return
     
-    handler.is_running = True
-    emit('operation_started')
+    selected_videos = data.get('selected_videos', [])
     
-    def submit_thread():
-        try:
-            selected_videos = data.get('selected_videos', [])
-            
-            handler.submit_videos_with_quality(
-                selected_videos,
-                data['metube_url'],
-                data['format_type']
-            )
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
-    
-    thread = threading.Thread(target=submit_thread)
-    thread.daemon = True
-    thread.start()
+    def submit_job(job):
+        handler.submit_videos_with_quality(selected_videos, data['metube_url'], data['format_type'])
+    
+    video_urls = [video['url'] if isinstance(video, dict) else video for video in selected_videos]
+    start_job('submit_videos', submit_job, [f"video:{url}" for url in video_urls],
+              f"Submit {len(video_urls)} video(s)")
 
 @socketio.on('test_video')
 def handle_test_video(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
-        return
+    video_url = data['video_url']
     
-    handler.is_running = True
-    emit('operation_started')
+    def test_job(job):
+        handler.submit_videos([video_url], data['metube_url'], data['quality'], data['format_type'])
     
-    def test_thread():
-        try:
-            handler.submit_videos(
-                [data['video_url']],
-                data['metube_url'],
-                data['quality'],
-                data['format_type']
-            )
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
-    
-    thread = threading.Thread(target=test_thread)
-    thread.daemon = True
-    thread.start()
+    start_job('test_video', test_job, [f"video:{video_url}"], f"Submit {video_url}")
 
 @socketio.on('fetch_downloaded')
 def handle_fetch_downloaded(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
-        return
+    sid = request.sid
+    metube_url = data['metube_url']
+    paged = bool(data.get('paged'))
+    if paged:
+        join_room(DOWNLOAD_PAGES_ROOM)
+    else:
+        leave_room(DOWNLOAD_PAGES_ROOM)
     
-    handler.is_running = True
-    emit('operation_started')
+    def fetch_downloaded_job(job):
+        videos = handler.get_downloaded_videos(metube_url)
+        if videos is not None and not job.cancelled:
+            handler.publish_downloaded_videos(metube_url, videos, sid, data.get('known_version'), paged)
     
-    def fetch_downloaded_thread():
+    # Refreshes of one library take turns; other libraries and other work carry on
+    start_job('fetch_downloaded', fetch_downloaded_job, [f"library:{metube_url}"], f"Refresh {metube_url}")
+
+@socketio.on('cancel_job')
+def handle_cancel_job(data):
+    job = jobs.get(data.get('job_id'))
+    if job is None or job.owner != request.sid or not jobs.cancel(job.id):
+        emit('error', {'message': f"Job {data.get('job_id')} is not running"})
+
+@socketio.on('list_jobs')
+def handle_list_jobs(data=None):
+    emit('job_list', {'jobs': [job.to_dict() for job in jobs.list(owner=request.sid)]})
+
+def library_query_params(source):
+    """Paging, sort and search parameters from a socket payload or request.args."""
+    return {
+        'page': int(source.get('page', 1)),
+        'page_size': int(source.get('page_size', 50)),
+        'sort': source.get('sort', 'timestamp'),
+        'order': 'asc' if source.get('order') == 'asc' else 'desc',
+        'search': source.get('search', ''),
+        'match': 'prefix' if source.get('match') == 'prefix' else 'substring'
+    }
+
+@socketio.on('query_downloads')
+def handle_query_downloads(data):
+    sid = request.sid
+    metube_url = data['metube_url']
+    
+    def query_job(job):
         try:
-            videos = handler.get_downloaded_videos(data['metube_url'])
-            socketio.emit('downloaded_videos', {'videos': videos})
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
+            result = handler.query_library(metube_url, **library_query_params(data))
+            # Lets a client match answers to the view that asked
+            result['tag'] = data.get('tag')
+            socketio.emit('downloads_page', result, to=sid)
+        except Exception as e:
+            socketio.emit('error', {'message': f"Error querying downloads: {e}"}, to=sid)
+    
+    # Waits for a refresh of the same library, so the page comes from the updated index
+    start_job('query_downloads', query_job, [f"library:{metube_url}"], f"Query {metube_url}")
+
+@app.route('/api/downloads')
+def api_downloads():
+    metube_url = request.args.get('metube_url')
+    if not metube_url:
+        return jsonify({'error': 'metube_url is required'}), 400
+    
+    try:
+        params = library_query_params(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify(handler.query_library(metube_url, **params))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 502
+
+def delete_request_videos(data):
+    """Downloads to delete from a delete_video or delete_videos payload."""
+    entries = data['videos'] if 'videos' in data else [data]
+    return [{
+        'url': entry.get('url'),
+        'id': entry.get('video_id') or entry.get('id'),
+        'filename': entry.get('filename'),
+        'filepath': entry.get('filepath') or entry.get('filename')
+    } for entry in entries]
+
+def delete_resources(metube_url, videos):
+    """Job resources for deleting videos: one per file, so only deletes of the same file wait for each other."""
+    return [f"file:{metube_url}:{video.get('filepath') or video.get('id') or video.get('url')}" for video in videos]
+
+def start_delete(data):
+    metube_url = data['metube_url']
+    videos = delete_request_videos(data)
     
-    thread = threading.Thread(target=fetch_downloaded_thread)
-    thread.daemon = True
-    thread.start()
+    def delete_job(job):
+        deleted = handler.delete_videos(metube_url, videos)
+        handler.emit_to_requester('delete_finished', {'deleted': deleted, 'failed': len(videos) - deleted})
+    
+    start_job('delete_videos', delete_job, delete_resources(metube_url, videos), f"Delete {len(videos)} video(s)")
 
 @socketio.on('delete_video')
 def handle_delete_video(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
+    start_delete(data)
+
+@socketio.on('delete_videos')
+def handle_delete_videos(data):
+    if not data.get('videos'):
+        emit('error', {'message': 'No videos selected for deletion'})
         return
+    start_delete(data)
+
+@socketio.on('clear_history')
+def handle_clear_history(data):
+    metube_url = data['metube_url']
     
-    handler.is_running = True
-    emit('operation_started')
+    def clear_history_job(job):
+        success = handler.clear_metube_history(metube_url)
+        handler.emit_to_requester('history_cleared', {'success': success})
     
-    def delete_video_thread():
-        try:
-            success = handler.delete_video(
-                data['metube_url'],
-                data['video_id'], 
-                data['filename'],
-                data.get('filepath')  # Include filepath for channel-based structure
-            )
-            socketio.emit('video_deleted', {
-                'video_id': data['video_id'],
-                'success': success
-            })
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
+    start_job('clear_history', clear_history_job, [f"library:{metube_url}"], f"Clear history of {metube_url}")
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return REGISTRY.render_prometheus(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+@app.route('/thumbnail/<video_id>')
+def thumbnail(video_id):
+    try:
+        width = int(request.args.get('w', 0))
+    except ValueError:
+        return jsonify({'error': 'w must be a number of pixels'}), 400
+    
+    try:
+        data = handler.thumbnails.get(video_id, width)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except requests.RequestException as e:
+        return jsonify({'error': f"Could not fetch thumbnail: {e}"}), 502
+    
+    if data is None:
+        # Checked again after an hour, in case the video gets a thumbnail
+        return jsonify({'error': 'No thumbnail for this video'}), 404, {'Cache-Control': 'public, max-age=3600'}
     
-    thread = threading.Thread(target=delete_video_thread)
-    thread.daemon = True
-    thread.start()
+    response = make_response(data)
+    response.content_type = 'image/jpeg'
+    response.cache_control.public = True
+    response.cache_control.max_age = THUMBNAIL_MAX_AGE
+    response.add_etag()
+    return response.make_conditional(request)
 
-@socketio.on('clear_history')
-def handle_clear_history(data):
-    if handler.is_running:
-        emit('error', {'message': 'Operation already in progress'})
-        return
+@app.route('/api/retention', methods=['POST'])
+def api_retention():
+    data = request.get_json(silent=True) or {}
+    metube_url = data.get('metube_url')
+    if not metube_url:
+        return jsonify({'error': 'metube_url is required'}), 400
     
-    handler.is_running = True
-    emit('operation_started')
+    try:
+        policy = RetentionPolicy.from_dict(data.get('rules') or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if policy.is_empty():
+        return jsonify({'error': 'At least one retention rule is required'}), 400
     
-    def clear_history_thread():
-        try:
-            success = handler.clear_metube_history(data['metube_url'])
-            socketio.emit('history_cleared', {'success': success})
-        finally:
-            handler.is_running = False
-            socketio.emit('operation_finished')
+    # Deleting needs an explicit "dry_run": false
+    dry_run = data.get('dry_run', True) is not False
+    
+    def retention_job(job):
+        return handler.run_retention(metube_url, policy, dry_run)
     
-    thread = threading.Thread(target=clear_history_thread)
-    thread.daemon = True
-    thread.start()
+    # Planning waits for other work on the library; the report is read from /api/jobs/<job_id>
+    job = jobs.submit('retention', retention_job, [f"library:{metube_url}"],
+                      f"Retention for {metube_url}" + (" (dry run)" if dry_run else ""))
+    return jsonify({'job_id': job.id, 'status': job.status}), 202
+
+@app.route('/api/jobs/<int:job_id>')
+def api_job(job_id):
+    job = jobs.get(job_id)
+    # Jobs started over Socket.IO belong to their client
+    if job is None or job.owner is not None:
+        return jsonify({'error': f"Job {job_id} not found"}), 404
+    return jsonify({**job.to_dict(), 'result': job.result})
 
 @socketio.on('connect')
 def handle_connect():
+    # Every client is in a room named after its session ID; job events are sent there
+    handler.session_state(request.sid)
     emit('connected', {'data': 'Connected to YouTube to MeTube server'})
 
+@socketio.on('disconnect')
+def handle_disconnect(*args):
+    handler.sessions.pop(request.sid, None)
+
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
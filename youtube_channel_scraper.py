@@ -5,87 +5,190 @@ Enhanced YouTube Channel Scraper
 This module provides better methods for extracting video URLs from YouTube channels.
 """
 
-import requests
 import json
-import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from urllib.parse import urljoin
-import time
 from bs4 import BeautifulSoup
+from channel_cache import ChannelIdCache, MISS
+from feed_cache import FeedCache
+from video_metadata import VideoMetadataCache, WatchPageScanner, extract_video_id, classify_video
+from youtube_patterns import scan_feed, find_channel_id, find_video_ids
+from metrics import timed, record_cache, QUEUE_DEPTH
+from http_client import shared_session
+
+def parse_feed_entries(feed_text):
+    """
+    Extract video IDs and publish times from RSS feed XML.
+    """
+    return scan_feed(feed_text)
+
+def find_channel_id_in_page(page_text, username):
+    """
+    Find the channel ID of a channel page, returning (channel_id, guessed).
+    
+    guessed is True when nothing on the page confirmed the ID.
+    """
+    channel_id, source = find_channel_id(page_text, username)
+    
+    # Related channels use the same key, so the first one on the page is a guess
+    guessed = source == 'first channelId'
+    if guessed:
+        print(f"Warning: Using first channelId match without validation: {channel_id}")
+    elif channel_id:
+        print(f"Found channel ID via {source}: {channel_id}")
+    
+    return channel_id, guessed
+
+def channel_page_urls(username):
+    """
+    Channel page URLs to try when resolving a username or handle.
+    """
+    return [
+        f"https://www.youtube.com/@{username}",
+        f"https://www.youtube.com/c/{username}",
+        f"https://www.youtube.com/user/{username}"
+    ]
+
+def parse_channel_url(channel_url):
+    """
+    Split a channel URL into ('channel', channel_id), ('username', name) or (None, None).
+    """
+    # Direct channel ID
+    if '/channel/' in channel_url:
+        return 'channel', channel_url.split('/channel/')[-1].split('/')[0]
+    
+    # @handle, /c/ and /user/ formats all need a lookup
+    for marker in ('/@', '/c/', '/user/'):
+        if marker in channel_url:
+            return 'username', channel_url.split(marker)[-1].split('/')[0]
+    
+    return None, None
+
+def channel_videos_page_url(channel_url):
+    """
+    Ensure we have a proper channel /videos URL.
+    """
+    if channel_url.endswith('/videos'):
+        return channel_url
+    if channel_url.endswith('/'):
+        return channel_url + 'videos'
+    return channel_url + '/videos'
+
+def find_video_urls_in_page(page_text, count):
+    """
+    Extract up to count video URLs from a channel page, in page order.
+    """
+    return [f"https://www.youtube.com/watch?v={video_id}" for video_id in find_video_ids(page_text)[:count]]
 
 class YouTubeChannelScraper:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        })
+    def __init__(self, max_workers=4, requests_per_second=2.0, channel_cache=None, metadata_cache=None,
+                 feed_cache=None, max_requests_per_second=None):
+        # Concurrency limit for video validation
+        self.max_workers = max(1, max_workers)
+        # The process-wide YouTube session: pooled, paced with an adaptive rate, retried and circuit-broken
+        self.session = shared_session('youtube', pool_size=self.max_workers + 4,
+                                      requests_per_second=requests_per_second,
+                                      max_requests_per_second=max_requests_per_second)
+        # Handle -> channel ID resolutions shared across runs and front ends
+        self.channel_cache = channel_cache or ChannelIdCache()
+        # Per-video metadata shared by filtering and the web details view
+        self.metadata_cache = metadata_cache or VideoMetadataCache()
+        # ETag/Last-Modified and parsed entries for conditional RSS requests
+        self.feed_cache = feed_cache or FeedCache()
     
-    def get_channel_videos_rss(self, channel_url, count=5):
+    def get_channel_feed_entries(self, channel_url):
         """
-        Get recent videos using YouTube RSS feed (more reliable).
+        Get the channel's RSS feed entries, newest first.
+        
+        Each entry is a dict with video_id, url and published (ISO 8601 string or None).
+        Returns None if the feed could not be fetched.
+        """
+        entries, _ = self.fetch_channel_feed(channel_url)
+        return entries
+    
+    @timed('rss_fetch')
+    def fetch_channel_feed(self, channel_url):
+        """
+        Fetch the channel's RSS feed with a conditional request.
+        
+        Returns (entries, not_modified). On a 304 response the entries from the
+        last full fetch are returned unchanged and not_modified is True.
+        entries is None if the feed could not be fetched.
         """
         try:
             # Extract channel ID from various URL formats
             channel_id = self._extract_channel_id(channel_url)
             if not channel_id:
                 print(f"Could not extract channel ID from: {channel_url}")
-                return []
+                return None, False
             
             # Use YouTube RSS feed
             rss_url = f"https://www.youtube.com/feeds/videos.xml?channel_id={channel_id}"
             print(f"Fetching RSS feed: {rss_url}")
             
-            response = self.session.get(rss_url)
-            response.raise_for_status()
+            headers = {}
+            cached = self.feed_cache.get(rss_url)
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
             
-            # Parse RSS XML to extract video IDs
-            video_urls = []
+            response = self.session.get(rss_url, headers=headers)
             
-            # Simple regex to find video IDs in RSS feed
-            video_id_pattern = r'<yt:videoId>([^<]+)</yt:videoId>'
-            video_ids = re.findall(video_id_pattern, response.text)
+            record_cache('rss_feed', response.status_code == 304 and bool(cached))
+            if response.status_code == 304 and cached:
+                print("RSS feed not modified since last fetch")
+                self.feed_cache.touch(rss_url)
+                return cached['entries'], True
             
-            # Convert to full URLs and limit to requested count
-            for video_id in video_ids[:count]:
-                video_urls.append(f"https://www.youtube.com/watch?v={video_id}")
+            response.raise_for_status()
             
-            print(f"Found {len(video_urls)} videos from RSS feed")
-            return video_urls
+            entries = parse_feed_entries(response.text)
+            self.feed_cache.put(
+                rss_url,
+                response.headers.get('ETag'),
+                response.headers.get('Last-Modified'),
+                entries
+            )
+            return entries, False
             
         except Exception as e:
             print(f"Error fetching RSS feed: {e}")
+            return None, False
+    
+    def get_channel_videos_rss(self, channel_url, count=5):
+        """
+        Get recent videos using YouTube RSS feed (more reliable).
+        """
+        entries = self.get_channel_feed_entries(channel_url)
+        if not entries:
             return []
+        
+        # Convert to full URLs and limit to requested count
+        video_urls = [entry['url'] for entry in entries[:count]]
+        
+        print(f"Found {len(video_urls)} videos from RSS feed")
+        return video_urls
     
     def _extract_channel_id(self, channel_url):
         """
         Extract channel ID from various YouTube URL formats.
         """
         try:
-            # Direct channel ID
-            if '/channel/' in channel_url:
-                channel_id = channel_url.split('/channel/')[-1].split('/')[0]
-                print(f"Direct channel ID extracted: {channel_id}")
-                return channel_id
-            
-            # Handle @username format
-            if '/@' in channel_url:
-                username = channel_url.split('/@')[-1].split('/')[0]
-                print(f"Username extracted: {username}")
-                channel_id = self._get_channel_id_from_username(username)
+            kind, value = parse_channel_url(channel_url)
+            if kind == 'channel':
+                print(f"Direct channel ID extracted: {value}")
+                return value
+            
+            # @handle, /c/ and /user/ formats
+            if kind == 'username':
+                print(f"Username extracted: {value}")
+                channel_id = self._get_channel_id_from_username(value)
                 print(f"Channel ID from username lookup: {channel_id}")
                 return channel_id
             
-            # Handle /c/ format
-            if '/c/' in channel_url:
-                username = channel_url.split('/c/')[-1].split('/')[0]
-                print(f"C-format username extracted: {username}")
-                return self._get_channel_id_from_username(username)
-            
-            # Handle /user/ format
-            if '/user/' in channel_url:
-                username = channel_url.split('/user/')[-1].split('/')[0]
-                print(f"User-format username extracted: {username}")
-                return self._get_channel_id_from_username(username)
-            
             return None
             
         except Exception as e:
@@ -94,73 +197,64 @@ class YouTubeChannelScraper:
     
     def _get_channel_id_from_username(self, username):
         """
-        Get channel ID from username by scraping the channel page.
+        Get channel ID from username, using the on-disk cache before scraping.
         """
         try:
-            # Known channel mappings for cases where @handle doesn't match main channel
-            known_channels = {
-                'LinusTechTips': 'UCXuqSBlHAE6Xw-yeJA0Tunw',  # Main LTT channel
-                'linus': 'UCXuqSBlHAE6Xw-yeJA0Tunw',          # Alternative
-                'ShortCircuit': 'UCdBK94H6oZT2Q7l0-b0xmMg',   # Short Circuit
-                'TechLinked': 'UCeeFfhMcJa1kjtfZAGskOCA',      # TechLinked  
-                'ChannelSuperFun': 'UCdBK94H6oZT2Q7l0-b0xmMg'  # Channel Super Fun
-            }
+            cached = self.channel_cache.lookup(username)
+            record_cache('channel_id', cached is not MISS)
+            if cached is not MISS:
+                if cached:
+                    print(f"Using cached channel ID for {username}: {cached}")
+                else:
+                    print(f"Cached result: no channel found for {username}")
+                return cached
+            
+            channel_id, reached, guessed = self._scrape_channel_id(username)
+            
+            # Only remember a negative result if YouTube actually answered
+            if channel_id or reached:
+                self.channel_cache.store_result(username, channel_id, guessed)
             
-            if username in known_channels:
-                print(f"Using known channel mapping for {username}: {known_channels[username]}")
-                return known_channels[username]
+            return channel_id
             
+        except Exception as e:
+            print(f"Error getting channel ID from username: {e}")
+            return None
+    
+    @timed('channel_resolve')
+    def _scrape_channel_id(self, username):
+        """
+        Get channel ID from username by scraping the channel page.
+        
+        Returns (channel_id, reached, guessed) where reached tells whether YouTube gave a
+        definitive answer and guessed whether the channel ID is unconfirmed.
+        """
+        reached = False
+        try:
             # Try different URL formats
-            possible_urls = [
-                f"https://www.youtube.com/@{username}",
-                f"https://www.youtube.com/c/{username}",
-                f"https://www.youtube.com/user/{username}"
-            ]
+            possible_urls = channel_page_urls(username)
             
             for url in possible_urls:
                 try:
                     response = self.session.get(url)
+                    # Throttling or server errors say nothing about the channel
+                    if response.status_code < 500 and response.status_code != 429:
+                        reached = True
                     if response.status_code == 200:
-                        # Priority 1: Use og:url meta tag (most reliable for the actual channel)
-                        channel_id_pattern_meta = r'<meta property="og:url" content="https://www\.youtube\.com/channel/([^"]+)"'
-                        match_meta = re.search(channel_id_pattern_meta, response.text)
-                        if match_meta:
-                            print(f"Found channel ID via og:url meta tag: {match_meta.group(1)}")
-                            return match_meta.group(1)
-                        
-                        # Priority 2: Use canonical link (also reliable)
-                        canonical_pattern = r'<link rel="canonical" href="https://www\.youtube\.com/channel/([^"]+)"'
-                        match_canonical = re.search(canonical_pattern, response.text)
-                        if match_canonical:
-                            print(f"Found channel ID via canonical link: {match_canonical.group(1)}")
-                            return match_canonical.group(1)
-                        
-                        # Priority 3: Look for the main channel ID in JSON data (less reliable, can pick up related channels)
-                        # Only use this as a last resort and validate it
-                        channel_id_pattern = r'"channelId":"([^"]+)"'
-                        matches = re.findall(channel_id_pattern, response.text)
-                        if matches:
-                            # Try to validate which one is the correct channel by checking context
-                            for channel_id in matches:
-                                # Look for this channel ID in a more specific context
-                                context_pattern = rf'"channelId":"{re.escape(channel_id)}"[^}}]*"title":"[^"]*{re.escape(username)}'
-                                if re.search(context_pattern, response.text, re.IGNORECASE):
-                                    print(f"Found channel ID via contextual match: {channel_id}")
-                                    return channel_id
-                            
-                            # If no contextual match, take the first one (old behavior) but log it
-                            print(f"Warning: Using first channelId match without validation: {matches[0]} (found {len(matches)} total)")
-                            return matches[0]
+                        channel_id, guessed = find_channel_id_in_page(response.text, username)
+                        if channel_id:
+                            return channel_id, reached, guessed
                             
                 except Exception:
                     continue
             
-            return None
+            return None, reached, False
             
         except Exception as e:
             print(f"Error getting channel ID from username: {e}")
-            return None
+            return None, reached, False
     
+    @timed('channel_page')
     def get_channel_videos_scrape(self, channel_url, count=5):
         """
         Fallback method: scrape the channel page directly.
@@ -168,38 +262,10 @@ class YouTubeChannelScraper:
         try:
             print(f"Scraping channel page: {channel_url}")
             
-            # Ensure we have a proper channel URL
-            if not channel_url.endswith('/videos'):
-                if channel_url.endswith('/'):
-                    channel_url = channel_url + 'videos'
-                else:
-                    channel_url = channel_url + '/videos'
-            
-            response = self.session.get(channel_url)
+            response = self.session.get(channel_videos_page_url(channel_url))
             response.raise_for_status()
             
-            # Extract video IDs from the page
-            video_urls = []
-            
-            # Multiple patterns to catch different page structures
-            patterns = [
-                r'"videoId":"([^"]+)"',
-                r'/watch\?v=([a-zA-Z0-9_-]{11})',
-                r'watch\?v=([a-zA-Z0-9_-]{11})'
-            ]
-            
-            all_video_ids = set()
-            
-            for pattern in patterns:
-                video_ids = re.findall(pattern, response.text)
-                all_video_ids.update(video_ids)
-            
-            # Convert to list and limit
-            video_ids_list = list(all_video_ids)[:count]
-            
-            for video_id in video_ids_list:
-                if len(video_id) == 11:  # YouTube video IDs are 11 characters
-                    video_urls.append(f"https://www.youtube.com/watch?v={video_id}")
+            video_urls = find_video_urls_in_page(response.text, count)
             
             print(f"Found {len(video_urls)} videos from scraping")
             return video_urls
@@ -208,97 +274,139 @@ class YouTubeChannelScraper:
             print(f"Error scraping channel page: {e}")
             return []
     
-    def _is_video_valid(self, video_url):
+    def get_video_metadata(self, video_url, need_details=False, abort=None):
         """
-        Check if a video is valid (not member-only, not a Short, not a livestream).
+        Get title, duration and content flags for a video, downloading its watch page only on a cache miss.
+        
+        The page is streamed and the download stops as soon as the video can be
+        rejected, unless need_details asks for the title and duration regardless.
+        Returns None if abort (a threading.Event) is set while downloading.
         """
+        video_id = extract_video_id(video_url)
+        metadata = self.metadata_cache.get(video_id)
+        if metadata is not None and (metadata.get('complete', True) or not need_details):
+            record_cache('video_metadata', True)
+            return metadata
+        record_cache('video_metadata', False)
+        
+        response = self.session.get(video_url, stream=True)
         try:
-            response = self.session.get(video_url)
             response.raise_for_status()
             
-            # More specific member-only content detection
-            member_only_indicators = [
-                '"isAvailable":false',
-                '"reason":{"code":"MEMBERSHIP_CONTENT_NOT_AVAILABLE"',
-                'Join this channel to get access to members-only content',
-                '"unplayableText":"Join this channel'
-            ]
-            
-            is_member_only = any(indicator in response.text for indicator in member_only_indicators)
-            if is_member_only:
-                return False, "member-only content"
-            
-            # Check for YouTube Shorts (multiple indicators)
-            if '"isShort":true' in response.text:
-                return False, "YouTube Short"
-            
-            # Check if it's a short based on URL
-            if '/shorts/' in video_url:
-                return False, "YouTube Short (URL-based)"
-            
-            # Check for livestreams (more specific)
-            live_indicators = [
-                '"liveBroadcastContent":"live"',
-                '"liveBroadcastContent":"upcoming"',
-                '"isLiveNow":true',
-                '"isLive":true',
-                '"wasLive":true'
-            ]
-            
-            # Generic livestream keywords (avoid channel-specific terms)
-            title_match = re.search(r'"title":"([^"]*)"', response.text)
-            video_title = title_match.group(1) if title_match else ""
-            
-            generic_live_keywords = ['live stream', 'livestream', '🔴', 'live:', ' live ', 'stream:']
-            
-            is_live = any(indicator in response.text for indicator in live_indicators)
-            is_live_title = any(keyword.lower() in video_title.lower() for keyword in generic_live_keywords)
-            
-            if is_live or is_live_title:
-                return False, "livestream"
-            
-            # Additional check for video duration
-            duration_match = re.search(r'"lengthSeconds":"(\d+)"', response.text)
-            if duration_match:
-                duration = int(duration_match.group(1))
-                if duration <= 60:  # Videos 60 seconds or less are likely Shorts
-                    return False, "short video (≤60s)"
-                elif duration >= 7200:  # Videos 2+ hours are likely livestreams
-                    return False, "long video (likely livestream, ≥2h)"
-            
-            # If we got here without any issues, it's likely valid
-            return True, "valid"
+            scanner = WatchPageScanner(stop_on_verdict=not need_details)
+            reached_eof = True
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if abort is not None and abort.is_set():
+                    return None
+                if scanner.feed(chunk):
+                    reached_eof = False
+                    break
+            
+            metadata = scanner.finish(reached_eof)
+        finally:
+            # Closing early drops the connection instead of reading the rest of the page
+            response.close()
+        
+        self.metadata_cache.put(video_id, metadata)
+        return metadata
+    
+    @timed('video_validate')
+    def _is_video_valid(self, video_url, abort=None):
+        """
+        Check if a video is valid (not member-only, not a Short, not a livestream).
+        
+        Returns (is_valid, reason). is_valid is None when the video couldn't be
+        checked, e.g. because YouTube kept throttling us or abort was set;
+        such videos are skipped rather than assumed valid.
+        """
+        try:
+            metadata = self.get_video_metadata(video_url, abort=abort)
+            if metadata is None:
+                # Aborted while downloading
+                return None, "cancelled"
+            return classify_video(metadata, video_url)
             
         except Exception as e:
             print(f"Error checking video {video_url}: {e}")
-            return True, "unknown (assuming valid)"  # If we can't check, assume it's valid
+            return None, f"check failed: {e}"
+    
+    def _check_video(self, video_url, stop_event):
+        """
+        Worker task: validate a single video unless the filter no longer needs it.
+        """
+        if stop_event.is_set():
+            return None, "cancelled"
+        
+        QUEUE_DEPTH.inc(queue='video_checks')
+        try:
+            return self._is_video_valid(video_url, abort=stop_event)
+        finally:
+            QUEUE_DEPTH.dec(queue='video_checks')
     
-    def _filter_videos(self, video_urls, target_count):
+    def _filter_videos(self, video_urls, target_count, max_workers=None, on_checked=None):
         """
         Filter out member-only videos, Shorts, and livestreams.
+        
+        Checks run on a bounded worker pool, but results are consumed in the
+        original (RSS) order so the newest valid videos are always the ones kept.
+        Once target_count valid videos are found, queued checks are cancelled and
+        in-flight ones are abandoned.
+        
+        on_checked(video_url, is_valid, reason) is called for every video whose
+        result was used; is_valid is None for videos that couldn't be checked.
         """
         print(f"Filtering videos to exclude member-only, Shorts, and livestreams...")
         
+        workers = max(1, max_workers or self.max_workers)
+        
         valid_videos = []
         checked_count = 0
+        results = {}
+        pending = {}
+        next_index = 0
+        stop_event = threading.Event()
         
-        for video_url in video_urls:
-            if len(valid_videos) >= target_count:
-                break
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            while len(valid_videos) < target_count and checked_count < len(video_urls):
+                # Keep the pool full, but never schedule more checks than could still be needed
+                while (next_index < len(video_urls) and len(pending) < workers and
+                       len(valid_videos) + len(pending) + len(results) < target_count):
+                    future = executor.submit(self._check_video, video_urls[next_index], stop_event)
+                    pending[future] = next_index
+                    next_index += 1
                 
-            checked_count += 1
-            print(f"Checking video {checked_count}: {video_url}")
-            
-            is_valid, reason = self._is_video_valid(video_url)
-            
-            if is_valid:
-                valid_videos.append(video_url)
-                print(f"  ✓ Valid video added ({len(valid_videos)}/{target_count})")
-            else:
-                print(f"  ✗ Skipped: {reason}")
-            
-            # Add a small delay to be respectful
-            time.sleep(0.5)
+                if checked_count not in results:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index = pending.pop(future)
+                        try:
+                            results[index] = future.result()
+                        except Exception as e:
+                            results[index] = (None, f"check failed: {e}")
+                
+                # Consume finished results in their original order
+                while checked_count in results and len(valid_videos) < target_count:
+                    is_valid, reason = results.pop(checked_count)
+                    video_url = video_urls[checked_count]
+                    checked_count += 1
+                    print(f"Checking video {checked_count}: {video_url}")
+                    
+                    if is_valid:
+                        valid_videos.append(video_url)
+                        print(f"  ✓ Valid video added ({len(valid_videos)}/{target_count})")
+                    else:
+                        print(f"  ✗ Skipped: {reason}")
+                    
+                    if on_checked:
+                        on_checked(video_url, is_valid, reason)
+        finally:
+            # Drop anything we no longer need
+            stop_event.set()
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+            self.metadata_cache.flush()
         
         print(f"Filtered {len(valid_videos)} valid videos from {checked_count} checked")
         return valid_videos
@@ -10,7 +10,6 @@ from tkinter import ttk, scrolledtext, messagebox
 import threading
 import queue
 import sys
-import time
 from youtube_to_metube import YouTubeToMeTube
 from youtube_channel_scraper import YouTubeChannelScraper
 
@@ -253,22 +252,15 @@ class YouTubeMetubeGUI:
             self.log_message(f"Submitting {len(videos)} videos to MeTube...")
             self.log_message(f"Quality: {quality}, Format: {format_type}")
             
-            successful = 0
-            failed = 0
-            
-            for i, video_url in enumerate(videos, 1):
-                self.log_message(f"[{i}/{len(videos)}] Processing: {video_url}")
-                
-                if processor.submit_to_metube(video_url, quality, format_type):
-                    successful += 1
-                    self.log_message(f"✓ Successfully submitted")
+            def on_result(result, completed, total):
+                if result['success']:
+                    self.log_message(f"[{completed}/{total}] ✓ Successfully submitted: {result['video_url']}")
                 else:
-                    failed += 1
-                    self.log_message(f"✗ Failed to submit")
-                
-                # Add delay between submissions
-                if i < len(videos):
-                    time.sleep(1)
+                    self.log_message(f"[{completed}/{total}] ✗ Failed to submit: {result['video_url']}")
+            
+            results = processor.submit_videos_batch(videos, quality, format_type, on_result=on_result)
+            successful = sum(1 for result in results if result['success'])
+            failed = len(results) - successful
             
             self.log_message(f"\n=== Summary ===")
             self.log_message(f"Successfully submitted: {successful}")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Precompiled patterns and extractors for everything we read out of YouTube pages.
+
+Each field is pulled with the cheapest primitive the re module offers for it:
+fixed markers with str.find, everything else with a pattern that starts with a
+literal so the engine can jump between candidates instead of trying a match at
+every quote of a page's JSON. Nothing is compiled at call time.
+"""
+
+import re
+
+VIDEO_ID_PATTERN = re.compile(r'(?:watch\?v=|youtu\.be/|/shorts/)([a-zA-Z0-9_-]{11})')
+
+MEMBER_ONLY_INDICATORS = [
+    '"isAvailable":false',
+    '"reason":{"code":"MEMBERSHIP_CONTENT_NOT_AVAILABLE"',
+    'Join this channel to get access to members-only content',
+    '"unplayableText":"Join this channel'
+]
+
+LIVE_INDICATORS = [
+    '"liveBroadcastContent":"live"',
+    '"liveBroadcastContent":"upcoming"',
+    '"isLiveNow":true',
+    '"isLive":true',
+    '"wasLive":true'
+]
+
+# Watch page markers, as bytes so pages can be scanned while they download
+FLAG_INDICATORS = {
+    'is_member_only': [indicator.encode() for indicator in MEMBER_ONLY_INDICATORS],
+    'is_short': [b'"isShort":true'],
+    'is_live': [indicator.encode() for indicator in LIVE_INDICATORS]
+}
+TITLE = re.compile(rb'"title":"([^"]*)"')
+LENGTH_SECONDS = re.compile(rb'"lengthSeconds":"(\d+)"')
+# ytInitialData follows the player response; everything after it is about other videos
+WATCH_PAGE_END = b'var ytInitialData'
+
+# Channel pages
+OG_URL = re.compile(r'<meta property="og:url" content="https://www\.youtube\.com/channel/([^"]+)"')
+CANONICAL = re.compile(r'<link rel="canonical" href="https://www\.youtube\.com/channel/([^"]+)"')
+# The lookahead spans the rest of the JSON object without consuming the next channelId in it
+CHANNEL_ID_IN_OBJECT = re.compile(r'"channelId":"([^"]+)"(?=([^}]*))')
+OBJECT_TITLE = re.compile(r'"title":"([^"]*)"')
+VIDEO_ID_JSON = re.compile(r'"videoId":"([^"]+)"')
+VIDEO_ID_LINK = re.compile(r'watch\?v=([a-zA-Z0-9_-]{11})')
+
+# RSS feeds
+FEED_FIELDS = re.compile(
+    r'(?P<entry><entry>)'
+    r'|<yt:videoId>(?P<video_id>[^<]+)</yt:videoId>'
+    r'|<published>(?P<published>[^<]+)</published>'
+)
+
+def scan_watch_page(page, metadata, start=0, end=None):
+    """
+    Fill flags, title and duration in metadata from page[start:end] (bytes).
+
+    Fields already set are not searched for again.
+    """
+    end = len(page) if end is None else end
+
+    for key, indicators in FLAG_INDICATORS.items():
+        if not metadata[key] and any(page.find(indicator, start, end) != -1 for indicator in indicators):
+            metadata[key] = True
+
+    if metadata['title'] is None:
+        match = TITLE.search(page, start, end)
+        if match:
+            metadata['title'] = match.group(1).decode('utf-8', 'replace')
+
+    if metadata['length_seconds'] is None:
+        match = LENGTH_SECONDS.search(page, start, end)
+        if match:
+            metadata['length_seconds'] = int(match.group(1))
+
+def find_channel_id(page_text, username):
+    """
+    Pick a channel page's own channel ID, returning (channel_id, source) or (None, None).
+
+    og:url and the canonical link win; otherwise the first "channelId" whose
+    JSON object carries a title mentioning the username, and failing that the
+    first "channelId" on the page.
+    """
+    match = OG_URL.search(page_text)
+    if match:
+        return match.group(1), 'og:url meta tag'
+
+    match = CANONICAL.search(page_text)
+    if match:
+        return match.group(1), 'canonical link'
+
+    needle = username.lower()
+    # channel ID -> whether any of its occurrences sits next to a matching title, in page order
+    candidates = {}
+    for match in CHANNEL_ID_IN_OBJECT.finditer(page_text):
+        channel_id = match.group(1)
+        if candidates.get(channel_id):
+            continue
+        candidates[channel_id] = any(
+            needle in title.lower()
+            for title in OBJECT_TITLE.findall(page_text, match.start(2), match.end(2))
+        )
+
+    for channel_id, in_context in candidates.items():
+        if in_context:
+            return channel_id, 'contextual match'
+
+    if candidates:
+        return next(iter(candidates)), 'first channelId'
+
+    return None, None
+
+def find_video_ids(page_text):
+    """
+    Return the distinct 11-character video IDs on a page, in page order.
+    """
+    matches = [(match.start(), match.group(1)) for match in VIDEO_ID_JSON.finditer(page_text)]
+    matches += [(match.start(), match.group(1)) for match in VIDEO_ID_LINK.finditer(page_text)]
+    matches.sort()
+
+    # A dict keeps first-seen order without duplicates
+    return list(dict.fromkeys(video_id for _, video_id in matches if len(video_id) == 11))
+
+def scan_feed(feed_text):
+    """
+    Extract video IDs and publish times from RSS feed XML in one pass.
+    """
+    entries = []
+    current = None
+
+    for match in FEED_FIELDS.finditer(feed_text):
+        kind = match.lastgroup
+        if kind == 'entry':
+            current = {'video_id': None, 'published': None}
+            entries.append(current)
+        elif current is not None and current[kind] is None:
+            # The feed itself has a <published> too, which comes before the first <entry>
+            current[kind] = match.group(kind)
+
+    return [
+        {
+            'video_id': entry['video_id'],
+            'url': f"https://www.youtube.com/watch?v={entry['video_id']}",
+            'published': entry['published']
+        }
+        for entry in entries if entry['video_id']
+    ]
@@ -13,14 +13,30 @@ import sys
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
 import argparse
-import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from youtube_channel_scraper import YouTubeChannelScraper
+from seen_ledger import SeenVideoLedger
+from metrics import timed, stage_timer, write_summary, QUEUE_DEPTH
+from http_client import shared_session, enable_http2
+
+# Fields a done entry can be deleted by, in the order they are tried (MeTube itself keys entries by URL)
+DELETE_ID_FORMS = ('url', 'filepath', 'id', 'filename')
 
 class YouTubeToMeTube:
-    def __init__(self, metube_url):
+    # MeTube URL -> identifier form its /delete last accepted, shared by all processors
+    accepted_delete_forms = {}
+
+    def __init__(self, metube_url, max_workers=4, requests_per_second=2.0, ledger=None, max_in_flight=4,
+                 max_requests_per_second=None, scraper=None):
         self.metube_url = metube_url.rstrip('/')
-        self.session = requests.Session()
-        self.scraper = YouTubeChannelScraper()
+        # The process-wide MeTube session, with a keep-alive pool large enough for every concurrent submission
+        self.max_in_flight = max(1, max_in_flight)
+        self.session = shared_session('metube', pool_size=max(10, self.max_in_flight))
+        # Pass a scraper to share its caches with other processors
+        self.scraper = scraper or YouTubeChannelScraper(max_workers, requests_per_second,
+                                                        max_requests_per_second=max_requests_per_second)
+        # Only created when incremental mode is used
+        self.ledger = ledger
         
     def get_channel_videos(self, channel_url, count=5, filter_content=True):
         """
@@ -28,6 +44,7 @@ class YouTubeToMeTube:
         """
         return self.scraper.get_channel_videos(channel_url, count, filter_content)
     
+    @timed('metube_submit')
     def submit_to_metube(self, video_url, quality='best', format_type='any'):
         """
         Submit a video URL to MeTube for downloading.
@@ -69,10 +86,204 @@ class YouTubeToMeTube:
             print(f"[ERROR] Error submitting {video_url}: {e}")
             return False
     
-    def process_channel(self, channel_url, count=5, quality='best', format_type='any', filter_content=True):
+    def submit_videos_batch(self, videos, quality='best', format_type='any', max_in_flight=None, on_result=None,
+                            abort=None):
+        """
+        Submit many videos concurrently over the pooled session.
+        
+        videos is a list of URLs or of dicts with 'url' and an optional per-video
+        'quality'. At most max_in_flight requests run at once. on_result(result,
+        completed, total) is called as each request finishes, in completion order.
+        Once the abort event is set, videos not yet sent are reported as failed.
+        Returns the per-video results ({'video_url', 'quality', 'success'}) in input order.
+        """
+        jobs = []
+        for video in videos:
+            if isinstance(video, dict):
+                jobs.append((video['url'], video.get('quality') or quality))
+            else:
+                jobs.append((video, quality))
+        
+        results = [None] * len(jobs)
+        if not jobs:
+            return results
+        
+        workers = min(len(jobs), max(1, max_in_flight or self.max_in_flight))
+        completed = 0
+        
+        def submit(video_url, video_quality):
+            if abort is not None and abort.is_set():
+                return False
+            QUEUE_DEPTH.inc(queue='metube_submissions')
+            try:
+                return self.submit_to_metube(video_url, video_quality, format_type)
+            finally:
+                QUEUE_DEPTH.dec(queue='metube_submissions')
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(submit, video_url, video_quality): index
+                for index, (video_url, video_quality) in enumerate(jobs)
+            }
+            
+            for future in as_completed(futures):
+                index = futures[future]
+                video_url, video_quality = jobs[index]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    print(f"[ERROR] Error submitting {video_url}: {e}")
+                    success = False
+                
+                results[index] = {
+                    'video_url': video_url,
+                    'quality': video_quality,
+                    'success': success
+                }
+                completed += 1
+                
+                if on_result:
+                    on_result(results[index], completed, len(jobs))
+        
+        return results
+    
+    def list_done_downloads(self):
+        """
+        Return MeTube's list of completed downloads, or None if it can't be fetched.
+        """
+        for path in ('/downloads', '/history'):
+            try:
+                response = self.session.get(urljoin(self.metube_url, path), timeout=30)
+                if response.status_code != 200:
+                    continue
+                data = response.json()
+            except (requests.RequestException, ValueError):
+                continue
+            if isinstance(data, dict) and isinstance(data.get('done'), list):
+                return data['done']
+        return None
+    
+    def delete_videos_batch(self, videos, batch_size=100, on_result=None, abort=None):
+        """
+        Delete completed downloads from MeTube with batched /delete requests.
+        
+        videos are dicts with any of 'url', 'filepath', 'id' and 'filename'. Each
+        round sends one identifier form for every pending video, batch_size ids
+        per request. MeTube answers "ok" even for ids it doesn't know, so the done
+        list is fetched once per round to see which entries are really gone, and
+        the rest are retried with their next form. The form that worked is tried
+        first by later calls against the same instance. on_result(result,
+        completed, total) is called as each video's outcome is known. Once the
+        abort event is set no further requests are sent and the videos still
+        pending are reported as failed.
+        Returns the per-video results ({'video', 'success', 'identifier'}) in input order.
+        """
+        total = len(videos)
+        results = [None] * total
+        completed = 0
+        
+        def finish(index, success, identifier=None):
+            nonlocal completed
+            results[index] = {'video': videos[index], 'success': success, 'identifier': identifier}
+            completed += 1
+            if on_result:
+                on_result(results[index], completed, total)
+        
+        preferred = self.accepted_delete_forms.get(self.metube_url)
+        forms = [preferred] if preferred else []
+        forms += [form for form in DELETE_ID_FORMS if form != preferred]
+        
+        delete_url = urljoin(self.metube_url, '/delete')
+        pending = list(range(total))
+        # Identifier values already sent per video, e.g. a filepath that is just the filename
+        tried = {index: set() for index in pending}
+        remembered = False
+        
+        for form in forms:
+            if not pending or (abort is not None and abort.is_set()):
+                break
+            
+            sent = {}
+            for index in pending:
+                identifier = videos[index].get(form)
+                if identifier and identifier not in tried[index]:
+                    sent[index] = identifier
+                    tried[index].add(identifier)
+            if not sent:
+                continue
+            
+            accepted = []
+            items = list(sent.items())
+            for start in range(0, len(items), batch_size):
+                if abort is not None and abort.is_set():
+                    break
+                batch = items[start:start + batch_size]
+                try:
+                    with stage_timer('metube_delete'):
+                        response = self.session.post(delete_url, json={
+                            'ids': [identifier for _, identifier in batch],
+                            'where': 'done'
+                        }, timeout=60)
+                    response.raise_for_status()
+                    result = response.json()
+                    if isinstance(result, dict) and result.get('status') == 'ok':
+                        accepted.extend(index for index, _ in batch)
+                    else:
+                        print(f"[FAILED] MeTube rejected a delete of {len(batch)} entries by {form}: {result}")
+                except (requests.RequestException, ValueError) as e:
+                    print(f"[ERROR] Error deleting {len(batch)} entries by {form}: {e}")
+            
+            if not accepted:
+                continue
+            
+            # Without a done list to check against, an "ok" is taken at its word
+            remaining = self._done_identifiers()
+            deleted = [index for index in accepted
+                       if remaining is None or not self._is_still_listed(videos[index], remaining)]
+            if deleted and not remembered:
+                # The first form that removes anything is the one this instance keys entries by
+                self.accepted_delete_forms[self.metube_url] = form
+                remembered = True
+            
+            for index in deleted:
+                finish(index, True, sent[index])
+            deleted = set(deleted)
+            pending = [index for index in pending if index not in deleted]
+        
+        for index in pending:
+            finish(index, False)
+        
+        return results
+    
+    def _done_identifiers(self):
+        done = self.list_done_downloads()
+        if done is None:
+            return None
+        
+        remaining = {form: set() for form in DELETE_ID_FORMS}
+        for entry in done:
+            for form in DELETE_ID_FORMS:
+                if entry.get(form):
+                    remaining[form].add(entry[form])
+        return remaining
+    
+    def _is_still_listed(self, video, remaining):
+        # Filenames can repeat across channel folders, so they only count when nothing else identifies the video
+        forms = [form for form in DELETE_ID_FORMS if form != 'filename' and video.get(form)] or ['filename']
+        return any(video.get(form) in remaining[form] for form in forms)
+    
+    @timed('process_channel')
+    def process_channel(self, channel_url, count=5, quality='best', format_type='any', filter_content=True,
+                        incremental=False):
         """
         Process a YouTube channel: fetch recent videos and submit them to MeTube.
+        
+        In incremental mode only videos not recorded in the seen-video ledger are
+        validated and submitted.
         """
+        if incremental:
+            return self.process_channel_incremental(channel_url, count, quality, format_type, filter_content)
+        
         print(f"Processing channel: {channel_url}")
         if filter_content:
             print(f"Fetching {count} most recent videos (filtering out member-only, Shorts, and livestreams)...")
@@ -86,34 +297,93 @@ class YouTubeToMeTube:
             print("No videos found or error occurred")
             return
         
-        print(f"\nSubmitting {len(video_urls)} videos to MeTube...")
+        self._submit_all(video_urls, quality, format_type)
+    
+    def process_channel_incremental(self, channel_url, count=5, quality='best', format_type='any', filter_content=True):
+        """
+        Submit only the channel's uploads that earlier runs have not handled.
         
-        successful = 0
-        failed = 0
+        The first poll of a channel behaves like a normal run and records the rest
+        of the feed as seen, so later polls pick up only genuinely new uploads.
+        """
+        if self.ledger is None:
+            self.ledger = SeenVideoLedger()
         
-        for i, video_url in enumerate(video_urls, 1):
-            print(f"\n[{i}/{len(video_urls)}] Processing: {video_url}")
-            
-            if self.submit_to_metube(video_url, quality, format_type):
-                successful += 1
+        print(f"Polling channel: {channel_url}")
+        first_poll = self.ledger.get_channel(channel_url) is None
+        
+        entries, not_modified = self.scraper.fetch_channel_feed(channel_url)
+        if entries is None:
+            print("Could not fetch the channel feed")
+            return
+        
+        # A 304 means no new uploads; only earlier failures can still be pending
+        new_entries = self.ledger.new_entries(channel_url, entries)
+        if not new_entries:
+            if not_modified:
+                print("No new videos since the last poll (feed not modified)")
             else:
-                failed += 1
+                print("No new videos since the last poll")
+            self.ledger.mark_seen(channel_url, [])
+            return
+        
+        print(f"{len(new_entries)} video(s) not seen before")
+        entries_by_url = {entry['url']: entry for entry in new_entries}
+        candidate_urls = [entry['url'] for entry in new_entries]
+        handled = []
+        unchecked = set()
+        
+        if filter_content:
+            # Rejected videos are recorded so they are not checked again next poll;
+            # ones that couldn't be checked are tried again
+            def on_checked(video_url, is_valid, reason):
+                if is_valid is False:
+                    handled.append(entries_by_url[video_url])
+                elif is_valid is None:
+                    unchecked.add(video_url)
             
-            # Add a small delay between requests to be respectful
-            if i < len(video_urls):
-                time.sleep(1)
+            video_urls = self.scraper._filter_videos(candidate_urls, count, on_checked=on_checked)
+        else:
+            video_urls = candidate_urls[:count]
+        
+        submitted = []
+        if video_urls:
+            submitted = self._submit_all(video_urls, quality, format_type)
+        
+        handled.extend(entries_by_url[video_url] for video_url in submitted)
+        
+        if first_poll:
+            # Baseline: everything in the feed except failed submissions counts as seen
+            failed = (set(video_urls) - set(submitted)) | unchecked
+            handled = [entry for entry in entries if entry['url'] not in failed]
+        
+        self.ledger.mark_seen(channel_url, handled)
+    
+    def _submit_all(self, video_urls, quality, format_type):
+        """
+        Submit videos concurrently, print a summary and return the URLs that were accepted.
+        """
+        print(f"\nSubmitting {len(video_urls)} videos to MeTube...")
+        
+        def on_result(result, completed, total):
+            status = "✓" if result['success'] else "✗"
+            print(f"[{completed}/{total}] {status} {result['video_url']}")
+        
+        results = self.submit_videos_batch(video_urls, quality, format_type, on_result=on_result)
+        submitted = [result['video_url'] for result in results if result['success']]
         
         print(f"\n=== Summary ===")
-        print(f"Successfully submitted: {successful}")
-        print(f"Failed: {failed}")
+        print(f"Successfully submitted: {len(submitted)}")
+        print(f"Failed: {len(results) - len(submitted)}")
         print(f"Total processed: {len(video_urls)}")
+        return submitted
 
 def main():
     parser = argparse.ArgumentParser(description='Fetch recent YouTube videos and submit to MeTube')
     parser.add_argument('--metube-url', default='http://192.168.1.76:8081', 
                        help='MeTube instance URL (default: http://192.168.1.76:8081)')
-    parser.add_argument('--channel', 
-                       help='YouTube channel URL')
+    parser.add_argument('--channel', action='append',
+                       help='YouTube channel URL (repeat to process several channels)')
     parser.add_argument('--count', type=int, default=5, 
                        help='Number of recent videos to fetch (default: 5)')
     parser.add_argument('--quality', default='best', 
@@ -126,6 +396,26 @@ def main():
                        help='Test with a specific video URL instead of fetching from channel')
     parser.add_argument('--no-filter', action='store_true',
                        help='Disable filtering (include member-only videos, Shorts, and livestreams)')
+    parser.add_argument('--workers', type=int, default=4,
+                       help='Number of videos to validate in parallel (default: 4)')
+    parser.add_argument('--rate-limit', type=float, default=2.0,
+                       help='Starting YouTube requests per second; raised while YouTube answers normally '
+                            'and halved when it throttles (default: 2.0, 0 for no limit)')
+    parser.add_argument('--max-rate', type=float,
+                       help='Highest YouTube requests per second to speed up to (default: 5x --rate-limit)')
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                       help='Number of submissions sent to MeTube at the same time (default: 4)')
+    parser.add_argument('--incremental', action='store_true',
+                       help='Only submit videos that earlier runs have not already handled')
+    parser.add_argument('--ledger',
+                       help='Seen-video ledger file for --incremental (default: in the cache directory)')
+    parser.add_argument('--async', dest='use_async', action='store_true',
+                       help='Process all channels concurrently on one asyncio event loop (requires httpx)')
+    parser.add_argument('--http2', action='store_true',
+                       help='Talk HTTP/2 to YouTube (requires httpx and h2)')
+    parser.add_argument('--metrics-json', nargs='?', const='-', metavar='FILE',
+                       help='Print stage timings, request counts and cache hit rates as JSON at the end '
+                            '(or write them to FILE)')
     
     args = parser.parse_args()
     
@@ -133,15 +423,42 @@ def main():
     if not args.test_video and not args.channel:
         parser.error('Either --channel or --test-video must be specified')
     
+    if args.http2 and not enable_http2():
+        print("HTTP/2 needs httpx and h2 (pip install 'httpx[http2]'); using HTTP/1.1")
+    
+    ledger = SeenVideoLedger(args.ledger) if args.ledger else None
+    filter_content = not args.no_filter  # Default is to filter, unless --no-filter is specified
+    
+    if args.use_async and not args.test_video:
+        from async_pipeline import run_channels
+        
+        results = run_channels(
+            args.metube_url, args.channel, args.count, args.quality, args.format, filter_content,
+            args.incremental, ledger,
+            max_in_flight=args.max_in_flight, max_workers=args.workers, requests_per_second=args.rate_limit,
+            max_requests_per_second=args.max_rate
+        )
+        print(f"\n=== Summary ===")
+        print(f"Channels processed: {len(results)}")
+        print(f"Successfully submitted: {sum(len(submitted) for submitted in results.values())}")
+        if args.metrics_json:
+            write_summary(args.metrics_json)
+        return
+    
     # Create the processor
-    processor = YouTubeToMeTube(args.metube_url)
+    processor = YouTubeToMeTube(args.metube_url, args.workers, args.rate_limit, ledger, args.max_in_flight,
+                                args.max_rate)
     
     if args.test_video:
         print(f"Testing with video: {args.test_video}")
         processor.submit_to_metube(args.test_video, args.quality, args.format)
     else:
-        filter_content = not args.no_filter  # Default is to filter, unless --no-filter is specified
-        processor.process_channel(args.channel, args.count, args.quality, args.format, filter_content)
+        for channel_url in args.channel:
+            processor.process_channel(channel_url, args.count, args.quality, args.format, filter_content,
+                                      args.incremental)
+    
+    if args.metrics_json:
+        write_summary(args.metrics_json)
 
 if __name__ == '__main__':
     main()